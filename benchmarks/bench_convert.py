@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src.movesense.sbem_parser import parse_sbem_file
+from tests.synthetic import write_sbem_file
+
+MB = 1 << 20
+
+
+def main(sizes_mb: list[int]):
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes_mb:
+            filename = os.path.join(directory, f"{size}.bin")
+            written = write_sbem_file(filename, size * MB)
+
+            for export_format in ["csv", "npz"]:
+                start = time.perf_counter()
+                parse_sbem_file(filename, export_format)
+                duration = time.perf_counter() - start
+
+                # second run only for the memory numbers, tracing slows it down
+                tracemalloc.start()
+                parse_sbem_file(filename, export_format)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                print(
+                    f"{size:4d} MB -> {export_format}  {duration:7.2f} s"
+                    f"  ({written / MB / duration:6.1f} MB/s)"
+                    f"  peak memory {peak / MB:6.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    # e.g. python -m benchmarks.bench_convert 10 100 1000
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100])
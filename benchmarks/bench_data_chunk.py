@@ -0,0 +1,72 @@
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any
+
+from src.movesense.data_chunk import add_interval_if_known, chunks_to_arrays
+from src.movesense.protocol import deserialize_ecg8_packets
+from tests.synthetic import ecg_packets_for_duration
+
+MB = 1 << 20
+
+
+# the former list based containers, for comparison
+@dataclass
+class LegacyDataEntry:
+    timestamp: int
+    value: Any
+
+
+@dataclass
+class LegacyDataChunk:
+    timestamp: int
+    values: list[Any]
+    interval: int | None = None
+
+    def to_data_entries(self) -> list[LegacyDataEntry]:
+        return [
+            LegacyDataEntry(self.timestamp + i * self.interval, self.values[i])
+            for i in range(len(self.values))
+        ]
+
+
+def legacy_flat_entries(packets: list[bytes]) -> list[LegacyDataEntry]:
+    chunks = [
+        LegacyDataChunk(c.timestamp, c.values.tolist(), c.interval)
+        for c in deserialize_ecg8_packets(packets)
+    ]
+    entries = []
+    for chunk in chunks:
+        entries += chunk.to_data_entries()
+    return entries
+
+
+def array_backed(packets: list[bytes]):
+    return chunks_to_arrays(add_interval_if_known(deserialize_ecg8_packets(packets)))
+
+
+def measure(function, packets) -> tuple[float, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(packets)
+    duration = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return duration, current / MB
+
+
+def main():
+    # one hour of ECG at 2 ms
+    packets = ecg_packets_for_duration(3600)
+    print(f"{len(packets) * 16} samples")
+    for name, function in [
+        ("DataEntry list", legacy_flat_entries),
+        ("array backed", array_backed),
+    ]:
+        duration, memory = measure(function, packets)
+        print(f"{name:>15}  {duration:6.2f} s (traced)  retained {memory:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
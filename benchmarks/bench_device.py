@@ -0,0 +1,90 @@
+import asyncio
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src.bluetooth.collector import BluetoothDataCollector, decode_packets
+from src.common.definitions import MovesenseV8
+from src.movesense.protocol import (
+    ECG8_PACKET_SIZE,
+    IMU8_PACKET_SIZE,
+    deserialize_ecg8_packets,
+    deserialize_imu8_packets,
+    ecg_header_string,
+    imu_header_string,
+)
+from tests.fake_device import SimulatedMovesense
+from tests.synthetic import ecg_packets
+
+MB = 1 << 20
+
+
+def collectors(device, directory: str) -> list[BluetoothDataCollector]:
+    return [
+        BluetoothDataCollector(
+            device=device,
+            char_uuid=MovesenseV8.ECG_VOLTAGE_UUID_128,
+            deserializer=deserialize_ecg8_packets,
+            header=ecg_header_string,
+            calls_on_disconnect=[],
+            packet_size=ECG8_PACKET_SIZE,
+            name="ecg",
+            subfolder=directory,
+        ),
+        BluetoothDataCollector(
+            device=device,
+            char_uuid=MovesenseV8.IMU_MEAS_UUID_128,
+            deserializer=deserialize_imu8_packets,
+            header=imu_header_string,
+            calls_on_disconnect=[],
+            packet_size=IMU8_PACKET_SIZE,
+            name="imu",
+            subfolder=directory,
+        ),
+    ]
+
+
+async def stream(speed: float, seconds: float) -> tuple[int, int, float]:
+    # 2 ms ECG and 10 ms IMU from one simulated v8 device, written to csv
+    device = SimulatedMovesense("00:00:00:00:00:01", speed=speed)
+    with tempfile.TemporaryDirectory() as directory:
+        running = collectors(device, directory)
+        start = time.perf_counter()
+        for collector in running:
+            await collector.start()
+        await asyncio.sleep(seconds)
+        for collector in running:
+            await collector.finish()
+        duration = time.perf_counter() - start
+    return sum(c.received for c in running), device.sent, duration
+
+
+def decode_latency(batch: int = 256, repeat: int = 100) -> float:
+    packets = b"".join(ecg_packets(batch))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decode_packets(deserialize_ecg8_packets, packets, 2)
+    return (time.perf_counter() - start) / repeat
+
+
+def main(speeds: list[float], seconds: float = 2.0):
+    print(f"decode latency: {decode_latency() * 1e6:.0f} us per 256 ECG packets")
+    for speed in speeds:
+        received, sent, duration = asyncio.run(stream(speed, seconds))
+
+        tracemalloc.start()
+        asyncio.run(stream(speed, seconds))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{speed:6.0f}x real time: {received / duration:9.0f} packets/s"
+            f"  ({sent - received} of {sent} lost)"
+            f"  peak memory {peak / MB:6.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    # e.g. python -m benchmarks.bench_device 1 10 100
+    main([float(arg) for arg in sys.argv[1:]] or [1, 10, 100])
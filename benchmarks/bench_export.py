@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.common.exporters import exporters
+from src.movesense.data_chunk import DataEntry
+from src.movesense.protocol import ECG_SAMPLES_PER_PACKET, decode_ecg8_packets
+from src.movesense.sbem_parser import write_to_csv
+from tests.synthetic import ecg_packets_for_duration
+
+
+def timed(function) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    # one hour of ECG at 2 ms, as decoded by the batch decoder
+    packet_timestamps, values = decode_ecg8_packets(ecg_packets_for_duration(3600))
+    offsets = 2 * np.arange(ECG_SAMPLES_PER_PACKET)
+    timestamps = (packet_timestamps[:, None] + offsets).ravel()
+    values = values.ravel()
+    print(f"{len(values)} samples")
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "entries.csv")
+        entries = [
+            DataEntry(t, v) for t, v in zip(timestamps.tolist(), values.tolist())
+        ]
+        write, _ = timed(lambda: write_to_csv(filename, entries, "timestamp, value"))
+        size = os.path.getsize(filename) / (1 << 20)
+        print(f"{'DataEntry csv':>14}  write {write:6.2f} s  {'':17}  {size:7.1f} MB")
+
+        for name, exporter in exporters.items():
+            base = os.path.join(directory, "ecg")
+            try:
+                write, filename = timed(
+                    lambda: exporter.write(base, "timestamp, value", timestamps, values)
+                )
+            except Exception as e:
+                print(f"{name:>14}  skipped: {e}")
+                continue
+            read, _ = timed(lambda: exporter.read(filename))
+            size = os.path.getsize(filename) / (1 << 20)
+            print(
+                f"{name:>14}  write {write:6.2f} s  read {read:6.2f} s  {size:7.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
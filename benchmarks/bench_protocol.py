@@ -0,0 +1,30 @@
+import time
+
+from src.movesense.protocol import decode_ecg8_packets, deserialize_ecg8_packet
+from tests.synthetic import ecg_packets_for_duration
+
+
+def best_of(function, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    # one hour of ECG at the fastest interval of 2 ms
+    packets = ecg_packets_for_duration(3600, interval=2)
+    print(f"{len(packets)} packets, {len(packets) * 16} samples")
+
+    per_packet = best_of(lambda: [deserialize_ecg8_packet(p) for p in packets])
+    batch = best_of(lambda: decode_ecg8_packets(packets))
+
+    print(f"per packet: {per_packet * 1000:8.1f} ms")
+    print(f"batch     : {batch * 1000:8.1f} ms")
+    print(f"speedup   : {per_packet / batch:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import time
+
+from src.movesense.sbem_parser import (
+    SbemChunk,
+    SbemFile,
+    index_sbem,
+    iter_sbem_chunks,
+    read_bin_file,
+)
+from tests.synthetic import write_sbem_file
+
+MB = 1 << 20
+
+
+def legacy_parse_sbem(file: bytes) -> list[SbemChunk]:
+    # the former implementation, which copies the remaining file for every chunk
+    file = file[8:]
+    chunks = []
+    while len(file) >= 2:
+        chunk_len = int(file[1])
+        chunks.append(SbemChunk(int(file[0]), chunk_len, file[2 : 2 + chunk_len]))
+        file = file[(chunk_len + 2) :]
+    return chunks
+
+
+def timed(function) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def count_streamed(filename: str) -> int:
+    with open(filename, "rb") as file:
+        return sum(1 for _ in iter_sbem_chunks(file))
+
+
+def open_indexed(filename: str) -> int:
+    with SbemFile(filename) as recording:
+        return len(recording.index)
+
+
+def main(sizes_mb: list[int]):
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_file = os.path.join(directory, "legacy.bin")
+        write_sbem_file(legacy_file, 1 * MB)
+        contents = read_bin_file(legacy_file)
+        legacy, _ = timed(lambda: legacy_parse_sbem(contents))
+        indexed, _ = timed(lambda: index_sbem(contents))
+        print(f"   1 MB  legacy reslicing {legacy:7.2f} s   index {indexed:7.2f} s")
+
+        for size in sizes_mb:
+            filename = os.path.join(directory, f"{size}.bin")
+            written = write_sbem_file(filename, size * MB)
+
+            load, contents = timed(lambda: read_bin_file(filename))
+            indexed, index = timed(lambda: index_sbem(contents))
+            del contents
+            streamed, count = timed(lambda: count_streamed(filename))
+            assert count == len(index)
+            first_open, _ = timed(lambda: open_indexed(filename))
+            cached_open, _ = timed(lambda: open_indexed(filename))
+
+            print(
+                f"{size:4d} MB  {len(index):>10} chunks"
+                f"  index {load + indexed:7.2f} s ({written / MB / (load + indexed):6.1f} MB/s)"
+                f"  stream {streamed:7.2f} s ({written / MB / streamed:6.1f} MB/s)"
+                f"  open {first_open:7.2f} s  reopen {cached_open:7.3f} s"
+            )
+            os.remove(filename)
+
+
+if __name__ == "__main__":
+    # e.g. python -m benchmarks.bench_sbem 10 100 1000
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100])
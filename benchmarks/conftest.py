@@ -0,0 +1,60 @@
+import pytest
+
+from src.movesense.protocol import deserialize_ecg8_packets
+from tests.synthetic import (
+    ecg_packets_for_duration,
+    hr_notifications,
+    imu_packets,
+    sbem_bytes,
+)
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--recording-seconds",
+        default="10,60",
+        help="comma separated recording lengths the benchmarks run on",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "seconds" in metafunc.fixturenames:
+        seconds = metafunc.config.getoption("recording_seconds").split(",")
+        metafunc.parametrize("seconds", [int(s) for s in seconds], scope="module")
+
+
+@pytest.fixture(scope="module")
+def ecg8_packets(seconds):
+    return ecg_packets_for_duration(seconds, interval=2)
+
+
+@pytest.fixture(scope="module")
+def ecg7_packets(seconds):
+    return ecg_packets_for_duration(seconds, timestamp_size=4, interval=2)
+
+
+@pytest.fixture(scope="module")
+def imu8_packets(seconds):
+    # 10 ms IMU, 80 ms per packet
+    return imu_packets(seconds * 1000 // 80)
+
+
+@pytest.fixture(scope="module")
+def imu7_packets(seconds):
+    return imu_packets(seconds * 1000 // 80, timestamp_size=4)
+
+
+@pytest.fixture(scope="module")
+def sbem_data(seconds):
+    return sbem_bytes(seconds)
+
+
+@pytest.fixture(scope="module")
+def ecg_chunks(ecg8_packets):
+    return deserialize_ecg8_packets(ecg8_packets)
+
+
+@pytest.fixture(scope="module")
+def hr_packets(seconds):
+    # one Heart Rate Measurement notification per second
+    return hr_notifications(seconds)
@@ -0,0 +1,160 @@
+from src.movesense.data_chunk import add_interval_if_known
+from src.movesense.protocol import (
+    decode_heart_rate_frames,
+    deserialize_ecg7_packet,
+    deserialize_ecg8_packet,
+    deserialize_imu7_packet,
+    deserialize_imu8_packet,
+    heart_rate_frame,
+)
+from src.movesense.sbem_parser import parse_chunks, parse_sbem, write_to_csv
+
+# run with: python -m pytest benchmarks --benchmark-storage=benchmarks/baselines
+# see the README for recording a local baseline and comparing against it
+
+
+def test_deserialize_ecg7_packet(benchmark, ecg7_packets):
+    chunks = benchmark(lambda: [deserialize_ecg7_packet(p) for p in ecg7_packets])
+    assert len(chunks) == len(ecg7_packets)
+
+
+def test_deserialize_ecg8_packet(benchmark, ecg8_packets):
+    chunks = benchmark(lambda: [deserialize_ecg8_packet(p) for p in ecg8_packets])
+    assert len(chunks) == len(ecg8_packets)
+
+
+def test_deserialize_imu7_packet(benchmark, imu7_packets):
+    chunks = benchmark(lambda: [deserialize_imu7_packet(p) for p in imu7_packets])
+    assert len(chunks) == len(imu7_packets)
+
+
+def test_deserialize_imu8_packet(benchmark, imu8_packets):
+    chunks = benchmark(lambda: [deserialize_imu8_packet(p) for p in imu8_packets])
+    assert len(chunks) == len(imu8_packets)
+
+
+def expected_chunks(seconds: int) -> dict[int, int]:
+    # sbem_bytes: 2 ms ECG (32 ms per chunk), 10 ms IMU (80 ms per chunk) and
+    # one chunk of an unknown type per second
+    return {104: seconds * 1000 // 32, 105: seconds * 1000 // 80, 2: seconds}
+
+
+def test_parse_sbem(benchmark, sbem_data, seconds):
+    # parse_sbem skips the file header itself
+    chunks = benchmark(parse_sbem, sbem_data)
+    assert len(chunks) == sum(expected_chunks(seconds).values())
+    assert {chunk.id for chunk in chunks} == set(expected_chunks(seconds))
+
+
+def test_parse_chunks(benchmark, sbem_data, seconds):
+    chunks = parse_sbem(sbem_data)
+    parsed = benchmark(parse_chunks, chunks)
+    assert len(parsed[104]) == expected_chunks(seconds)[104]
+    assert len(parsed[105]) == expected_chunks(seconds)[105]
+
+
+def test_add_interval_if_known(benchmark, ecg_chunks):
+    chunks = benchmark(add_interval_if_known, ecg_chunks)
+    assert chunks[0].interval == 2
+
+
+def test_to_csv_chunk(benchmark, ecg_chunks):
+    csv = benchmark(lambda: "".join(chunk.to_csv_chunk() for chunk in ecg_chunks))
+    assert csv.count("\n") == 16 * len(ecg_chunks)
+
+
+def test_write_to_csv(benchmark, ecg_chunks, tmp_path):
+    entries = [entry for chunk in ecg_chunks for entry in chunk.to_data_entries()]
+    filename = str(tmp_path / "ecg.csv")
+    benchmark(write_to_csv, filename, entries, "timestamp, ecg")
+    with open(filename) as file:
+        assert sum(1 for _ in file) == len(entries) + 1
+
+
+def test_collector_on_packet(benchmark, ecg8_packets, tmp_path):
+    # notification callback: arrival time for the stream stats plus the copy
+    # into the ring buffer
+    from src.bluetooth.collector import BluetoothDataCollector
+    from src.bluetooth.ring_buffer import PacketRingBuffer
+    from src.movesense.protocol import ECG8_PACKET_SIZE, deserialize_ecg8_packets
+
+    collector = BluetoothDataCollector(
+        device=None,
+        char_uuid="ecg",
+        deserializer=deserialize_ecg8_packets,
+        header="timestamp, ecg",
+        calls_on_disconnect=[],
+        packet_size=ECG8_PACKET_SIZE,
+        capacity=len(ecg8_packets),
+        flush_packets=len(ecg8_packets) + 1,
+        subfolder=str(tmp_path),
+    )
+    # what start() sets up, without a device to subscribe to
+    collector.packets = PacketRingBuffer(ECG8_PACKET_SIZE, len(ecg8_packets))
+    packets = [bytearray(packet) for packet in ecg8_packets]
+
+    def receive():
+        collector.packets.drain()
+        collector.stats.take_arrivals()
+        for packet in packets:
+            collector._on_packet(None, packet)
+
+    benchmark(receive)
+
+
+def test_heart_rate_collector_on_packet(benchmark, hr_packets, tmp_path):
+    # what every Heart Rate Measurement notification costs: the frame with its
+    # arrival time, the copy into the ring buffer and the arrival statistics
+    from src.bluetooth.collector import BluetoothDataCollector
+    from src.bluetooth.ring_buffer import PacketRingBuffer
+    from src.movesense.protocol import HR_FRAME_SIZE, hr_header_string
+
+    collector = BluetoothDataCollector(
+        device=None,
+        char_uuid="hr",
+        deserializer=decode_heart_rate_frames,
+        header=hr_header_string,
+        calls_on_disconnect=[],
+        packet_size=HR_FRAME_SIZE,
+        capacity=len(hr_packets),
+        flush_packets=len(hr_packets) + 1,
+        subfolder=str(tmp_path),
+        packet_transform=heart_rate_frame,
+        regular=False,
+    )
+    collector.packets = PacketRingBuffer(HR_FRAME_SIZE, len(hr_packets))
+    packets = [bytearray(packet) for packet in hr_packets]
+
+    def receive():
+        collector.packets.drain()
+        collector.stats.take_arrivals()
+        for packet in packets:
+            collector._on_packet(None, packet)
+
+    benchmark(receive)
+    assert collector.packets.count == len(hr_packets)
+
+
+def test_heart_rate_frame(benchmark, hr_packets):
+    packets = [bytearray(packet) for packet in hr_packets]
+    frames = benchmark(lambda: [heart_rate_frame(p) for p in packets])
+    assert all(frames)
+
+
+def test_decode_heart_rate_frames(benchmark, hr_packets):
+    frames = [heart_rate_frame(packet) for packet in hr_packets]
+    timestamps, values = benchmark(decode_heart_rate_frames, frames)
+    assert len(timestamps) == len(values) >= len(frames) // 2
+
+
+def test_attribute_lookup(benchmark):
+    # resolved on every start, read and write through the per-connection index
+    from src.bluetooth.attributes import attribute_index
+    from src.common.definitions import ACTIVITY_SVC_UUID_128, MovesenseV8
+    from tests.fake_device import FakeMovesense
+
+    index = attribute_index(FakeMovesense("00:00:00:00:00:01"))
+    found = benchmark(
+        index.characteristic, MovesenseV8.CONFIG_UUID_128, ACTIVITY_SVC_UUID_128
+    )
+    assert found is not None
@@ -0,0 +1,98 @@
+import functools
+import weakref
+
+import bleak
+from bleak.uuids import normalize_uuid_str
+
+
+# parsing a UUID string costs microseconds, the same few are looked up all the time
+@functools.lru_cache(maxsize=1024)
+def normalize_uuid(uuid) -> str:
+    try:
+        return normalize_uuid_str(str(uuid))
+    except ValueError:
+        # anything else is kept as it is and simply never matches
+        return str(uuid)
+
+
+class AttributeIndex:
+    """
+    services and characteristics of one connection by normalized UUID.
+
+    Built on first use and rebuilt as soon as the client holds another service
+    collection (bleak discovers the services again on every connect) or after
+    invalidate(). Service Changed indications are not followed, bleak does not
+    discover the services again on those
+    """
+
+    def __init__(self, device: bleak.BleakClient):
+        self.device = device
+        self.services = {}
+        self.characteristics = {}
+        self.service_list = []
+        self.builds = 0
+        self._by_service = {}
+        self._collection = None
+        self._stale = True
+
+    def _current(self) -> "AttributeIndex":
+        try:
+            collection = self.device.services
+        except bleak.exc.BleakError:
+            # not connected (yet), nothing to resolve
+            collection = None
+        if self._stale or collection is not self._collection:
+            self._build(collection)
+        return self
+
+    def _build(self, collection) -> None:
+        self.service_list = list(collection) if collection is not None else []
+        self.services, self.characteristics, self._by_service = {}, {}, {}
+        for service in self.service_list:
+            key = normalize_uuid(service.uuid)
+            self.services.setdefault(key, service)
+            characteristics = self._by_service.setdefault(key, {})
+            for characteristic in service.characteristics:
+                char_key = normalize_uuid(characteristic.uuid)
+                characteristics.setdefault(char_key, characteristic)
+                # the first one wins if a UUID is used in several services
+                self.characteristics.setdefault(char_key, characteristic)
+        self._collection = collection
+        self._stale = False
+        self.builds += 1
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def all_services(self) -> list:
+        return self._current().service_list
+
+    def service(self, uuid):
+        return self._current().services.get(normalize_uuid(uuid))
+
+    def characteristic(self, uuid, service_uuid=None):
+        self._current()
+        if service_uuid is None:
+            return self.characteristics.get(normalize_uuid(uuid))
+        return self._by_service.get(normalize_uuid(service_uuid), {}).get(
+            normalize_uuid(uuid)
+        )
+
+    def resolve(self, char):
+        """
+        the characteristic object for a UUID, so that bleak does not search
+        its whole collection on every read, write or subscription
+        """
+        if not isinstance(char, str):
+            return char
+        return self.characteristic(char) or char
+
+
+_indexes: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def attribute_index(device: bleak.BleakClient) -> AttributeIndex:
+    # one index per client, it lives as long as the client does
+    if device not in _indexes:
+        _indexes[device] = AttributeIndex(device)
+    return _indexes[device]
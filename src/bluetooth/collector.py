@@ -1,44 +1,209 @@
-from dataclasses import dataclass
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field
 from typing import Callable
 
 import bleak
+import numpy as np
 
-from src.common.file_io import write_to_file
-from src.movesense.data_chunk import DataChunk, add_interval_if_known
+from src.bluetooth.attributes import attribute_index
+from src.bluetooth.ring_buffer import SPILL, PacketRingBuffer, overflow_policies
+from src.bluetooth.stream_stats import StreamStats
+from src.common.executor import run_in_executor
+from src.common.exporters import ExportWriter, get_exporter
+from src.common.file_io import get_timestamp_string
+from src.movesense.data_chunk import DataChunk, add_interval_if_known, chunks_to_arrays
+
+
+def decode_packets(
+    deserializer: Callable[[bytes], list[DataChunk] | tuple[np.ndarray, np.ndarray]],
+    packets: bytes,
+    interval: int | None,
+    expected_interval: int | None = None,
+) -> tuple[np.ndarray, np.ndarray, int | None]:
+    # module level, so that it can be sent to a process pool
+    chunks = deserializer(packets)
+    if isinstance(chunks, tuple):
+        # irregular samples (e.g. RR intervals) are decoded straight to arrays
+        return *chunks, interval
+    if interval is None:
+        chunks = add_interval_if_known(chunks)
+        interval = chunks[0].interval if chunks else None
+    if interval is None and expected_interval is not None:
+        # too few packets to infer it, e.g. a single one at the end
+        interval = expected_interval
+    if interval is not None:
+        for chunk in chunks:
+            chunk.set_interval(interval)
+    return *chunks_to_arrays(chunks), interval
 
 
 @dataclass
 class BluetoothDataCollector:
     device: bleak.BleakClient
     char_uuid: str
-    deserializer: Callable[[bytes], DataChunk]
+    deserializer: Callable[[bytes], list[DataChunk] | tuple[np.ndarray, np.ndarray]]
     header: str
     calls_on_disconnect: list[Callable]
+    packet_size: int
     # Accicentally visible as argument
     is_running: bool = False
+    export_format: str = "csv"
+    name: str = ""
+    subfolder: str = "data"
+    # about an hour of 2 ms ECG packets before the overflow policy applies
+    capacity: int = 1 << 17
+    overflow: str = SPILL
+    # decoded packets are appended to the file every flush_packets packets or
+    # every flush_interval milliseconds, whichever comes first
+    flush_packets: int = 256
+    flush_interval: int = 1000
+    # added to every written timestamp (ms), e.g. to put several devices
+    # on one session time base
+    timestamp_offset: int = 0
+    # called with every decoded batch (timestamps, values), e.g. a live plot
+    listeners: list[Callable[[np.ndarray, np.ndarray], None]] = field(
+        default_factory=list
+    )
+    # applied to every notification before it is buffered, e.g. to turn
+    # variable length notifications into packet_size frames
+    packet_transform: Callable[[bytearray], bytes] | None = None
+    # samples come at a fixed interval, which is inferred from the first packets
+    regular: bool = True
+    # the configured interval (ms), assumed for the last packets when too few
+    # arrived to infer it
+    expected_interval: int | None = None
+
+    def __post_init__(self):
+        if self.overflow not in overflow_policies:
+            raise Exception(f"unknown overflow policy '{self.overflow}'")
+        # allocated by start(), a full buffer is several megabytes
+        self.packets: PacketRingBuffer | None = None
+        self.sink: ExportWriter | None = None
+        self.interval: int | None = None
+        self.stats = StreamStats(self.name)
+        self.stats_filename: str | None = None
+        # the sink is written from worker threads and closed on disconnect
+        self._sink_lock = threading.Lock()
 
     async def start(self):
-        self.packets = []
-        self.is_running = True
-        await self.device.start_notify(
-            self.char_uuid, lambda _, bytes: self.packets.append(bytes)
+        if self.packets is not None:
+            self.packets.close()
+        self.packets = PacketRingBuffer(self.packet_size, self.capacity, self.overflow)
+        self.interval = None
+        self.stats = StreamStats(self.name)
+        self.stats_filename = None
+
+        name = get_timestamp_string()
+        if self.name:
+            name = f"{self.name}_{name}"
+        self.sink = get_exporter(self.export_format).open(
+            os.path.join(self.subfolder, name), self.header
         )
 
-        def _emergency_save():
-            print("device disconnected, emergency saved file")
+        self._flush_requested = asyncio.Event()
+        self.is_running = True
+        self._characteristic = attribute_index(self.device).resolve(self.char_uuid)
+        await self.device.start_notify(self._characteristic, self._on_packet)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+        # on a sudden disconnect at most one flush window is lost
+        self.calls_on_disconnect.append(self.close_sink)
 
-            write_to_file(self._contents_to_file(), "csv", "data", name=self.char_uuid)
+    def _on_packet(self, _, packet: bytearray):
+        if self.packet_transform is not None:
+            packet = self.packet_transform(packet)
+        # arrivals are only counted for packets that get decoded
+        if self.packets.append(packet):
+            self.stats.on_packet()
+        if self.packets.count >= self.flush_packets:
+            self._flush_requested.set()
 
-        self.calls_on_disconnect.append(_emergency_save)
+    async def _flush_loop(self):
+        while self.is_running:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), self.flush_interval / 1000
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
 
-    def _contents_to_file(self) -> str:
-        chunks = [self.deserializer(packet) for packet in self.packets]
-        chunks = add_interval_if_known(chunks)
-        output = self.header + ""
-        output += "".join(c.to_csv_chunk() for c in chunks)
-        return output
+    @property
+    def received(self) -> int:
+        return 0 if self.packets is None else self.packets.received
 
-    async def finish(self) -> str:
-        await self.device.stop_notify(self.char_uuid)
+    @property
+    def dropped(self) -> int:
+        if self.packets is None:
+            return 0
+        return self.packets.dropped + self.packets.malformed
+
+    def _take_packets(self, final: bool = False) -> tuple[bytes, np.ndarray] | None:
+        if self.sink is None or self.packets is None or len(self.packets) == 0:
+            return None
+        # the interval is inferred from the first two packets of the recording,
+        # a single packet at the end is written with the expected interval
+        if self.regular and self.interval is None and len(self.packets) < 2:
+            if not final or self.expected_interval is None:
+                return None
+        return self.packets.drain(), self.stats.take_arrivals()
+
+    def _notify_listeners(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        for listener in self.listeners:
+            listener(timestamps + self.timestamp_offset, values)
+
+    def _write(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        with self._sink_lock:
+            if self.sink is None:
+                return
+            self.sink.append(timestamps + self.timestamp_offset, values)
+            self.sink.flush()
+
+    async def flush(self) -> None:
+        taken = self._take_packets()
+        if taken is None:
+            return
+        packets, arrivals = taken
+        # decoding and writing run off the event loop, notifications keep arriving
+        timestamps, values, self.interval = await run_in_executor(
+            decode_packets, self.deserializer, packets, self.interval
+        )
+        self.stats.add_batch(arrivals, timestamps, self.interval)
+        self._notify_listeners(timestamps, values)
+        await asyncio.to_thread(self._write, timestamps, values)
+
+    def close_sink(self) -> str | None:
+        with self._sink_lock:
+            if self.sink is None:
+                return None
+            self.is_running = False
+            taken = self._take_packets(final=True)
+            if taken is not None:
+                packets, arrivals = taken
+                timestamps, values, self.interval = decode_packets(
+                    self.deserializer, packets, self.interval, self.expected_interval
+                )
+                self.stats.add_batch(arrivals, timestamps, self.interval)
+                self.sink.append(timestamps + self.timestamp_offset, values)
+            self.sink.close()
+            filename = self.sink.filename
+            self.sink = None
+            # next to the data: ecg_<time>.csv -> ecg_<time>.stats.json
+            self.stats_filename = self.stats.save(
+                f"{os.path.splitext(filename)[0]}.stats.json"
+            )
+        return filename
+
+    async def finish(self) -> str | None:
+        await self.device.stop_notify(self._characteristic)
         self.is_running = False
-        return self._contents_to_file()
+        self._flush_requested.set()
+        await self._flush_task
+        await self.flush()
+
+        if self.close_sink in self.calls_on_disconnect:
+            self.calls_on_disconnect.remove(self.close_sink)
+        return await asyncio.to_thread(self.close_sink)
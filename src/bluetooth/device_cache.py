@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+
+import bleak
+
+from src.bluetooth.attributes import attribute_index
+
+DEFAULT_CACHE_FILE = os.path.join(
+    os.path.expanduser("~"), ".cache", "movesense-client", "devices.json"
+)
+
+
+@dataclass
+class CachedDevice:
+    address: str
+    name: str | None = None
+    firmware: int | None = None
+    # service UUID -> characteristic UUIDs, as seen on the last connection
+    services: dict[str, list[str]] = field(default_factory=dict)
+    last_connected: float = 0.0
+
+    def matches(self, target: str) -> bool:
+        return matches(self.address, self.name, target)
+
+
+def matches(address: str, name: str | None, target: str) -> bool:
+    # targets are addresses or names, both compared case-insensitively
+    target = target.lower()
+    return str(address).lower() == target or (name or "").lower() == target
+
+
+class DeviceCache:
+    """
+    the devices connected to before, so that they can be connected to directly
+    next time instead of scanning for them first
+    """
+
+    def __init__(self, filename: str | None = None):
+        self.filename = filename or os.environ.get(
+            "MOVESENSE_DEVICE_CACHE", DEFAULT_CACHE_FILE
+        )
+        self.devices: dict[str, CachedDevice] = {}
+
+    @classmethod
+    def load(cls, filename: str | None = None) -> "DeviceCache":
+        cache = cls(filename)
+        try:
+            with open(cache.filename) as file:
+                entries = json.load(file)["devices"]
+            for entry in entries:
+                device = CachedDevice(**entry)
+                cache.devices[device.address.lower()] = device
+        except (OSError, ValueError, KeyError, TypeError):
+            # a missing or broken cache only costs a scan
+            cache.devices = {}
+        return cache
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        with open(self.filename, "w") as file:
+            json.dump(
+                {"devices": [asdict(device) for device in self.known()]},
+                file,
+                indent=2,
+            )
+
+    def known(self) -> list[CachedDevice]:
+        # most recently used first
+        return sorted(
+            self.devices.values(), key=lambda d: d.last_connected, reverse=True
+        )
+
+    def find(self, target: str) -> CachedDevice | None:
+        return next((d for d in self.known() if d.matches(target)), None)
+
+    def remember(
+        self, device: bleak.BleakClient, firmware: int | None = None
+    ) -> CachedDevice:
+        """
+        stores a connected device together with its service layout
+        """
+        services = {
+            str(service.uuid): [str(char.uuid) for char in service.characteristics]
+            for service in attribute_index(device).all_services()
+        }
+        address = str(device.address)
+        cached = self.devices.get(address.lower()) or CachedDevice(address)
+        cached.name = getattr(device, "name", None) or cached.name
+        cached.firmware = firmware if firmware is not None else cached.firmware
+        cached.services = services or cached.services
+        cached.last_connected = time.time()
+        self.devices[address.lower()] = cached
+        return cached
+
+
+async def scan(scan_duration: float = 5.0, targets: list[str] = ()) -> dict:
+    """
+    scans for scan_duration seconds, or only until all targets (addresses or
+    names) have been seen. Returns address -> (device, advertisement data) like
+    bleak.BleakScanner.discover(return_adv=True)
+    """
+    remaining = set(target.lower() for target in targets)
+    all_found = asyncio.Event()
+
+    def on_detection(device, _):
+        for target in list(remaining):
+            if matches(device.address, device.name, target):
+                remaining.discard(target)
+        if targets and not remaining:
+            all_found.set()
+
+    scanner = bleak.BleakScanner(detection_callback=on_detection)
+    await scanner.start()
+    try:
+        await asyncio.wait_for(all_found.wait(), scan_duration)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await scanner.stop()
+    return scanner.discovered_devices_and_advertisement_data
+
+
+async def resolve_addresses(
+    targets: list[str], cache: DeviceCache, scan_duration: float = 10.0
+) -> tuple[list[str], list[str]]:
+    """
+    turns addresses or names into addresses: known devices come straight from
+    the cache, only unknown names are scanned for.
+    Returns the addresses and the targets that were not found
+    """
+    resolved: dict[str, str] = {}
+    unknown = []
+    for target in targets:
+        cached = cache.find(target)
+        if cached is not None:
+            resolved[target] = cached.address
+        elif _is_address(target):
+            # bleak connects to addresses directly
+            resolved[target] = target
+        else:
+            unknown.append(target)
+
+    if unknown:
+        for device, _ in (await scan(scan_duration, unknown)).values():
+            for target in unknown:
+                if target not in resolved and matches(
+                    device.address, device.name, target
+                ):
+                    resolved[target] = device.address
+    missing = [target for target in targets if target not in resolved]
+    return [resolved[t] for t in targets if t in resolved], missing
+
+
+def _is_address(target: str) -> bool:
+    # MAC addresses on Linux/Windows, UUIDs on macOS
+    parts = target.split(":") if ":" in target else target.split("-")
+    return len(parts) in (5, 6) and all(
+        part and all(c in "0123456789abcdefABCDEF" for c in part) for part in parts
+    )
@@ -0,0 +1,96 @@
+import tempfile
+
+DROP_OLDEST = "drop-oldest"
+SPILL = "spill"
+overflow_policies = [DROP_OLDEST, SPILL]
+
+
+class PacketRingBuffer:
+    """
+    fixed size store for notification packets of one size. Packets are copied
+    into a preallocated bytearray, so appending does not allocate. When full,
+    the oldest packet is overwritten (drop-oldest) or the buffered packets are
+    moved to a temporary file on disk (spill)
+    """
+
+    def __init__(self, packet_size: int, capacity: int, overflow: str = SPILL):
+        if overflow not in overflow_policies:
+            raise Exception(f"unknown overflow policy '{overflow}'")
+        if capacity < 1:
+            raise Exception("capacity has to be at least one packet")
+
+        self.packet_size = packet_size
+        self.capacity = capacity
+        self.overflow = overflow
+        self.buffer = bytearray(packet_size * capacity)
+
+        self.head = 0
+        self.count = 0
+        self.spill_file = None
+
+        self.received = 0
+        self.dropped = 0
+        self.malformed = 0
+        self.spilled = 0
+
+    def __len__(self) -> int:
+        return self.count + self.spilled
+
+    def append(self, packet: bytes | bytearray) -> bool:
+        # False if the packet was rejected
+        self.received += 1
+        if len(packet) != self.packet_size:
+            self.malformed += 1
+            return False
+
+        if self.count == self.capacity:
+            if self.overflow == SPILL:
+                self._spill()
+            else:
+                # the slot of the oldest packet is reused below
+                self.dropped += 1
+                self.count -= 1
+
+        offset = self.head * self.packet_size
+        self.buffer[offset : offset + self.packet_size] = packet
+        self.head = (self.head + 1) % self.capacity
+        self.count += 1
+        return True
+
+    def _buffered(self) -> bytes:
+        tail = (self.head - self.count) % self.capacity
+        start = tail * self.packet_size
+        end = start + self.count * self.packet_size
+        if end <= len(self.buffer):
+            return bytes(self.buffer[start:end])
+        return bytes(self.buffer[start:]) + bytes(self.buffer[: end - len(self.buffer)])
+
+    def _spill(self) -> None:
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        self.spill_file.write(self._buffered())
+        self.spilled += self.count
+        self.count = 0
+
+    def read_all(self) -> bytes:
+        """returns all stored packets in arrival order as one contiguous buffer"""
+        spilled = b""
+        if self.spill_file is not None:
+            self.spill_file.seek(0)
+            spilled = self.spill_file.read()
+        return spilled + self._buffered()
+
+    def drain(self) -> bytes:
+        """like read_all, but also removes the returned packets"""
+        contents = self.read_all()
+        self.count = 0
+        self.spilled = 0
+        if self.spill_file is not None:
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+        return contents
+
+    def close(self) -> None:
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
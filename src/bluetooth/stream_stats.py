@@ -0,0 +1,172 @@
+import json
+import time
+from array import array
+
+import numpy as np
+
+from src.movesense.timeline import GAP_FACTOR
+
+# inter-arrival times of notifications in ms, the last bin is open ended
+ARRIVAL_BINS_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class StreamStats:
+    """
+    live statistics of one notification stream. The callback only records the
+    arrival time, everything else is computed per decoded batch with numpy
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.started = time.perf_counter()
+        self.arrivals = array("d")
+        self.last_arrival: float | None = None
+
+        self.packets = 0
+        self.samples = 0
+        self.interval: int | None = None
+        self.samples_per_packet: int | None = None
+
+        self.histogram = np.zeros(len(ARRIVAL_BINS_MS), dtype=np.int64)
+        self.arrival_sum = 0.0
+        self.arrival_squares = 0.0
+        self.arrival_max = 0.0
+
+        self.last_timestamp: int | None = None
+        self.gaps = 0
+        self.missing_samples = 0
+        self.longest_gap = 0
+
+        # rates since the last look at them
+        self._window_start = self.started
+        self._window_packets = 0
+        self._window_samples = 0
+
+    def on_packet(self) -> None:
+        self.arrivals.append(time.perf_counter())
+
+    def take_arrivals(self) -> np.ndarray:
+        arrivals = np.frombuffer(self.arrivals, dtype=np.float64).copy()
+        self.arrivals = array("d")
+        return arrivals
+
+    def add_batch(
+        self,
+        arrivals: np.ndarray,
+        timestamps: np.ndarray,
+        interval: int | None,
+    ) -> None:
+        """
+        arrivals: perf_counter seconds of the packets in the batch,
+        timestamps: the decoded sample timestamps (ms) of the same packets
+        """
+        if len(arrivals):
+            self._add_arrivals(arrivals)
+            self.packets += len(arrivals)
+            self._window_packets += len(arrivals)
+            if len(timestamps):
+                self.samples_per_packet = len(timestamps) // len(arrivals)
+        self.samples += len(timestamps)
+        self._window_samples += len(timestamps)
+        if interval is not None:
+            self.interval = interval
+            self._add_timestamps(timestamps)
+
+    def _add_arrivals(self, arrivals: np.ndarray) -> None:
+        if self.last_arrival is not None:
+            arrivals = np.concatenate(([self.last_arrival], arrivals))
+        self.last_arrival = float(arrivals[-1])
+        differences = np.diff(arrivals) * 1000
+        if len(differences) == 0:
+            return
+
+        bins = np.searchsorted(ARRIVAL_BINS_MS, differences, side="right") - 1
+        self.histogram += np.bincount(bins.clip(0), minlength=len(self.histogram))
+        self.arrival_sum += float(differences.sum())
+        self.arrival_squares += float(np.square(differences).sum())
+        self.arrival_max = max(self.arrival_max, float(differences.max()))
+
+    def _add_timestamps(self, timestamps: np.ndarray) -> None:
+        if len(timestamps) == 0:
+            return
+        if self.last_timestamp is not None:
+            timestamps = np.concatenate(([self.last_timestamp], timestamps))
+        self.last_timestamp = int(timestamps[-1])
+
+        # consecutive samples are one interval apart, anything longer is lost data
+        steps = np.diff(timestamps)
+        gaps = steps[steps > GAP_FACTOR * self.interval]
+        if len(gaps):
+            self.gaps += len(gaps)
+            self.missing_samples += int(np.round(gaps / self.interval).sum()) - len(
+                gaps
+            )
+            self.longest_gap = max(self.longest_gap, int(gaps.max()))
+
+    def expected_packet_rate(self) -> float | None:
+        if not self.interval or not self.samples_per_packet:
+            return None
+        return 1000 / (self.interval * self.samples_per_packet)
+
+    def jitter(self) -> float:
+        # standard deviation of the inter-arrival time in ms
+        count = int(self.histogram.sum())
+        if count < 2:
+            return 0.0
+        mean = self.arrival_sum / count
+        return max(self.arrival_squares / count - mean * mean, 0.0) ** 0.5
+
+    def rates(self, reset: bool = True) -> tuple[float, float]:
+        """packets/s and samples/s since the previous call with reset"""
+        now = time.perf_counter()
+        elapsed = max(now - self._window_start, 1e-9)
+        rates = self._window_packets / elapsed, self._window_samples / elapsed
+        if reset:
+            self._window_start = now
+            self._window_packets = self._window_samples = 0
+        return rates
+
+    def summary(self) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        count = int(self.histogram.sum())
+        labels = [
+            f"{low}-{high}" for low, high in zip(ARRIVAL_BINS_MS, ARRIVAL_BINS_MS[1:])
+        ] + [f"{ARRIVAL_BINS_MS[-1]}+"]
+        return {
+            "name": self.name,
+            "duration": elapsed,
+            "packets": self.packets,
+            "samples": self.samples,
+            "packets_per_second": self.packets / elapsed,
+            "samples_per_second": self.samples / elapsed,
+            "expected_packets_per_second": self.expected_packet_rate(),
+            "interval": self.interval,
+            "arrival_mean_ms": self.arrival_sum / count if count else None,
+            "arrival_jitter_ms": self.jitter(),
+            "arrival_max_ms": self.arrival_max,
+            "arrival_histogram_ms": dict(zip(labels, self.histogram.tolist())),
+            "gaps": self.gaps,
+            "missing_samples": self.missing_samples,
+            "longest_gap_ms": self.longest_gap,
+        }
+
+    def report(self) -> str:
+        # the status line, after which the rates start a new window
+        line = str(self)
+        self.rates()
+        return line
+
+    def __str__(self) -> str:
+        packet_rate, sample_rate = self.rates(reset=False)
+        expected = self.expected_packet_rate()
+        expected = f" (expected {expected:.1f})" if expected else ""
+        return (
+            f"{self.name}: {packet_rate:.1f} packets/s{expected}, "
+            f"{sample_rate:.0f} samples/s, jitter {self.jitter():.1f} ms, "
+            f"{self.gaps} gaps ({self.missing_samples} samples missing)"
+        )
+
+    def save(self, filename: str) -> str:
+        with open(filename, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+        return filename
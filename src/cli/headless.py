@@ -0,0 +1,334 @@
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import time
+from dataclasses import asdict
+
+import bleak
+
+from src.bluetooth import device_cache
+from src.bluetooth.device_cache import DeviceCache, resolve_addresses
+from src.common.definitions import ECG_INTERVALS, IMU_INTERVALS
+from src.common.exporters import exporters
+from src.movesense import batch_convert
+from src.movesense.session import RecordingSession
+
+# non-interactive counterpart of the menus, for scripts and unattended captures:
+# every line on stdout is one JSON object with an "event" and a "time" field
+
+
+def emit(event: str, **fields) -> None:
+    line = {"event": event, "time": round(time.time(), 3), **fields}
+    print(json.dumps(line, default=str), flush=True)
+
+
+def stop_on_signals(stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # windows event loops and loops outside the main thread
+            pass
+
+
+class _ErrorReporter:
+    # every failing device is reported once, whenever its error shows up
+    def __init__(self, session: RecordingSession):
+        self.session = session
+        self.reported = set()
+
+    def __call__(self) -> None:
+        for d in self.session.devices:
+            if d.error is not None and id(d) not in self.reported:
+                self.reported.add(id(d))
+                emit("error", device=d.name, error=d.error)
+
+
+def remember_devices(session: RecordingSession, cache: DeviceCache | None) -> None:
+    if cache is None:
+        return
+    for d in session.connected_devices():
+        cache.remember(d.device, d.firmware)
+    cache.save()
+
+
+async def scan(timeout: float, targets: list[str] = ()) -> int:
+    # with targets the scan ends as soon as all of them were seen
+    discovered = await device_cache.scan(timeout, targets)
+    for device, advertisement in discovered.values():
+        emit(
+            "device",
+            address=str(device.address),
+            name=device.name,
+            rssi=advertisement.rssi,
+        )
+    missing = [
+        target
+        for target in targets
+        if not any(
+            device_cache.matches(device.address, device.name, target)
+            for device, _ in discovered.values()
+        )
+    ]
+    emit("done", devices=len(discovered), missing=missing)
+    return 1 if missing else 0
+
+
+async def run_recording(
+    session: RecordingSession,
+    duration: float | None = None,
+    status_interval: float = 1.0,
+    stop: asyncio.Event | None = None,
+    cache: DeviceCache | None = None,
+) -> int:
+    """
+    records until duration (s) has passed or stop is set, reporting the
+    session progress every status_interval seconds
+    """
+    stop = stop or asyncio.Event()
+    report_errors = _ErrorReporter(session)
+    begin = time.perf_counter()
+    connected = await session.connect()
+    report_errors()
+    if not connected:
+        return 1
+
+    try:
+        await session.start()
+        report_errors()
+        remember_devices(session, cache)
+        emit(
+            "started",
+            directory=session.directory,
+            # time from the command to streaming, most of it is connecting
+            setup_seconds=round(time.perf_counter() - begin, 3),
+            devices=[d.name for d in session.connected_devices()],
+            streams=list(session.streams),
+            start_time=session.start_time,
+            sync_spread=session.sync_spread,
+        )
+
+        end = None if duration is None else time.monotonic() + duration
+        while not stop.is_set():
+            timeout = status_interval
+            if end is not None:
+                timeout = min(timeout, end - time.monotonic())
+                if timeout <= 0:
+                    break
+            try:
+                await asyncio.wait_for(stop.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            emit("progress", **session.progress())
+
+        manifest = await session.stop()
+        emit("stopped", manifest=manifest, **session.progress())
+    finally:
+        # whatever was received is kept, also after an error or a cancellation
+        await session.abort()
+    return 0 if all(d.error is None for d in session.devices) else 1
+
+
+async def run_transfer(
+    session: RecordingSession,
+    status_interval: float = 1.0,
+    cache: DeviceCache | None = None,
+) -> int:
+    report_errors = _ErrorReporter(session)
+    connected = await session.connect()
+    report_errors()
+    if not connected:
+        return 1
+
+    try:
+        start = time.perf_counter()
+        results = await session.transfer(
+            lambda progress: emit("progress", **asdict(progress))
+        )
+        report_errors()
+        remember_devices(session, cache)
+        for result in results:
+            emit("transferred", **asdict(result))
+        for d in session.connected_devices():
+            if d.config is None:
+                emit(
+                    "error", device=d.name, error="v7 devices do not record internally"
+                )
+        emit(
+            "done",
+            devices=len(results),
+            bytes=sum(result.bytes for result in results),
+            duration=round(time.perf_counter() - start, 3),
+        )
+    finally:
+        await session.disconnect()
+    failed = any(result.error is not None for result in results)
+    return 1 if failed or any(d.error is not None for d in session.devices) else 0
+
+
+def convert(
+    paths: list[str],
+    export_format: str,
+    workers: int | None,
+    force: bool,
+    use_index: bool = False,
+) -> int:
+    filenames = batch_convert.find_sbem_files(paths)
+    if not filenames:
+        emit("error", error="no .bin files found")
+        return 1
+
+    start = time.perf_counter()
+    results = batch_convert.convert_all(
+        filenames,
+        export_format,
+        workers,
+        force,
+        report=lambda result: emit("converted", **asdict(result)),
+        use_index=use_index,
+    )
+    emit(
+        "done",
+        converted=sum(not r.skipped and r.error is None for r in results),
+        skipped=sum(r.skipped for r in results),
+        failed=sum(r.error is not None for r in results),
+        duration=round(time.perf_counter() - start, 3),
+    )
+    return 1 if any(result.error is not None for result in results) else 0
+
+
+async def find_devices(targets: list[str], cache: DeviceCache) -> list[str]:
+    # known devices and plain addresses are connected to without a scan
+    addresses, missing = await resolve_addresses(targets, cache)
+    for target in missing:
+        emit("error", device=target, error="device not found")
+    return addresses
+
+
+async def record(args: argparse.Namespace) -> int:
+    cache = DeviceCache.load()
+    addresses = await find_devices(args.device, cache)
+    if not addresses:
+        return 1
+    intervals = {
+        stream: interval
+        for stream, interval in (("ecg", args.ecg), ("imu", args.imu))
+        if interval is not None
+    }
+    streams = tuple(intervals) + (("hr",) if args.hr else ())
+    session = RecordingSession.from_addresses(
+        addresses,
+        streams=streams,
+        export_format=args.format,
+        subfolder=args.out,
+        intervals=intervals,
+    )
+    stop = asyncio.Event()
+    stop_on_signals(stop)
+    return await run_recording(
+        session, args.duration, args.status_interval, stop, cache
+    )
+
+
+async def transfer(args: argparse.Namespace) -> int:
+    cache = DeviceCache.load()
+    addresses = await find_devices(args.device, cache)
+    if not addresses:
+        return 1
+    session = RecordingSession.from_addresses(addresses, subfolder=args.out)
+    return await run_transfer(session, args.status_interval, cache)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli.headless",
+        description="record, transfer and convert Movesense data without the menus,"
+        " progress is printed as one JSON object per line",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser("scan", help="list nearby devices")
+    scan_parser.add_argument("--timeout", type=float, default=5.0)
+    scan_parser.add_argument(
+        "--find",
+        action="append",
+        default=[],
+        help="address or name, repeatable, stops the scan once all were seen",
+    )
+
+    record_parser = commands.add_parser("record", help="stream into files")
+    record_parser.add_argument(
+        "--device", action="append", required=True, help="address or name, repeatable"
+    )
+    record_parser.add_argument(
+        "--ecg", type=int, choices=ECG_INTERVALS, help="ECG interval (ms)"
+    )
+    record_parser.add_argument(
+        "--imu", type=int, choices=IMU_INTERVALS, help="IMU interval (ms)"
+    )
+    record_parser.add_argument(
+        "--hr", action="store_true", help="also record heart rate and RR intervals"
+    )
+    record_parser.add_argument(
+        "--duration", type=float, help="seconds, default: until SIGINT/SIGTERM"
+    )
+    record_parser.add_argument("--out", default="data")
+    record_parser.add_argument("--format", default="csv", choices=list(exporters))
+    record_parser.add_argument("--status-interval", type=float, default=1.0)
+
+    transfer_parser = commands.add_parser(
+        "transfer", help="pull the internal recordings of v8 devices"
+    )
+    transfer_parser.add_argument(
+        "--device", action="append", required=True, help="address or name, repeatable"
+    )
+    transfer_parser.add_argument("--out", default="data")
+    transfer_parser.add_argument("--status-interval", type=float, default=1.0)
+
+    convert_parser = commands.add_parser(
+        "convert", help="convert recordings (.bin) to data files"
+    )
+    convert_parser.add_argument("paths", nargs="+", help="directories, files or globs")
+    convert_parser.add_argument("--format", default="csv", choices=list(exporters))
+    convert_parser.add_argument("--workers", type=int, default=None)
+    convert_parser.add_argument(
+        "--force", action="store_true", help="also convert up to date files"
+    )
+    convert_parser.add_argument(
+        "--index",
+        action="store_true",
+        help="read through the sidecar chunk index, faster when converting again",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "record" and not (args.ecg or args.imu or args.hr):
+        parser.error("record needs at least one of --ecg, --imu and --hr")
+    return args
+
+
+def run_command(args: argparse.Namespace) -> int:
+    if args.command == "scan":
+        return asyncio.run(scan(args.timeout, args.find))
+    if args.command == "record":
+        return asyncio.run(record(args))
+    if args.command == "transfer":
+        return asyncio.run(transfer(args))
+    return convert(args.paths, args.format, args.workers, args.force, args.index)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    try:
+        return run_command(args)
+    except (bleak.exc.BleakError, OSError) as e:
+        # e.g. no bluetooth adapter, reported like every other error
+        emit("error", error=str(e) or type(e).__name__)
+        return 1
+
+
+if __name__ == "__main__":
+    # python -m src.cli.headless record --device AA:BB:CC:DD:EE:FF --ecg 2 --imu 10
+    sys.exit(main())
@@ -6,6 +6,10 @@ ACTIVITY_SVC_UUID_16 = 0x1859
 HR_SVC_UUID_128 = bleak.uuids.normalize_uuid_16(HR_SVC_UUID_16)
 ACTIVITY_SVC_UUID_128 = bleak.uuids.normalize_uuid_16(ACTIVITY_SVC_UUID_16)
 
+# standard Heart Rate Measurement characteristic of the heart rate service
+HR_MEASUREMENT_UUID_16 = 0x2A37
+HR_MEASUREMENT_UUID_128 = bleak.uuids.normalize_uuid_16(HR_MEASUREMENT_UUID_16)
+
 
 class MovesenseV7:
     ECG_VOLTAGE_UUID_16 = 0x2BDD
@@ -0,0 +1,92 @@
+import asyncio
+import functools
+import multiprocessing
+import queue
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+executor_types = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+_executor: Executor | None = None
+_manager = None
+
+
+def configure_executor(kind: str = "thread", max_workers: int | None = None) -> None:
+    """
+    selects the pool that CPU heavy work (decoding, exporting) is run in, so
+    that BLE notifications and the menu stay responsive meanwhile
+    """
+    global _executor
+    if kind not in executor_types:
+        raise Exception(f"unknown executor '{kind}', use one of {list(executor_types)}")
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = executor_types[kind](max_workers=max_workers)
+
+
+def shutdown_executor() -> None:
+    """
+    stops the pool and the manager process behind the progress queues, the
+    next run_in_executor starts the default pool again
+    """
+    global _executor, _manager
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
+
+
+def get_executor() -> Executor:
+    if _executor is None:
+        configure_executor()
+    return _executor
+
+
+def _progress_queue():
+    # process pools need a queue that can be handed to the worker processes
+    global _manager
+    if not isinstance(get_executor(), ProcessPoolExecutor):
+        return queue.SimpleQueue()
+    if _manager is None:
+        _manager = multiprocessing.Manager()
+    return _manager.Queue()
+
+
+async def run_in_executor(
+    function: Callable[..., Any],
+    *args,
+    progress: Callable[[float], None] | None = None,
+    progress_interval: float = 0.1,
+) -> Any:
+    """
+    runs function(*args) in the configured pool. If progress is given, the
+    function is called with a progress=callable(fraction) keyword argument and
+    its reports are forwarded to progress on the event loop
+    """
+    loop = asyncio.get_running_loop()
+    if progress is None:
+        return await loop.run_in_executor(
+            get_executor(), functools.partial(function, *args)
+        )
+
+    reports = _progress_queue()
+    future = loop.run_in_executor(
+        get_executor(), functools.partial(function, *args, progress=reports.put)
+    )
+
+    def forward_reports():
+        latest = None
+        while True:
+            try:
+                latest = reports.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            progress(latest)
+
+    while not future.done():
+        await asyncio.wait([future], timeout=progress_interval)
+        forward_reports()
+    return future.result()
@@ -0,0 +1,215 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+def to_columns(
+    header: str, timestamps: np.ndarray, values: np.ndarray
+) -> dict[str, np.ndarray]:
+    names = header.split(", ")
+    if values.size != len(timestamps) * (len(names) - 1):
+        raise Exception(f"header '{header}' does not match the value columns")
+    values = values.reshape(len(timestamps), len(names) - 1)
+
+    columns = {names[0]: timestamps}
+    columns.update({name: values[:, i] for i, name in enumerate(names[1:])})
+    return columns
+
+
+class ExportWriter(ABC):
+    """
+    appends batches of samples to one output file, so that long recordings
+    never have to be held in memory as a whole
+    """
+
+    def __init__(self, filename: str, header: str):
+        self.filename = filename
+        self.header = header
+        self.names = header.split(", ")
+        self.samples = 0
+
+    def __enter__(self) -> "ExportWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def append(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        self._append(to_columns(self.header, timestamps, values))
+        self.samples += len(timestamps)
+
+    def flush(self) -> None:
+        # writers that buffer in memory push their data to disk here
+        pass
+
+    @abstractmethod
+    def _append(self, columns: dict[str, np.ndarray]) -> None: ...
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+
+class CsvWriter(ExportWriter):
+    def __init__(self, filename: str, header: str):
+        super().__init__(filename, header)
+        self.file = open(filename, "w")
+        self.file.write(header + "\n")
+        self.line = ", ".join(["{}"] * len(self.names)) + "\n"
+
+    def _append(self, columns: dict[str, np.ndarray]) -> None:
+        rows = zip(*(column.tolist() for column in columns.values()))
+        self.file.writelines(self.line.format(*row) for row in rows)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class NpzWriter(ExportWriter):
+    def __init__(self, filename: str, header: str):
+        super().__init__(filename, header)
+        # every column is spooled to its own temporary file until the length is known
+        self.spools = {name: tempfile.TemporaryFile() for name in self.names}
+        self.dtypes = {name: np.dtype(np.int64) for name in self.names}
+        self.length = 0
+
+    def _append(self, columns: dict[str, np.ndarray]) -> None:
+        for name, column in columns.items():
+            if self.length == 0:
+                self.dtypes[name] = column.dtype
+            self.spools[name].write(column.astype(self.dtypes[name]).tobytes())
+        self.length += len(columns[self.names[0]])
+
+    def flush(self) -> None:
+        for spool in self.spools.values():
+            spool.flush()
+
+    def close(self) -> None:
+        with zipfile.ZipFile(self.filename, "w", allowZip64=True) as archive:
+            for name, spool in self.spools.items():
+                spool.seek(0)
+                with archive.open(f"{name}.npy", "w", force_zip64=True) as entry:
+                    np.lib.format.write_array_header_1_0(
+                        entry,
+                        {
+                            "descr": np.lib.format.dtype_to_descr(self.dtypes[name]),
+                            "fortran_order": False,
+                            "shape": (self.length,),
+                        },
+                    )
+                    shutil.copyfileobj(spool, entry)
+                spool.close()
+
+
+class ParquetWriter(ExportWriter):
+    def __init__(self, filename: str, header: str):
+        super().__init__(filename, header)
+        self.pyarrow, self.parquet = _import_pyarrow()
+        self.writer = None
+
+    def _append(self, columns: dict[str, np.ndarray]) -> None:
+        table = self.pyarrow.table(columns)
+        if self.writer is None:
+            self.writer = self.parquet.ParquetWriter(self.filename, table.schema)
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is None:
+            empty = {name: np.empty(0, dtype=np.int64) for name in self.names}
+            self.parquet.write_table(self.pyarrow.table(empty), self.filename)
+            return
+        self.writer.close()
+
+
+class Exporter(ABC):
+    extension: str
+    writer: type[ExportWriter]
+
+    def open(self, filename_base: str, header: str) -> ExportWriter:
+        os.makedirs(os.path.dirname(filename_base) or ".", exist_ok=True)
+        return self.writer(f"{filename_base}.{self.extension}", header)
+
+    def write(
+        self,
+        filename_base: str,
+        header: str,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+    ) -> str:
+        with self.open(filename_base, header) as writer:
+            writer.append(timestamps, values)
+        return writer.filename
+
+    @abstractmethod
+    def read(self, filename: str) -> dict[str, np.ndarray]: ...
+
+
+class CsvExporter(Exporter):
+    extension = "csv"
+    writer = CsvWriter
+
+    def read(self, filename: str) -> dict[str, np.ndarray]:
+        with open(filename) as file:
+            names = file.readline().strip().split(", ")
+            empty = not file.readline().strip()
+        if empty:
+            # e.g. a stream that never sent a packet, typed like an empty npz
+            return {name: np.empty(0, dtype=np.int64) for name in names}
+        try:
+            data = np.loadtxt(
+                filename, delimiter=",", skiprows=1, dtype=np.int64, ndmin=2
+            )
+        except ValueError:
+            # float values, e.g. NaN gap markers
+            data = np.loadtxt(filename, delimiter=",", skiprows=1, ndmin=2)
+            columns = {name: data[:, i] for i, name in enumerate(names)}
+            columns[names[0]] = columns[names[0]].astype(np.int64)
+            return columns
+        return {name: data[:, i] for i, name in enumerate(names)}
+
+
+class NpzExporter(Exporter):
+    extension = "npz"
+    writer = NpzWriter
+
+    def read(self, filename: str) -> dict[str, np.ndarray]:
+        with np.load(filename) as file:
+            return {name: file[name] for name in file.files}
+
+
+class ParquetExporter(Exporter):
+    extension = "parquet"
+    writer = ParquetWriter
+
+    def read(self, filename: str) -> dict[str, np.ndarray]:
+        _, parquet = _import_pyarrow()
+        table = parquet.read_table(filename)
+        return {name: table[name].to_numpy() for name in table.column_names}
+
+
+def _import_pyarrow():
+    # optional dependency, only needed for parquet export
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("parquet export requires pyarrow (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+exporters: dict[str, Exporter] = {
+    exporter.extension: exporter
+    for exporter in [CsvExporter(), NpzExporter(), ParquetExporter()]
+}
+
+
+def get_exporter(name: str) -> Exporter:
+    if name not in exporters:
+        raise Exception(f"unknown export format '{name}', use one of {list(exporters)}")
+    return exporters[name]
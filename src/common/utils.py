@@ -18,7 +18,8 @@ def clear_screen() -> str:
     if os.name == "nt":
         os.system("cls")
     else:
-        os.system("clear")
+        # escape sequence instead of spawning `clear` on every menu render
+        sys.stdout.write("\033[2J\033[H")
 
     return ""
 
@@ -27,20 +28,6 @@ def parse_uint16(bytes) -> int:
     return int.from_bytes(bytes, "little")
 
 
-def get_svc_by_uuid(dev: bleak.BleakClient, uuid):
-    services = list(filter(lambda svc: svc.uuid == uuid, dev.services))
-    if services:
-        return services[0]
-    return None
-
-
-def get_char_by_uuid(svc, uuid):
-    characteristics = list(filter(lambda char: char.uuid == uuid, svc.characteristics))
-    if characteristics:
-        return characteristics[0]
-    return None
-
-
 class BinaryAggregator:
     def __init__(self):
         self.data = []
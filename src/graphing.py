@@ -1,23 +1,213 @@
+import asyncio
+import time
+from typing import Callable
+
 import numpy as np
-import pyqtgraph as pg
-from PyQt5 import QtCore
 
-if __name__ == "__main__":
-    app = pg.mkQApp("RealTimeAccel")
-    plot = pg.plot(title="accelerometer data")
-    curve = plot.plot(pen="y")
 
-    data = np.random.normal(size=100)
+class CircularBuffer:
+    """
+    keeps the latest `capacity` samples of a stream. New samples overwrite the
+    oldest ones at the write index, nothing is shifted like with np.roll
+    """
+
+    def __init__(self, capacity: int, channels: int = 1):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, channels), np.nan, dtype=np.float32)
+        self.index = 0
+        self.count = 0
+        self.version = 0
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        values = np.asarray(values).reshape(len(timestamps), -1)
+        if len(timestamps) > self.capacity:
+            timestamps, values = timestamps[-self.capacity :], values[-self.capacity :]
+
+        positions = (self.index + np.arange(len(timestamps))) % self.capacity
+        self.timestamps[positions] = timestamps
+        self.values[positions] = values
+        self.index = (self.index + len(timestamps)) % self.capacity
+        self.count = min(self.count + len(timestamps), self.capacity)
+        self.version += 1
+
+    def positions(self, points: int | None = None) -> np.ndarray:
+        """buffer positions from oldest to newest, optionally only `points` of them"""
+        start = (self.index - self.count) % self.capacity
+        if points is None or points >= self.count:
+            offsets = np.arange(self.count)
+        else:
+            offsets = np.linspace(0, self.count - 1, points).astype(np.int64)
+        return (start + offsets) % self.capacity
+
+
+def decimate(
+    timestamps: np.ndarray, values: np.ndarray, width: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    reduces a trace to at most 2 * width points by keeping the minimum and
+    maximum of every pixel column, so that narrow peaks (R waves) stay visible
+    """
+    if len(timestamps) <= 2 * width:
+        return timestamps, values
+    # columns of (almost) equal size that cover every sample, the newest too
+    starts = np.linspace(0, len(timestamps), width + 1).astype(np.int64)[:-1]
+    # fmin and fmax skip NaN gap markers like nanmin and nanmax
+    lows, highs = np.fmin.reduceat(values, starts), np.fmax.reduceat(values, starts)
+    return np.repeat(timestamps[starts], 2), np.stack([lows, highs], axis=1).reshape(-1)
+
+
+def batch_interval(timestamps: np.ndarray, default: int = 2) -> int:
+    # the shortest interval of any stream is the default, so the window is
+    # rather too long than too short
+    steps = np.diff(timestamps)
+    steps = steps[steps > 0]
+    if len(steps) == 0:
+        return default
+    return max(int(np.median(steps)), 1)
+
+
+class HeadlessRenderer:
+    """keeps the last frame instead of drawing it, for tests and benchmarks"""
+
+    def __init__(self):
+        self.frames = 0
+        self.traces: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    def draw(self, name: str, timestamps: np.ndarray, values: np.ndarray) -> None:
+        self.traces[name] = timestamps, values
+
+    def show(self) -> None:
+        self.frames += 1
+
+    def close(self) -> None:
+        pass
+
+
+class PyQtGraphRenderer:
+    def __init__(self, title: str = "movesense live"):
+        pyqtgraph = _import_pyqtgraph()
+        self.app = pyqtgraph.mkQApp(title)
+        self.window = pyqtgraph.GraphicsLayoutWidget(title=title)
+        self.window.show()
+        self.plots = {}
+        self.curves = {}
+
+    def draw(self, name: str, timestamps: np.ndarray, values: np.ndarray) -> None:
+        stream = name.split("/")[0]
+        if stream not in self.plots:
+            self.plots[stream] = self.window.addPlot(title=stream)
+            self.window.nextRow()
+        if name not in self.curves:
+            pen = len([n for n in self.curves if n.startswith(stream)])
+            self.curves[name] = self.plots[stream].plot(pen=(pen, 9))
+        self.curves[name].setData(timestamps, values, connect="finite")
+
+    def show(self) -> None:
+        # the viewer runs inside the asyncio loop instead of app.exec()
+        self.app.processEvents()
+
+    def close(self) -> None:
+        self.window.close()
+
+
+def _import_pyqtgraph():
+    # optional dependency, only needed for the live plot window
+    try:
+        import pyqtgraph
+    except ImportError:
+        raise Exception(
+            "live plotting requires pyqtgraph (pip install pyqtgraph PyQt5)"
+        )
+    return pyqtgraph
+
+
+class LiveViewer:
+    """
+    plots the decoded batches of running collectors. Batches only go into
+    circular buffers, drawing happens at a fixed frame rate in its own task,
+    so notification handling never waits for the screen
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 10.0,
+        fps: float = 25.0,
+        width: int = 1000,
+        headless: bool = False,
+    ):
+        self.window_seconds = window_seconds
+        self.fps = fps
+        self.width = width
+        self.renderer = HeadlessRenderer() if headless else PyQtGraphRenderer()
+        self.buffers: dict[str, CircularBuffer] = {}
+        self.channels: dict[str, list[str]] = {}
+        self.drawn: dict[str, int] = {}
+        self.frame_time = 0.0
+        self._task: asyncio.Task | None = None
+
+    def add_stream(
+        self, name: str, header: str, interval: int | None = None
+    ) -> Callable:
+        """
+        registers a stream and returns the listener to hand to its collector.
+        Without a known interval (ms) the window is sized from the first batch
+        """
+        channels = header.split(", ")[1:]
+        self.channels[name] = channels
+        self.drawn[name] = -1
+        if interval is not None:
+            self._add_buffer(name, interval)
+
+        def listener(timestamps: np.ndarray, values: np.ndarray) -> None:
+            if name not in self.buffers:
+                self._add_buffer(name, batch_interval(timestamps))
+            self.buffers[name].extend(timestamps, values)
+
+        return listener
+
+    def _add_buffer(self, name: str, interval: int) -> None:
+        capacity = int(self.window_seconds * 1000 / interval)
+        self.buffers[name] = CircularBuffer(capacity, len(self.channels[name]))
+
+    def render(self) -> None:
+        start = time.perf_counter()
+        for name, buffer in self.buffers.items():
+            if buffer.version == self.drawn[name] or buffer.count == 0:
+                continue
+            self.drawn[name] = buffer.version
+            # every pixel column gets a min and a max, read only those samples
+            positions = buffer.positions(self.width * 16)
+            timestamps = buffer.timestamps[positions]
+            for i, channel in enumerate(self.channels[name]):
+                self.renderer.draw(
+                    f"{name}/{channel}",
+                    *decimate(timestamps, buffer.values[positions, i], self.width),
+                )
+        self.renderer.show()
+        self.frame_time = time.perf_counter() - start
+
+    async def _frame_loop(self) -> None:
+        period = 1 / self.fps
+        next_frame = time.perf_counter()
+        while True:
+            self.render()
+            next_frame += period
+            await asyncio.sleep(max(next_frame - time.perf_counter(), 0))
 
-    def update():
-        global data
-        new_data = np.random.normal()
-        data = np.roll(data, -1)
-        data[-1] = new_data
-        curve.setData(data)
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._frame_loop())
 
-    timer = QtCore.QTimer()
-    timer.timeout.connect(update)
-    timer.start(40)
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.renderer.close()
 
-    app.exec_()
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
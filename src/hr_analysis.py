@@ -1,11 +1,322 @@
-import heartpy as hp
-import pandas as pd
+import argparse
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.common.exporters import exporters, get_exporter
+from src.movesense.sbem_parser import SbemFile, ecg_chunk, iter_sbem_batches
+from src.movesense.timeline import estimate_interval
+
+hrv_header = "timestamp, beats, bpm, rmssd, sdnn"
+
+# RR intervals outside of 30..200 bpm are taken as detection errors
+MIN_RR = 300
+MAX_RR = 2000
+# the detector threshold starts from the strongest QRS in the first seconds
+LEARNING_MS = 2000
+# samples per call when feeding arrays that are already in memory
+FEED_SIZE = 1 << 16
+
+
+class RPeakDetector:
+    """
+    streaming QRS detector in the style of Pan-Tompkins: the squared slope of
+    the ECG is integrated over 150 ms and local maxima above an adaptive
+    threshold mark a QRS complex. The R peak is the sample deviating most from
+    the baseline within the integration window. Only the few hundred ms that
+    are not decided yet are carried from one batch to the next
+    """
+
+    def __init__(self, interval: int, refractory_ms: int = 250):
+        self.interval = interval
+        self.refractory_ms = refractory_ms
+        self.integration = max(round(150 / interval), 1)
+        self.radius = max(round(refractory_ms / interval), 1)
+        self.values = np.empty(0)
+        self.timestamps = np.empty(0, dtype=np.int64)
+        # samples before this index of the carried buffer are decided already
+        self.decided = 0
+        self.level: float | None = None
+        self.last_peak: int | None = None
+
+    @property
+    def decided_until(self) -> int | None:
+        if self.decided == 0 or len(self.timestamps) == 0:
+            return None
+        # peaks lie up to one integration window before the decided samples
+        return int(self.timestamps[self.decided - 1]) - self.integration * self.interval
+
+    def add(self, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """returns the timestamps (ms) of the R peaks found in this batch"""
+        values = np.concatenate((self.values, np.asarray(values, dtype=np.float64)))
+        timestamps = np.concatenate((self.timestamps, timestamps))
+        window, radius = self.integration, self.radius
+
+        peaks = []
+        learning = self.level is None and len(values) * self.interval < LEARNING_MS
+        if not learning and len(values) > window + 2 * radius:
+            # energy[k] integrates the slope up to sample k + window
+            slope = np.square(np.diff(values))
+            energy = sliding_window_view(slope, window).mean(axis=1)
+            maxima = sliding_window_view(energy, 2 * radius + 1).max(axis=1)
+            if self.level is None:
+                self.level = float(energy.max())
+
+            start = max(self.decided, window + radius)
+            end = len(values) - radius
+            samples = np.arange(start, end)
+            is_peak = energy[samples - window] == maxima[samples - window - radius]
+            for sample in samples[is_peak].tolist():
+                qrs = values[sample - window : sample + 1]
+                r_peak = sample - window + int(np.argmax(np.abs(qrs - np.median(qrs))))
+                peak = self._accept(
+                    float(energy[sample - window]), int(timestamps[r_peak])
+                )
+                if peak is not None:
+                    peaks.append(peak)
+
+            keep = len(values) - 2 * radius - window
+            values, timestamps = values[keep:], timestamps[keep:]
+            self.decided = end - keep
+
+        self.values, self.timestamps = values, timestamps
+        return np.array(peaks, dtype=np.int64)
+
+    def _accept(self, energy: float, timestamp: int) -> int | None:
+        threshold = 0.3 * self.level
+        if self.last_peak is not None:
+            since_last = timestamp - self.last_peak
+            if since_last < self.refractory_ms:
+                return None
+            # missed beats, the signal got weaker: search with a lower threshold
+            if since_last > MAX_RR:
+                threshold /= 2
+        if energy < threshold:
+            return None
+        self.level = 0.875 * self.level + 0.125 * energy
+        self.last_peak = timestamp
+        return timestamp
+
+
+def hrv_window(end: int, peaks: np.ndarray) -> tuple[int, int, float, float, float]:
+    rr = np.diff(peaks)
+    rr = rr[(rr >= MIN_RR) & (rr <= MAX_RR)].astype(np.float64)
+    if len(rr) < 2:
+        return end, len(peaks), math.nan, math.nan, math.nan
+    return (
+        end,
+        len(peaks),
+        float(60000 / rr.mean()),
+        float(np.sqrt(np.mean(np.square(np.diff(rr))))),
+        float(rr.std()),
+    )
+
+
+class HrvAnalyzer:
+    """
+    heart rate and HRV (RMSSD, SDNN) over sliding windows of window_seconds,
+    one row every step_seconds. Window ends are multiples of the step, so that
+    parts of a recording analyzed separately line up. Only the R peaks of the
+    current window are kept, memory does not grow with the recording length.
+    `add` can be used as listener of a running ECG collector
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 30,
+        step_seconds: float = 10,
+        interval: int | None = None,
+        refractory_ms: int = 250,
+    ):
+        self.window = int(window_seconds * 1000)
+        self.step = int(step_seconds * 1000)
+        self.interval = interval
+        self.refractory_ms = refractory_ms
+        self.detector: RPeakDetector | None = None
+        self.peaks: deque[int] = deque()
+        self.next_end: int | None = None
+        self.last_timestamp: int | None = None
+        self.rows: list[tuple] = []
+
+    def add(self, timestamps: np.ndarray, values: np.ndarray) -> list[tuple]:
+        """returns the rows of the windows completed by this batch"""
+        if len(timestamps) == 0:
+            return []
+        if self.detector is None:
+            interval = self.interval or estimate_interval(timestamps, 1)
+            if interval is None:
+                return []
+            self.detector = RPeakDetector(interval, self.refractory_ms)
+            first_end = int(timestamps[0]) + self.window
+            self.next_end = -(-first_end // self.step) * self.step
+
+        self.peaks.extend(self.detector.add(timestamps, values).tolist())
+        self.last_timestamp = int(timestamps[-1])
+        decided = self.detector.decided_until
+        return self._complete_windows(decided if decided is not None else -math.inf)
+
+    def finish(self) -> list[tuple]:
+        """completes the windows that end within the analyzed data"""
+        if self.last_timestamp is None:
+            return []
+        return self._complete_windows(self.last_timestamp)
+
+    def _complete_windows(self, until: float) -> list[tuple]:
+        rows = []
+        while self.next_end <= until:
+            start = self.next_end - self.window
+            while self.peaks and self.peaks[0] < start:
+                self.peaks.popleft()
+            peaks = np.fromiter(
+                (p for p in self.peaks if p < self.next_end), dtype=np.int64
+            )
+            rows.append(hrv_window(self.next_end, peaks))
+            self.next_end += self.step
+        self.rows.extend(rows)
+        return rows
+
+    def table(self) -> tuple[np.ndarray, np.ndarray]:
+        """window end timestamps and a (windows x 4) matrix: beats, bpm, rmssd, sdnn"""
+        return rows_to_table(self.rows)
+
+
+def rows_to_table(rows: list[tuple]) -> tuple[np.ndarray, np.ndarray]:
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, 4))
+    table = np.array(rows, dtype=np.float64)
+    return table[:, 0].astype(np.int64), table[:, 1:]
+
+
+def analyze_sbem(
+    filename: str, window_seconds: float = 30, step_seconds: float = 10
+) -> list[tuple]:
+    """one streaming pass over the ECG of a recording"""
+    analyzer = HrvAnalyzer(window_seconds, step_seconds)
+    with open(filename, "rb") as file:
+        for chunk_type, timestamps, values in iter_sbem_batches(file):
+            if chunk_type is ecg_chunk:
+                analyzer.add(timestamps, values)
+    analyzer.finish()
+    return analyzer.rows
+
+
+def _analyze_segment(
+    filename: str,
+    start: int,
+    end: int,
+    window_seconds: float,
+    step_seconds: float,
+    is_last: bool,
+) -> list[tuple]:
+    # module level, so that it can be sent to the worker processes. Reads a
+    # bit more than the segment: one window plus some seconds for the
+    # detector threshold before it, and the undecided samples after it
+    warmup = int(window_seconds * 1000) + 5000
+    with SbemFile(filename) as sbem_file:
+        timestamps, values = sbem_file.read(
+            ecg_chunk, max(start - warmup, 0), end + 2000
+        )
+        first = sbem_file.start_time
+
+    analyzer = HrvAnalyzer(window_seconds, step_seconds)
+    for i in range(0, len(timestamps), FEED_SIZE):
+        analyzer.add(timestamps[i : i + FEED_SIZE], values[i : i + FEED_SIZE])
+    if is_last:
+        analyzer.finish()
+    return [
+        row
+        for row in analyzer.rows
+        if first + start <= row[0] < first + end
+        or (is_last and row[0] >= first + start)
+    ]
+
+
+def analyze_sbem_parallel(
+    filename: str,
+    window_seconds: float = 30,
+    step_seconds: float = 10,
+    workers: int | None = None,
+    segment_seconds: float = 600,
+) -> list[tuple]:
+    """
+    splits the recording into segments that are analyzed in a process pool,
+    the rows are the same as from analyze_sbem
+    """
+    with SbemFile(filename) as sbem_file:
+        time_range = sbem_file.time_range(ecg_chunk)
+        first = sbem_file.start_time
+    if time_range is None:
+        return []
+
+    # segment borders on the window grid, relative to the start of the recording
+    step = int(step_seconds * 1000)
+    length = time_range[1] - first
+    size = max(int(segment_seconds * 1000) // step, 1) * step
+    borders = list(range(-(first % step), length, size)) + [length]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _analyze_segment,
+                filename,
+                start,
+                end,
+                window_seconds,
+                step_seconds,
+                i == len(borders) - 2,
+            )
+            for i, (start, end) in enumerate(zip(borders, borders[1:]))
+        ]
+        return [row for future in futures for row in future.result()]
+
+
+def analyze_export(
+    filename: str, window_seconds: float = 30, step_seconds: float = 10
+) -> list[tuple]:
+    # ECG recorded by the collectors or converted from SBEM (timestamp, value)
+    columns = list(exporters[filename.rsplit(".", 1)[1]].read(filename).values())
+    analyzer = HrvAnalyzer(window_seconds, step_seconds)
+    timestamps, values = columns[0], columns[1]
+    for i in range(0, len(timestamps), FEED_SIZE):
+        analyzer.add(timestamps[i : i + FEED_SIZE], values[i : i + FEED_SIZE])
+    analyzer.finish()
+    return analyzer.rows
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="heart rate and HRV per window of an ECG recording"
+    )
+    parser.add_argument("filename", help="SBEM recording (.bin) or exported ECG")
+    parser.add_argument("--window", type=float, default=30, help="seconds")
+    parser.add_argument("--step", type=float, default=10, help="seconds")
+    parser.add_argument("--workers", type=int, default=0, help="0: single pass")
+    parser.add_argument("--format", default="csv", choices=list(exporters))
+    args = parser.parse_args(argv)
+
+    if not args.filename.endswith(".bin"):
+        rows = analyze_export(args.filename, args.window, args.step)
+    elif args.workers:
+        rows = analyze_sbem_parallel(
+            args.filename, args.window, args.step, args.workers
+        )
+    else:
+        rows = analyze_sbem(args.filename, args.window, args.step)
+
+    timestamps, table = rows_to_table(rows)
+    output = get_exporter(args.format).write(
+        f"{args.filename.rsplit('.', 1)[0]}.hrv", hrv_header, timestamps, table
+    )
+    print(
+        f"{len(rows)} windows, median {np.nanmedian(table[:, 1]):.0f} bpm, "
+        f"median rmssd {np.nanmedian(table[:, 2]):.0f} ms, saved to {output}"
+        if rows
+        else "recording is shorter than one window"
+    )
+
 
 if __name__ == "__main__":
-    df = pd.read_csv("run_24012026.csv")
-    data = df[" value"].to_numpy()[1:]
-    working_data, measures = hp.process(data[100000:110000], 500.0)
-    print(measures["bpm"])
-    print(measures["rmssd"])
-    plot = hp.plotter(working_data, measures, show=False)
-    plot.savefig("plot.pdf")
+    # python -m src.hr_analysis <recording.bin> [--window 30 --step 10 --workers 4]
+    main()
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 
 import bleak
@@ -6,33 +7,45 @@ from bleak.exc import BleakCharacteristicNotFoundError
 
 from src.movesense import sbem_parser
 
+from .bluetooth import device_cache
+from .bluetooth.attributes import attribute_index
 from .bluetooth.collector import BluetoothDataCollector
-from .cli.menu import AsyncMenu, Menu
+from .bluetooth.device_cache import CachedDevice, DeviceCache, matches
+from .cli.menu import AsyncMenu
 from .common.definitions import (
     ACTIVITY_SVC_UUID_128,
     ECG_INTERVALS,
+    HR_MEASUREMENT_UUID_128,
     HR_SVC_UUID_128,
     IMU_INTERVALS,
     MovesenseV7,
     MovesenseV8,
 )
-from .common.file_io import write_to_file, write_to_file_binary
-from .common.utils import (
-    BinaryAggregator,
-    get_char_by_uuid,
-    get_svc_by_uuid,
-    parse_uint16,
+from .common.executor import configure_executor, run_in_executor, shutdown_executor
+from .common.utils import BinaryAggregator, parse_uint16
+from .graphing import LiveViewer
+from .movesense.client import (
+    MovesenseClient,
+    get_movesense_firmware_version,
 )
-from .movesense.client import MovesenseClient
 from .movesense.config import MovesenseConfigField
 from .movesense.protocol import (
-    deserialize_ecg7_packet,
-    deserialize_ecg8_packet,
-    deserialize_imu7_packet,
-    deserialize_imu8_packet,
+    ECG7_PACKET_SIZE,
+    ECG8_PACKET_SIZE,
+    HR_FRAME_SIZE,
+    IMU7_PACKET_SIZE,
+    IMU8_PACKET_SIZE,
+    decode_heart_rate_frames,
+    deserialize_ecg7_packets,
+    deserialize_ecg8_packets,
+    deserialize_imu7_packets,
+    deserialize_imu8_packets,
     ecg_header_string,
+    heart_rate_frame,
+    hr_header_string,
     imu_header_string,
 )
+from .movesense.transfer import RecordingTransfer
 
 # TODO assignment routine
 # TODO async func return routine
@@ -40,7 +53,7 @@ from .movesense.protocol import (
 
 def list_device_services(device: bleak.BleakClient) -> str:
     output = "\n"
-    services = device.services
+    services = attribute_index(device).all_services()
 
     for service in services:
         characteristics = service.characteristics
@@ -53,66 +66,46 @@ def list_device_services(device: bleak.BleakClient) -> str:
     return output
 
 
-def get_movesense_firmware_version(device: bleak.BleakClient) -> int | None:
-    activity_service = get_svc_by_uuid(device, ACTIVITY_SVC_UUID_128)
-    if not activity_service:
-        return None
-
-    characteristics = activity_service.characteristics
-    if not characteristics:
-        return None
-
-    if characteristics[0].uuid == MovesenseV7.ECG_VOLTAGE_UUID_128:
-        return 7
-
-    if characteristics[0].uuid == MovesenseV8.ECG_VOLTAGE_UUID_128:
-        return 8
-    return None
-
-
 async def movesense_control_menu_v8(
     device: bleak.BleakClient, calls_on_disconnect=[]
 ) -> AsyncMenu | str:
-    activity_service = get_svc_by_uuid(device, ACTIVITY_SVC_UUID_128)
-    if not activity_service:
+    index = attribute_index(device)
+    if not index.service(ACTIVITY_SVC_UUID_128):
         return "Error: Activity service not found for v8 device."
-    hr_service = get_svc_by_uuid(
-        device, HR_SVC_UUID_128
-    )  # This one is not used in v8 menu, so can be None
 
-    ecg_voltage = get_char_by_uuid(activity_service, MovesenseV8.ECG_VOLTAGE_UUID_128)
+    def activity_char(uuid):
+        return index.characteristic(uuid, ACTIVITY_SVC_UUID_128)
+
+    ecg_voltage = activity_char(MovesenseV8.ECG_VOLTAGE_UUID_128)
     if not ecg_voltage:
         return "Error: ECG voltage characteristic not found for v8 device."
-    imu_meas = get_char_by_uuid(activity_service, MovesenseV8.IMU_MEAS_UUID_128)
+    imu_meas = activity_char(MovesenseV8.IMU_MEAS_UUID_128)
     if not imu_meas:
         return "Error: IMU measurement characteristic not found for v8 device."
-    configuration = get_char_by_uuid(activity_service, MovesenseV8.CONFIG_UUID_128)
+    configuration = activity_char(MovesenseV8.CONFIG_UUID_128)
     if not configuration:
         return "Error: Configuration characteristic not found for v8 device."
-    recorded_data = get_char_by_uuid(activity_service, MovesenseV8.RECORDED_UUID_128)
+    recorded_data = activity_char(MovesenseV8.RECORDED_UUID_128)
     if not recorded_data:
         return "Error: Recorded data characteristic not found for v8 device."
 
     async def start_datatransfer():
+        result = await RecordingTransfer(device, config_field).run()
+        if result.error is not None:
+            return str(result)
+        file = result.filename
+
+        def print_progress(fraction: float):
+            print(f"\rconverting {file}: {fraction:.0%}", end="", flush=True)
 
-        async def consume_recorded_data(_, binstring):
-            binary_data.append(binstring)
-
-        await device.start_notify(recorded_data, callback=consume_recorded_data)
-        binary_data = []
-        await config_field.transfer_data_now()
-        while True:
-            await asyncio.sleep(0.5)
-            await config_field.initialize()
-            if not config_field.transfer_operation:
-                break
-            # TODO Time indicator
-        file = write_to_file_binary(binary_data, extension="bin", subfolder="data")
-        await device.stop_notify(recorded_data)
         try:
-            sbem_parser.parse_sbem_file(file)
+            # converting runs in the worker pool, the event loop stays responsive
+            outputs = await run_in_executor(
+                sbem_parser.parse_sbem_file, file, progress=print_progress
+            )
         except Exception as e:
-            print(f"Error parsing SBEM file: {e}")
+            return f"Error parsing SBEM file: {e}"
+        return f"{result}, converted to {', '.join(outputs)}"
 
     config_field = MovesenseConfigField(device, configuration.uuid)
     await config_field.initialize()
@@ -120,17 +113,24 @@ async def movesense_control_menu_v8(
     ecg_writer = BluetoothDataCollector(
         device=device,
         char_uuid=ecg_voltage.uuid,
-        deserializer=deserialize_ecg8_packet,
+        deserializer=deserialize_ecg8_packets,
+        packet_size=ECG8_PACKET_SIZE,
+        name="ecg",
         header=ecg_header_string,
         calls_on_disconnect=calls_on_disconnect,
+        expected_interval=config_field.ecg_interval,
     )
     imu_writer = BluetoothDataCollector(
         device=device,
         char_uuid=imu_meas.uuid,
-        deserializer=deserialize_imu8_packet,
+        deserializer=deserialize_imu8_packets,
+        packet_size=IMU8_PACKET_SIZE,
+        name="imu",
         header=imu_header_string,
         calls_on_disconnect=calls_on_disconnect,
+        expected_interval=config_field.imu_interval,
     )
+    hr_writer = heart_rate_collector(device, calls_on_disconnect)
 
     async def config_printer() -> str:
         return str(config_field)
@@ -139,12 +139,14 @@ async def movesense_control_menu_v8(
         def update_ecg(interval):
             async def update_func():
                 await config_field.update_intervals(ecg_interval=interval)
+                ecg_writer.expected_interval = interval
 
             return update_func
 
         def update_imu(interval):
             async def update_func():
                 await config_field.update_intervals(imu_interval=interval)
+                imu_writer.expected_interval = interval
 
             return update_func
 
@@ -216,65 +218,157 @@ async def movesense_control_menu_v8(
             "recording toggle": toggle_recording,
             "ecg": toggle_menu_generator(ecg_writer, "ecg"),
             "imu": toggle_menu_generator(imu_writer, "imu"),
+            "hr": toggle_menu_generator(hr_writer, "hr"),
             "modify recording configuration": edit_recording_config,
             "transfer data": start_datatransfer,
             "delete data": delete_data,
+            "live stats": stream_stats_printer(ecg_writer, imu_writer, hr_writer),
+            "view live plot": live_plot_toggler(ecg_writer, imu_writer, hr_writer),
         },
     )
 
 
-def toggle_menu_generator(writer: BluetoothDataCollector, meas_type: str):
+def heart_rate_collector(
+    device: bleak.BleakClient, calls_on_disconnect: list
+) -> BluetoothDataCollector | None:
+    # optional, without it the hr toggle only reports the missing characteristic
+    hr_measurement = attribute_index(device).characteristic(
+        HR_MEASUREMENT_UUID_128, HR_SVC_UUID_128
+    )
+    if not hr_measurement:
+        return None
+    return BluetoothDataCollector(
+        device=device,
+        char_uuid=hr_measurement.uuid,
+        deserializer=decode_heart_rate_frames,
+        packet_size=HR_FRAME_SIZE,
+        name="hr",
+        header=hr_header_string,
+        calls_on_disconnect=calls_on_disconnect,
+        packet_transform=heart_rate_frame,
+        regular=False,
+    )
+
+
+def stream_stats_printer(*writers: BluetoothDataCollector | None):
+    def function() -> str:
+        running = [writer for writer in writers if writer and writer.is_running]
+        if not running:
+            return "no stream running"
+        # rates are measured since the previous look at them
+        return "\n".join(writer.stats.report() for writer in running)
+
+    return function
+
+
+def live_plot_toggler(*writers: BluetoothDataCollector | None):
+    writers = [writer for writer in writers if writer is not None]
+    viewer = None
+    listeners = []
+
+    async def function() -> str:
+        nonlocal viewer, listeners
+        if viewer is not None:
+            await viewer.stop()
+            for writer, listener in listeners:
+                writer.listeners.remove(listener)
+            viewer, listeners = None, []
+            return "live plot closed"
+
+        try:
+            viewer = LiveViewer()
+        except Exception as e:
+            return f"error opening live plot: {e}"
+        for writer in writers:
+            # the interval is only inferred once the first packets arrived
+            interval = writer.interval or writer.expected_interval
+            listener = viewer.add_stream(writer.name, writer.header, interval)
+            writer.listeners.append(listener)
+            listeners.append((writer, listener))
+        viewer.start()
+        return "live plot opened, it shows the streams while they are recorded"
+
+    return function
+
+
+def toggle_menu_generator(writer: BluetoothDataCollector | None, meas_type: str):
+    if writer is None:
+        return lambda: f"Error: {meas_type} characteristic not found on this device."
+
+    def start_as(export_format):
+        async def function():
+            writer.export_format = export_format
+            try:
+                await writer.start()
+            except Exception as e:
+                return f"error starting {meas_type} recording: {e}"
+            return f"started {meas_type}, writing to {writer.sink.filename}"
+
+        return function
+
     async def toggle_func():
         if writer.is_running:
-            csv = await writer.finish()
-            return Menu(
-                name=f"stopped {meas_type} recording, save to file?",
-                actions={
-                    "yes": lambda: write_to_file(csv, "csv", "data"),
-                    "no": lambda: None,
-                },
-                is_single=True,
+            filename = await writer.finish()
+            return (
+                f"stopped {meas_type} recording ({writer.received} packets, "
+                f"{writer.dropped} dropped, {writer.stats.gaps} gaps), saved to "
+                f"{filename}, stream statistics in {writer.stats_filename}"
             )
-        await writer.start()
-        return f"started {meas_type}"
+        return AsyncMenu(
+            name=f"start {meas_type} recording, file format?",
+            actions={
+                "csv": start_as("csv"),
+                "npz": start_as("npz"),
+                "parquet": start_as("parquet"),
+            },
+            is_single=True,
+        )
 
     return toggle_func
 
 
-async def movesense_control_menu_v7(device: bleak.BleakClient) -> AsyncMenu | str:
-    activity_service = get_svc_by_uuid(device, ACTIVITY_SVC_UUID_128)
-    if not activity_service:
+async def movesense_control_menu_v7(
+    device: bleak.BleakClient, calls_on_disconnect=[]
+) -> AsyncMenu | str:
+    index = attribute_index(device)
+    if not index.service(ACTIVITY_SVC_UUID_128):
         return "Error: Activity service not found for v7 device."
-    hr_service = get_svc_by_uuid(device, HR_SVC_UUID_128)  # Not used in v7 menu
 
-    ecg_voltage = get_char_by_uuid(activity_service, MovesenseV7.ECG_VOLTAGE_UUID_128)
+    def activity_char(uuid):
+        return index.characteristic(uuid, ACTIVITY_SVC_UUID_128)
+
+    ecg_voltage = activity_char(MovesenseV7.ECG_VOLTAGE_UUID_128)
     if not ecg_voltage:
         return "Error: ECG voltage characteristic not found for v7 device."
-    imu_meas = get_char_by_uuid(activity_service, MovesenseV7.IMU_MEAS_UUID_128)
+    imu_meas = activity_char(MovesenseV7.IMU_MEAS_UUID_128)
     if not imu_meas:
         return "Error: IMU measurement characteristic not found for v7 device."
-    ecg_interval = get_char_by_uuid(activity_service, MovesenseV7.ECG_INTERVAL_UUID_128)
+    ecg_interval = activity_char(MovesenseV7.ECG_INTERVAL_UUID_128)
     if not ecg_interval:
         return "Error: ECG interval characteristic not found for v7 device."
-    imu_interval = get_char_by_uuid(activity_service, MovesenseV7.IMU_INTERVAL_UUID_128)
+    imu_interval = activity_char(MovesenseV7.IMU_INTERVAL_UUID_128)
     if not imu_interval:
         return "Error: IMU interval characteristic not found for v7 device."
 
     ecg_writer = BluetoothDataCollector(
         device=device,
         char_uuid=ecg_voltage.uuid,
-        deserializer=deserialize_ecg7_packet,
+        deserializer=deserialize_ecg7_packets,
+        packet_size=ECG7_PACKET_SIZE,
+        name="ecg",
         header=ecg_header_string,
         calls_on_disconnect=calls_on_disconnect,
     )
     imu_writer = BluetoothDataCollector(
         device=device,
         char_uuid=imu_meas.uuid,
-        deserializer=deserialize_imu7_packet,
+        deserializer=deserialize_imu7_packets,
+        packet_size=IMU7_PACKET_SIZE,
+        name="imu",
         header=imu_header_string,
         calls_on_disconnect=calls_on_disconnect,
     )
-    hr_writer = None
+    hr_writer = heart_rate_collector(device, calls_on_disconnect)
 
     async def print_config():
         ecg_interval_value = parse_uint16(await device.read_gatt_char(ecg_interval))
@@ -283,12 +377,17 @@ async def movesense_control_menu_v7(device: bleak.BleakClient) -> AsyncMenu | st
 
     return AsyncMenu(
         name="movesense controls (v0.7.0)",
-        action_string="(p)rint cfg, [toggle: (e)cg, (i)mu, (h)r], (u)pdate value",
+        action_string=(
+            "(p)rint cfg, [toggle: (e)cg, (i)mu, (h)r], (u)pdate value, "
+            "(l)ive stats, (v)iew live plot"
+        ),
         actions={
             "p": print_config,
             "e": toggle_menu_generator(ecg_writer, "ecg"),
             "i": toggle_menu_generator(imu_writer, "imu"),
-            "h": lambda: "not implemented yet",
+            "h": toggle_menu_generator(hr_writer, "hr"),
+            "l": stream_stats_printer(ecg_writer, imu_writer, hr_writer),
+            "v": live_plot_toggler(ecg_writer, imu_writer, hr_writer),
             "u": lambda: AsyncMenu(
                 name="select type",
                 actions={
@@ -345,7 +444,7 @@ async def choose_device_menu(devices: list) -> int | None:
         name="choose device",
         actions=actions,
         action_string="\n"
-        + "\n".join(f"({i}) {devices[i].name}" for i in range(len(devices)))
+        + "\n".join(f"({i}) {device_label(devices[i])}" for i in range(len(devices)))
         + "\n(r)escan"
         + f"\n\nenter device index [0..{len(devices)}]",
         is_single=True,
@@ -354,50 +453,80 @@ async def choose_device_menu(devices: list) -> int | None:
     return idx
 
 
-async def ble_scan(scan_duration: int = 5) -> list:
-    scanner = bleak.BleakScanner()
-    print(f"scanning for {scan_duration} seconds")
-    await scanner.start()
-    await asyncio.sleep(scan_duration)
-    await scanner.stop()
+def device_label(device) -> str:
+    label = device.name or str(device.address)
+    # known devices are connected to directly, without a scan
+    return f"{label} (known)" if isinstance(device, CachedDevice) else label
 
-    return scanner.discovered_devices
 
+async def ble_scan(scan_duration: int = 5, targets: list[str] = ()) -> list:
+    if targets:
+        print(f"scanning for {', '.join(targets)}, at most {scan_duration} seconds")
+    else:
+        print(f"scanning for {scan_duration} seconds")
+    discovered = await device_cache.scan(scan_duration, targets)
+    return [device for device, _ in discovered.values()]
 
-async def main_async() -> None:
+
+async def main_async(target: str | None = None) -> None:
     # Scanning and connection process
     subscriptionManagement = {}
     calls_on_sudden_disconnect = []
 
     # callback, that goes through all registered callbacks
-    # in 'calls_on_sudden_disconnect'
+    # in 'calls_on_sudden_disconnect' (e.g. running collectors closing their
+    # file sinks, which already hold everything but the last flush window)
     def on_disconnect(device: bleak.BleakClient):
         for f in calls_on_sudden_disconnect:
             f()
 
+    # devices connected to before are offered right away, without scanning
+    cache = DeviceCache.load()
+    devices = cache.known()
+    if target is not None:
+        cached = cache.find(target)
+        devices = [cached] if cached else await ble_scan(10, [target])
+        devices = [d for d in devices if matches(d.address, d.name, target)]
+        if not devices:
+            # never connect to whatever else is nearby instead
+            print(f"{target} not found, choose a device from the scan")
+            target = None
+
     while True:
-        devices = [dev for dev in await ble_scan(5)]
-        if devices is None:
-            print("error: no scan results")
-            return
-        dev_id = await choose_device_menu(devices)
+        if not devices:
+            devices = await ble_scan(5)
+        if (
+            target is not None
+            and len(devices) == 1
+            and matches(devices[0].address, devices[0].name, target)
+        ):
+            dev_id = 0
+        else:
+            dev_id = await choose_device_menu(devices)
 
         if dev_id is None:
             print("quitting app")
             return
         elif dev_id < 0:
+            devices, target = [], None
             continue
-        else:
-            break
 
-    device = bleak.BleakClient(devices[dev_id], disconnected_callback=on_disconnect)
-    client = MovesenseClient(device)
+        chosen = devices[dev_id]
+        # known devices are connected to by address, bleak finds them directly
+        device = bleak.BleakClient(
+            chosen.address if isinstance(chosen, CachedDevice) else chosen,
+            disconnected_callback=on_disconnect,
+        )
+        client = MovesenseClient(device)
+
+        print(f"connecting to {device_label(chosen)} with address {chosen.address}")
+        if await client.connect():
+            break
+        print(f"error connecting to {device_label(chosen)}, scanning again")
+        devices, target = [], None
 
-    print(f"connecting to device with address {devices[dev_id]}")
-    await client.connect()
-    # if not await client.connect():
-    #     print(f"error connecting to {device.name}")
-    #     return
+    cache.remember(device, get_movesense_firmware_version(device))
+    cache.save()
 
     # Device Interaction
     async def choose_movesense_menu():
@@ -407,7 +536,9 @@ async def main_async() -> None:
                 client.device, calls_on_sudden_disconnect
             )
         elif firmwave_version == 7:
-            return await movesense_control_menu_v7(client.device)
+            return await movesense_control_menu_v7(
+                client.device, calls_on_sudden_disconnect
+            )
 
         return f"device is not Movesense, fv: {firmwave_version}"
 
@@ -482,25 +613,22 @@ async def main_async() -> None:
                         for i in range(len(characteristics))
                     ),
                     actions={
-                        str(i) + str(characteristics[i].uuid): action_menu(
-                            characteristics[i]
-                        )
+                        str(i)
+                        + str(characteristics[i].uuid): action_menu(characteristics[i])
                         for i in range(len(characteristics))
                     },
                 )
 
             return return_function
 
+        services = attribute_index(device).all_services()
         return AsyncMenu(
             name="Service Action Menu",
             action_string="\n"
-            + "\n".join(
-                f"({i}) {list(device.services)[i].uuid}"
-                for i in range(len(list(device.services)))
-            ),
+            + "\n".join(f"({i}) {service.uuid}" for i, service in enumerate(services)),
             actions={
-                str(i): characteristic_menu(list(device.services)[i])
-                for i in range(len(list(device.services)))
+                str(i): characteristic_menu(service)
+                for i, service in enumerate(services)
             },
         )
 
@@ -524,7 +652,16 @@ async def main_async() -> None:
 
 
 def main() -> None:
-    asyncio.run(main_async())
+    parser = argparse.ArgumentParser(description="interactive Movesense client")
+    parser.add_argument(
+        "device", nargs="?", help="address or name to connect to without the menu"
+    )
+    args = parser.parse_args()
+    configure_executor("thread")
+    try:
+        asyncio.run(main_async(args.device))
+    finally:
+        shutdown_executor()
 
 
 if __name__ == "__main__":
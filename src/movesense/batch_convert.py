@@ -0,0 +1,145 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from .sbem_parser import convert_sbem_file, sbem_output_files
+
+
+@dataclass
+class ConversionResult:
+    filename: str
+    size: int
+    samples: int = 0
+    duration: float = 0.0
+    skipped: bool = False
+    error: str | None = None
+
+    def __str__(self) -> str:
+        if self.error is not None:
+            return f"failed   {self.filename}: {self.error}"
+        if self.skipped:
+            return f"skipped  {self.filename} (up to date)"
+        return (
+            f"done     {self.filename}: {self.samples} samples"
+            f" in {self.duration:.2f} s"
+        )
+
+
+def find_sbem_files(patterns: list[str]) -> list[str]:
+    # directories are searched for .bin files, everything else is a glob pattern
+    filenames = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*.bin")
+        filenames.update(
+            filename
+            for filename in glob.glob(pattern, recursive=True)
+            if filename.endswith(".bin") and os.path.isfile(filename)
+        )
+    return sorted(filenames)
+
+
+def is_up_to_date(filename: str, export_format: str) -> bool:
+    modified = os.path.getmtime(filename)
+    return all(
+        os.path.exists(output) and os.path.getmtime(output) >= modified
+        for output in sbem_output_files(filename, export_format)
+    )
+
+
+def convert_one(
+    filename: str, export_format: str, force: bool, use_index: bool = False
+) -> ConversionResult:
+    # runs in the worker processes, errors are reported instead of raised
+    result = ConversionResult(filename, os.path.getsize(filename))
+    try:
+        if not force and is_up_to_date(filename, export_format):
+            result.skipped = True
+            return result
+
+        start = time.perf_counter()
+        samples = convert_sbem_file(filename, export_format, use_index=use_index)
+        result.samples = sum(samples.values())
+        result.duration = time.perf_counter() - start
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+def convert_all(
+    filenames: list[str],
+    export_format: str = "csv",
+    workers: int | None = None,
+    force: bool = False,
+    report=print,
+    use_index: bool = False,
+) -> list[ConversionResult]:
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(convert_one, filename, export_format, force, use_index)
+            for filename in filenames
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+            report(results[-1])
+    return sorted(results, key=lambda result: result.filename)
+
+
+def summarize(results: list[ConversionResult], duration: float) -> str:
+    converted = [r for r in results if not r.skipped and r.error is None]
+    failed = [r for r in results if r.error is not None]
+    megabytes = sum(r.size for r in converted) / (1 << 20)
+    samples = sum(r.samples for r in converted)
+
+    summary = (
+        f"{len(converted)} converted, {len(results) - len(converted) - len(failed)}"
+        f" skipped, {len(failed)} failed in {duration:.2f} s"
+    )
+    if converted and duration > 0:
+        summary += (
+            f"\n{megabytes:.1f} MB at {megabytes / duration:.1f} MB/s,"
+            f" {samples} samples at {samples / duration:.0f} samples/s"
+        )
+    for result in failed:
+        summary += f"\n{result}"
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="convert many SBEM recordings (.bin) in parallel"
+    )
+    parser.add_argument("paths", nargs="+", help="directories, files or globs")
+    parser.add_argument("--format", default="csv", choices=["csv", "npz", "parquet"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--force", action="store_true", help="also convert up to date files"
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="read through the sidecar chunk index, faster when converting again",
+    )
+    args = parser.parse_args(argv)
+
+    filenames = find_sbem_files(args.paths)
+    if not filenames:
+        print("no .bin files found")
+        return 1
+
+    start = time.perf_counter()
+    results = convert_all(
+        filenames, args.format, args.workers, args.force, use_index=args.index
+    )
+    print(summarize(results, time.perf_counter() - start))
+    return 1 if any(result.error is not None for result in results) else 0
+
+
+if __name__ == "__main__":
+    # python -m src.movesense.batch_convert data/ "other/*.bin" --format npz
+    sys.exit(main())
@@ -1,5 +1,18 @@
 import bleak
 
+from src.bluetooth.attributes import attribute_index
+from src.common.definitions import ACTIVITY_SVC_UUID_128, MovesenseV7, MovesenseV8
+
+
+def get_movesense_firmware_version(device: bleak.BleakClient) -> int | None:
+    # the activity service of each firmware has its own ECG characteristic
+    index = attribute_index(device)
+    if index.characteristic(MovesenseV7.ECG_VOLTAGE_UUID_128, ACTIVITY_SVC_UUID_128):
+        return 7
+    if index.characteristic(MovesenseV8.ECG_VOLTAGE_UUID_128, ACTIVITY_SVC_UUID_128):
+        return 8
+    return None
+
 
 class MovesenseClient:
     def __init__(self, device: bleak.BleakClient):
@@ -8,6 +21,8 @@ class MovesenseClient:
     async def connect(self) -> bool:
         try:
             await self.device.connect()
+            # never resolve against the services of an earlier connection
+            attribute_index(self.device).invalidate()
             return True
         except Exception:  # Catch specific exceptions here
             return False
@@ -4,6 +4,8 @@ from dataclasses import dataclass
 
 from bleak import BleakClient
 
+from src.bluetooth.attributes import attribute_index
+
 
 class MovesenseConfigField:
     def __init__(self, device: BleakClient, char_uuid):
@@ -20,7 +22,7 @@ class MovesenseConfigField:
         self.synced_time = 0
 
     async def initialize(self):
-        bytes: bytearray = await self.device.read_gatt_char(self.char)
+        bytes: bytearray = await self.device.read_gatt_char(self._characteristic())
 
         self.ecg_interval = int(bytes[0])
         self.imu_interval = int(bytes[1])
@@ -48,8 +50,13 @@ class MovesenseConfigField:
 
         return cfg_field
 
+    def _characteristic(self):
+        return attribute_index(self.device).resolve(self.char)
+
     async def _send(self):
-        await self.device.write_gatt_char(self.char, data=self._build_bytes())
+        await self.device.write_gatt_char(
+            self._characteristic(), data=self._build_bytes()
+        )
 
     def is_recording_now(self) -> bool:
         return self.recording_state
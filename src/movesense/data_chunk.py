@@ -1,19 +1,36 @@
 from dataclasses import dataclass
 from typing import Any
 
+import numpy as np
 
-@dataclass
+from .timeline import estimate_interval
+
+
+@dataclass(slots=True)
 class DataEntry:
     timestamp: int
     value: Any
 
 
-@dataclass
+# values are kept as one typed array (one row per sample for multi-channel
+# data), per-sample timestamps are only computed when they are asked for
+@dataclass(slots=True, eq=False)
 class DataChunk:
     timestamp: int
-    values: list[Any]
+    values: np.ndarray
     interval: int | None = None
 
+    def __post_init__(self):
+        self.values = np.asarray(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def timestamps(self) -> np.ndarray:
+        if self.interval is None:
+            raise Exception("cannot compute timestamps without interval knowledge")
+        return self.timestamp + np.arange(len(self.values)) * self.interval
+
     def to_data_entries(self) -> list[DataEntry]:
         if self.interval is None:
             raise Exception("cannot convert to entries without interval knowledge")
@@ -31,15 +48,42 @@ class DataChunk:
         self.interval = interval
 
     def to_csv_chunk(self) -> str:
+        rows = zip(self.timestamps().tolist(), self.values.tolist())
         return "\n" + "\n".join(
-            f"{entry.timestamp}, {entry.value}" for entry in self.to_data_entries()
+            f"{timestamp}, {format_csv_value(value)}" for timestamp, value in rows
         )
 
 
+def format_csv_value(value: Any) -> str:
+    # multi-channel samples (e.g. IMU) are exported as one column per channel
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    return str(value)
+
+
 def add_interval_if_known(chunks: list[DataChunk]) -> list[DataChunk]:
     if len(chunks) < 2:
         return chunks
-    interval = (chunks[1].timestamp - chunks[0].timestamp) // len(chunks[1].values)
+    interval = estimate_interval(
+        np.array([chunk.timestamp for chunk in chunks]), len(chunks[0].values)
+    )
+    if interval is None:
+        return chunks
     for chunk in chunks:
         chunk.set_interval(interval)
     return chunks
+
+
+def chunks_to_arrays(chunks: list[DataChunk]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    flattens chunks into per-sample timestamps and a value array, with one row
+    per sample for multi-channel data
+    """
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    timestamps = np.concatenate([chunk.timestamps() for chunk in chunks])
+    values = np.concatenate([chunk.values for chunk in chunks])
+    return timestamps, values
@@ -1,9 +1,27 @@
+import struct
+import time
+
+import numpy as np
+
 from .data_chunk import DataChunk
 
+ECG_SAMPLES_PER_PACKET = 16
+IMU_SAMPLES_PER_PACKET = 8
+IMU_CHANNELS = 9
+
 ecg_header_string = "timestamp, ecg_voltage"
 imu_header_string = (
     "timestamp, acc_x, acc_y, acc_z, gyr_x, gyr_y, gyr_z, mag_x, mag_y, mag_z"
 )
+hr_header_string = "timestamp, bpm, rr"
+
+# Heart Rate Measurement notifications fit into the default 20 byte payload:
+# flags, uint8/uint16 BPM, optional energy expended and uint16 RR intervals
+HR_MAX_PAYLOAD = 20
+HR_MAX_RR = (HR_MAX_PAYLOAD - 2) // 2
+HR_FLAG_UINT16 = 0x01
+HR_FLAG_ENERGY = 0x08
+HR_FLAG_RR = 0x10
 
 
 def deserialize_ecg7_packet(packet):
@@ -22,6 +40,134 @@ def deserialize_imu8_packet(packet):
     return deserialize_imu_packet(packet, 8, is_microseconds=True)
 
 
+def decode_ecg7_packets(packets):
+    return decode_ecg_packets(packets, 4)
+
+
+def decode_ecg8_packets(packets):
+    return decode_ecg_packets(packets, 8, is_microseconds=True)
+
+
+def deserialize_ecg7_packets(packets):
+    return _to_data_chunks(*decode_ecg7_packets(packets), interval=4)
+
+
+def deserialize_ecg8_packets(packets):
+    return _to_data_chunks(*decode_ecg8_packets(packets), interval=4)
+
+
+def decode_imu7_packets(packets):
+    return decode_imu_packets(packets, 4)
+
+
+def decode_imu8_packets(packets):
+    return decode_imu_packets(packets, 8, is_microseconds=True)
+
+
+def deserialize_imu7_packets(packets):
+    timestamps, values = decode_imu7_packets(packets)
+    return _to_data_chunks(timestamps, _per_packet(values), interval=20)
+
+
+def deserialize_imu8_packets(packets):
+    timestamps, values = decode_imu8_packets(packets)
+    return _to_data_chunks(timestamps, _per_packet(values), interval=20)
+
+
+def ecg_packet_dtype(timestamp_size: int) -> np.dtype:
+    return np.dtype(
+        [
+            ("timestamp", f"<u{timestamp_size}"),
+            ("values", "<i2", (ECG_SAMPLES_PER_PACKET,)),
+        ]
+    )
+
+
+def imu_packet_dtype(timestamp_size: int) -> np.dtype:
+    sample = np.dtype(
+        [("acc", "<i2", (3,)), ("gyr", "<i2", (3,)), ("mag", "<i2", (3,))]
+    )
+    return np.dtype(
+        [
+            ("timestamp", f"<u{timestamp_size}"),
+            ("samples", sample, (IMU_SAMPLES_PER_PACKET,)),
+        ]
+    )
+
+
+ECG7_PACKET_SIZE = ecg_packet_dtype(4).itemsize
+ECG8_PACKET_SIZE = ecg_packet_dtype(8).itemsize
+IMU7_PACKET_SIZE = imu_packet_dtype(4).itemsize
+IMU8_PACKET_SIZE = imu_packet_dtype(8).itemsize
+
+
+def _join_packets(packets: bytes | list[bytes], packet_size: int) -> bytes:
+    if isinstance(packets, (bytes, bytearray, memoryview)):
+        return packets
+    # truncated packets (e.g. the tail of an aborted transfer) cannot be decoded
+    return b"".join(packet for packet in packets if len(packet) == packet_size)
+
+
+def _decode_records(
+    packets: bytes | list[bytes], dtype: np.dtype, is_microseconds: bool
+) -> tuple[np.ndarray, np.ndarray]:
+    buffer = _join_packets(packets, dtype.itemsize)
+    if len(buffer) % dtype.itemsize:
+        raise Exception(
+            f"buffer length {len(buffer)} is not a multiple of packet size {dtype.itemsize}"
+        )
+
+    records = np.frombuffer(buffer, dtype=dtype)
+    timestamps = records["timestamp"].astype(np.int64)
+    if is_microseconds:
+        timestamps //= 1000
+    return records, timestamps
+
+
+def decode_ecg_packets(
+    packets: bytes | list[bytes], timestamp_size: int, is_microseconds: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    decodes many ECG packets at once, given either as list of raw packets or as
+    one contiguous buffer. Returns the packet timestamps (int64, milliseconds)
+    and a (packets x 16) int16 sample matrix
+    """
+    records, timestamps = _decode_records(
+        packets, ecg_packet_dtype(timestamp_size), is_microseconds
+    )
+    return timestamps, np.ascontiguousarray(records["values"])
+
+
+def decode_imu_packets(
+    packets: bytes | list[bytes], timestamp_size: int, is_microseconds: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    decodes many IMU packets at once. Returns the packet timestamps (int64,
+    milliseconds) and a (samples x 9) int16 matrix with the columns
+    acc_x, acc_y, acc_z, gyr_x, gyr_y, gyr_z, mag_x, mag_y, mag_z
+    """
+    records, timestamps = _decode_records(
+        packets, imu_packet_dtype(timestamp_size), is_microseconds
+    )
+    # acc, gyr and mag are adjacent int16 triples, so every sample is 9 int16
+    samples = np.ascontiguousarray(records["samples"])
+    return timestamps, samples.view(np.int16).reshape(-1, IMU_CHANNELS)
+
+
+def _per_packet(imu_values: np.ndarray) -> np.ndarray:
+    return imu_values.reshape(-1, IMU_SAMPLES_PER_PACKET, IMU_CHANNELS)
+
+
+def _to_data_chunks(
+    timestamps: np.ndarray, values: np.ndarray, interval: int
+) -> list[DataChunk]:
+    return [
+        # rows are views into the decoded batch, nothing is copied per packet
+        DataChunk(timestamp=timestamp, values=row, interval=interval)
+        for timestamp, row in zip(timestamps.tolist(), values)
+    ]
+
+
 # TODO remove hard code
 def deserialize_ecg_packet(
     packet: bytes, timestamp_size: int, interval: int = 4, is_microseconds: bool = False
@@ -44,34 +190,63 @@ def deserialize_imu_packet(
     interval: int = 20,
     is_microseconds: bool = False,
 ) -> DataChunk:
-    timestamp = int.from_bytes(packet[:timestamp_size], "little")
-    if is_microseconds:
-        timestamp //= 1000
-    packet = packet[timestamp_size:]
-    values = []
-    for i in range(8):
-
-        def get_packet(base: int) -> list[int]:
-            return [
-                int.from_bytes(
-                    packet[18 * i + base : 18 * i + base + 1], "little", signed=True
-                ),
-                int.from_bytes(
-                    packet[18 * i + base + 2 : 18 * i + base + 3],
-                    "little",
-                    signed=True,
-                ),
-                int.from_bytes(
-                    packet[18 * i + base + 4 : 18 * i + base + 5],
-                    "little",
-                    signed=True,
-                ),
-            ]
-
-        accs = get_packet(0)
-        gyrs = get_packet(6)
-        mags = get_packet(12)
-        combined = accs + gyrs + mags
-        values.append(", ".join(str(c) for c in combined))
+    timestamps, values = decode_imu_packets([packet], timestamp_size, is_microseconds)
+    return DataChunk(timestamp=int(timestamps[0]), values=values, interval=interval)
 
-    return DataChunk(timestamp=timestamp, values=values, interval=interval)
+
+# notifications carry no timestamp and differ in length, so the collector
+# stores them as fixed size frames: arrival time (ms), length, padded payload
+_hr_frame_header = struct.Struct("<qB")
+hr_frame_dtype = np.dtype(
+    [("arrival", "<i8"), ("length", "u1"), ("payload", "u1", (HR_MAX_PAYLOAD,))]
+)
+HR_FRAME_SIZE = hr_frame_dtype.itemsize
+_hr_padding = [bytes(HR_MAX_PAYLOAD - i) for i in range(HR_MAX_PAYLOAD + 1)]
+
+
+def heart_rate_frame(packet: bytes) -> bytes:
+    if not 2 <= len(packet) <= HR_MAX_PAYLOAD:
+        # counted as malformed by the ring buffer
+        return b""
+    return (
+        _hr_frame_header.pack(time.time_ns() // 1_000_000, len(packet))
+        + packet
+        + _hr_padding[len(packet)]
+    )
+
+
+def decode_heart_rate_frames(
+    frames: bytes | list[bytes],
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    decodes many heart rate frames at once into one row per RR interval with
+    the columns bpm and rr (ms). A notification's last beat is timed at its
+    arrival, earlier ones by subtracting the following RR intervals.
+    Notifications without RR intervals give one row with rr 0
+    """
+    buffer = _join_packets(frames, HR_FRAME_SIZE)
+    records = np.frombuffer(buffer, dtype=hr_frame_dtype)
+    payload = records["payload"].astype(np.int64)
+    flags = payload[:, 0]
+
+    wide = flags & HR_FLAG_UINT16
+    bpm = np.where(wide, payload[:, 1] | payload[:, 2] << 8, payload[:, 1])
+    rr_start = 2 + wide + 2 * ((flags & HR_FLAG_ENERGY) > 0)
+    counts = np.where(
+        flags & HR_FLAG_RR, (records["length"].astype(np.int64) - rr_start) // 2, 0
+    ).clip(0)
+
+    slots = np.arange(HR_MAX_RR)
+    valid = slots < counts[:, None]
+    positions = (rr_start[:, None] + 2 * slots).clip(max=HR_MAX_PAYLOAD - 2)
+    raw = np.take_along_axis(payload, positions, 1) | (
+        np.take_along_axis(payload, positions + 1, 1) << 8
+    )
+    rr = np.where(valid, raw * 1000 // 1024, 0)
+
+    later = np.cumsum(rr[:, ::-1], axis=1)[:, ::-1] - rr
+    rows = valid.copy()
+    rows[:, 0] |= counts == 0
+    timestamps = (records["arrival"][:, None] - later)[rows]
+    values = np.stack([np.broadcast_to(bpm[:, None], rr.shape)[rows], rr[rows]], axis=1)
+    return timestamps, values
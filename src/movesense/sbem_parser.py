@@ -1,16 +1,51 @@
+import mmap
+import os
 import sys
+import zipfile
+import zlib
+from array import array
 from dataclasses import dataclass
-from typing import Callable
+from typing import BinaryIO, Callable, Iterator
+
+import numpy as np
+
+from ..common.exporters import get_exporter
+from .data_chunk import DataChunk, DataEntry, format_csv_value
+from .protocol import (
+    ECG_SAMPLES_PER_PACKET,
+    IMU_CHANNELS,
+    IMU_SAMPLES_PER_PACKET,
+    decode_ecg8_packets,
+    decode_imu8_packets,
+    deserialize_ecg8_packets,
+    deserialize_imu8_packets,
+    ecg_packet_dtype,
+    imu_packet_dtype,
+)
+from .timeline import (
+    LossReport,
+    estimate_interval,
+    insert_gap_markers,
+    save_loss_reports,
+)
+
+SBEM_HEADER = b"SBEM0112"
+# recordings are written by the v0.8.0 firmware: 8 byte timestamps in microseconds
+SBEM_TIMESTAMP_SIZE = 8
 
-from .data_chunk import DataChunk, DataEntry, add_interval_if_known
-from .protocol import deserialize_ecg8_packet, deserialize_imu8_packet
+# one entry per chunk, offset points at the chunk content (behind id and length)
+SBEM_INDEX_DTYPE = np.dtype([("id", "u1"), ("offset", "<u8"), ("len", "u1")])
+
+# bump when the layout of the sidecar index changes, so old ones get rebuilt
+SIDECAR_VERSION = 1
+SIDECAR_HASH_SIZE = 1 << 16
 
 
 @dataclass
 class SbemChunk:
     id: int
     len: int
-    content: bytes
+    content: bytes | memoryview
 
     def __str__(self) -> str:
         return f"({self.id}, {self.len})"
@@ -19,51 +54,145 @@ class SbemChunk:
 @dataclass
 class SbemChunkType:
     id: int
-    structure_parser: Callable[[bytes], DataChunk]
+    structure_parser: Callable[[list[bytes]], list[DataChunk]]
     csv_header: str
+    packet_size: int
+    decoder: Callable[[bytes], tuple[np.ndarray, np.ndarray]]
+    samples_per_packet: int
+    channels: int
+    # used while the interval cannot be inferred, same as the packet decoders
+    default_interval: int
 
 
-def read_bin_file(name) -> bytes:
-    with open(name, "rb") as file:
-        return file.read()
+@dataclass
+class SbemStreamIndex:
+    offsets: np.ndarray
+    timestamps: np.ndarray
+    interval: int | None
 
 
-def check_sbem_header(file: bytes) -> bool:
-    return file[0:8] == b"SBEM0112"
+def sidecar_filename(filename: str) -> str:
+    return f"{filename}.idx.npz"
 
 
-def parse_sbem(file: bytes):
-    file = file[8:]
+def read_bin_file(name) -> bytes:
+    with open(name, "rb") as file:
+        return file.read()
 
-    chunks: list[SbemChunk] = []
 
-    while len(file) >= 2:
-        chunk_id = int(file[0])
-        chunk_len = int(file[1])
-        chunk_content = file[2 : (2 + chunk_len)]
-        chunks.append(SbemChunk(chunk_id, chunk_len, chunk_content))
-        file = file[(chunk_len + 2) :]
+def check_sbem_header(file: bytes) -> bool:
+    return file[0:8] == SBEM_HEADER
+
+
+def index_sbem(file: bytes | memoryview) -> np.ndarray:
+    """
+    scans the chunk headers once and returns an index of (id, offset, len)
+    entries without copying any chunk content
+    """
+    ids, offsets, lengths = array("B"), array("Q"), array("B")
+
+    with memoryview(file) as data:
+        offset = len(SBEM_HEADER)
+        end = len(data) - 1
+        while offset < end:
+            chunk_len = data[offset + 1]
+            ids.append(data[offset])
+            offsets.append(offset + 2)
+            lengths.append(chunk_len)
+            offset += chunk_len + 2
+
+    index = np.empty(len(ids), dtype=SBEM_INDEX_DTYPE)
+    index["id"] = np.frombuffer(ids, dtype=np.uint8)
+    index["offset"] = np.frombuffer(offsets, dtype=np.uint64)
+    index["len"] = np.frombuffer(lengths, dtype=np.uint8)
+    return index
+
+
+def parse_sbem(file: bytes) -> list[SbemChunk]:
+    data = memoryview(file)
+    return [
+        SbemChunk(chunk_id, chunk_len, data[offset : offset + chunk_len])
+        for chunk_id, offset, chunk_len in index_sbem(data).tolist()
+    ]
+
+
+def iter_sbem_chunks(stream: BinaryIO, read_size: int = 1 << 20) -> Iterator[SbemChunk]:
+    if stream.read(len(SBEM_HEADER)) != SBEM_HEADER:
+        raise Exception("file header does not match SBEM0112")
 
-    return chunks
+    buffer = b""
+    offset = 0
+    while True:
+        block = stream.read(read_size)
+        # only the unfinished chunk at the end of the last block is carried over
+        buffer = buffer[offset:] + block
+        offset = 0
+        while offset + 2 <= len(buffer):
+            chunk_len = buffer[offset + 1]
+            end = offset + 2 + chunk_len
+            if end > len(buffer) and block:
+                break
+            yield SbemChunk(buffer[offset], chunk_len, buffer[offset + 2 : end])
+            offset = end
+
+        if not block:
+            return
+
+
+def complete_chunks(
+    index: np.ndarray, chunk_type: SbemChunkType, file_size: int
+) -> np.ndarray:
+    # a cut off last chunk still has its full length byte, but not its content
+    return index[
+        (index["id"] == chunk_type.id)
+        & (index["len"] == chunk_type.packet_size)
+        & (index["offset"] + index["len"] <= file_size)
+    ]
+
+
+def gather_contents(
+    file: bytes | memoryview,
+    offsets: np.ndarray,
+    size: int,
+    batch_size: int = 1 << 16,
+) -> bytes:
+    raw = np.frombuffer(file, dtype=np.uint8)
+    columns = np.arange(size, dtype=np.uint64)
+    output = np.empty((len(offsets), size), dtype=np.uint8)
+    # bounded batches keep the temporary position matrix small
+    for start in range(0, len(offsets), batch_size):
+        batch = offsets[start : start + batch_size]
+        output[start : start + len(batch)] = raw[batch[:, None] + columns]
+    return output.tobytes()
 
 
 def write_to_csv(filename: str, content: list[DataEntry], header: str):
     with open(filename, "w") as file:
         file.write(f"{header}\n")
         for c in content:
-            file.write(f"{c.timestamp}, {c.value}\n")
+            file.write(f"{c.timestamp}, {format_csv_value(c.value)}\n")
 
 
 ecg_chunk = SbemChunkType(
     id=104,
-    structure_parser=deserialize_ecg8_packet,
+    structure_parser=deserialize_ecg8_packets,
     csv_header="timestamp, ecg",
+    packet_size=ecg_packet_dtype(SBEM_TIMESTAMP_SIZE).itemsize,
+    decoder=decode_ecg8_packets,
+    samples_per_packet=ECG_SAMPLES_PER_PACKET,
+    channels=1,
+    default_interval=4,
 )
 
 imu_chunk = SbemChunkType(
     id=105,
-    structure_parser=deserialize_imu8_packet,
-    csv_header="timestamp, acc-x, acc-y, acc-z, gyr-x, gyr-y, gyr-z, mag-x, mag-x, mag-z",
+    structure_parser=deserialize_imu8_packets,
+    csv_header="timestamp, acc-x, acc-y, acc-z, gyr-x, gyr-y, gyr-z, mag-x, mag-y, mag-z",
+    packet_size=imu_packet_dtype(SBEM_TIMESTAMP_SIZE).itemsize,
+    decoder=decode_imu8_packets,
+    samples_per_packet=IMU_SAMPLES_PER_PACKET,
+    channels=IMU_CHANNELS,
+    default_interval=20,
 )
 
 known_chunk_types = [ecg_chunk, imu_chunk]
@@ -71,60 +200,397 @@ known_chunk_ids = {chunk_type.id: chunk_type for chunk_type in known_chunk_types
 
 
 def parse_chunks(chunks: list[SbemChunk]) -> dict[int, list[DataChunk]]:
-    datachunks = {i: [] for i in known_chunk_ids}
+    contents = {i: [] for i in known_chunk_ids}
     for chunk in chunks:
         if chunk.id not in known_chunk_ids:
             continue
-        parser = known_chunk_types[
-            list(known_chunk_ids).index(chunk.id)
-        ].structure_parser
-        datachunks[chunk.id].append(parser(chunk.content))
+        contents[chunk.id].append(chunk.content)
+
+    # decode all chunks of one type in a single batch
+    return {id: known_chunk_ids[id].structure_parser(contents[id]) for id in contents}
+
+
+class SbemFile:
+    """
+    memory mapped SBEM recording. The chunk index is built on first use and
+    kept, so that time ranges can be read without decoding the whole file.
+    The index is also stored in a sidecar file next to the recording, which
+    is reused on later opens as long as size, mtime and checksum still match:
+
+        with SbemFile("data/recording.bin") as recording:
+            timestamps, ecg = recording.read(ecg_chunk, 40 * 60_000, 45 * 60_000)
+    """
+
+    def __init__(self, filename: str, use_sidecar: bool = True):
+        self.filename = filename
+        self.use_sidecar = use_sidecar
+        self._file = open(filename, "rb")
+        try:
+            self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise Exception(f"cannot map empty file {filename}")
+
+        if not check_sbem_header(self.map):
+            self.close()
+            raise Exception("file header does not match SBEM0112")
+
+        self._index: np.ndarray | None = None
+        self._streams: dict[int, SbemStreamIndex] = {}
+
+    def __enter__(self) -> "SbemFile":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # arrays still viewing the mapping (e.g. held by a traceback) keep
+            # it alive, it is unmapped once the last of them is gone
+            pass
+        self._file.close()
+
+    @property
+    def index(self) -> np.ndarray:
+        if self._index is None:
+            if self.use_sidecar and self._load_sidecar():
+                return self._index
+
+            self._index = index_sbem(self.map)
+            for stream in known_chunk_types:
+                self.stream_index(stream)
+            if self.use_sidecar:
+                self._save_sidecar()
+        return self._index
+
+    def _file_key(self) -> np.ndarray:
+        stat = os.fstat(self._file.fileno())
+        checksum = zlib.crc32(self.map[:SIDECAR_HASH_SIZE])
+        checksum = zlib.crc32(self.map[-SIDECAR_HASH_SIZE:], checksum)
+        return np.array(
+            [SIDECAR_VERSION, stat.st_size, stat.st_mtime_ns, checksum], dtype=np.int64
+        )
+
+    def _load_sidecar(self) -> bool:
+        try:
+            with np.load(sidecar_filename(self.filename)) as sidecar:
+                if not np.array_equal(sidecar["key"], self._file_key()):
+                    return False
+
+                index = sidecar["index"]
+                streams = {}
+                for stream in known_chunk_types:
+                    interval = int(sidecar[f"interval_{stream.id}"])
+                    streams[stream.id] = SbemStreamIndex(
+                        offsets=sidecar[f"offsets_{stream.id}"],
+                        timestamps=sidecar[f"timestamps_{stream.id}"],
+                        interval=interval if interval >= 0 else None,
+                    )
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return False
+
+        self._index = index
+        self._streams = streams
+        return True
+
+    def _save_sidecar(self):
+        arrays = {"key": self._file_key(), "index": self._index}
+        for stream in known_chunk_types:
+            stream_index = self._streams[stream.id]
+            arrays[f"offsets_{stream.id}"] = stream_index.offsets
+            arrays[f"timestamps_{stream.id}"] = stream_index.timestamps
+            interval = stream_index.interval
+            arrays[f"interval_{stream.id}"] = -1 if interval is None else interval
+
+        filename = sidecar_filename(self.filename)
+        try:
+            with open(f"{filename}.tmp", "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(f"{filename}.tmp", filename)
+        except OSError:
+            # e.g. read only data directories, the index is just not cached then
+            pass
+
+    def time_range(self, stream: SbemChunkType) -> tuple[int, int] | None:
+        stream_index = self.stream_index(stream)
+        if len(stream_index.timestamps) == 0:
+            return None
+        span = stream.samples_per_packet * (stream_index.interval or 0)
+        return int(stream_index.timestamps[0]), int(stream_index.timestamps[-1]) + span
+
+    def stream_index(self, stream: SbemChunkType) -> SbemStreamIndex:
+        if stream.id not in self._streams:
+            offsets = complete_chunks(self.index, stream, len(self.map))["offset"]
+            # only the leading timestamp of every chunk is read
+            raw = gather_contents(self.map, offsets, SBEM_TIMESTAMP_SIZE)
+            timestamps = np.frombuffer(raw, dtype="<u8").astype(np.int64) // 1000
+
+            interval = estimate_interval(timestamps, stream.samples_per_packet)
+            self._streams[stream.id] = SbemStreamIndex(offsets, timestamps, interval)
+
+        return self._streams[stream.id]
+
+    @property
+    def start_time(self) -> int | None:
+        first = [
+            int(self.stream_index(stream).timestamps[0])
+            for stream in known_chunk_types
+            if len(self.stream_index(stream).timestamps)
+        ]
+        return min(first) if first else None
+
+    def read(
+        self,
+        stream: SbemChunkType,
+        start_ms: int | None = None,
+        end_ms: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        returns sample timestamps and values of one stream between start_ms
+        and end_ms, both relative to the start of the recording. Only chunks
+        overlapping that range are decoded
+        """
+        stream_index = self.stream_index(stream)
+        timestamps = stream_index.timestamps
+        interval = stream_index.interval
+        if interval is None:
+            interval = stream.default_interval
+        if len(timestamps) == 0:
+            # nothing recorded, so there is no start to count from either
+            return expand_samples(stream, *stream.decoder(b""), interval)
+
+        start = None if start_ms is None else self.start_time + start_ms
+        end = None if end_ms is None else self.start_time + end_ms
+        span = stream.samples_per_packet * interval
+
+        selected = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            selected &= timestamps + span > start
+        if end is not None:
+            selected &= timestamps < end
+
+        contents = gather_contents(
+            self.map, stream_index.offsets[selected], stream.packet_size
+        )
+        sample_timestamps, values = expand_samples(
+            stream, *stream.decoder(contents), interval
+        )
+
+        keep = np.ones(len(sample_timestamps), dtype=bool)
+        if start is not None:
+            keep &= sample_timestamps >= start
+        if end is not None:
+            keep &= sample_timestamps < end
+        return sample_timestamps[keep], values[keep]
+
+
+def sbem_loss_reports(filename: str) -> list[LossReport]:
+    # only the chunk timestamps are read, through the (cached) index
+    with SbemFile(filename) as sbem_file:
+        reports = []
+        for name, stream in [("ecg", ecg_chunk), ("imu", imu_chunk)]:
+            report = LossReport(name, stream.samples_per_packet)
+            report.add(sbem_file.stream_index(stream).timestamps)
+            reports.append(report)
+    return reports
+
+
+def expand_samples(
+    chunk_type: SbemChunkType,
+    packet_timestamps: np.ndarray,
+    values: np.ndarray,
+    interval: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    sample_offsets = np.arange(chunk_type.samples_per_packet) * interval
+    sample_timestamps = (packet_timestamps[:, None] + sample_offsets).reshape(-1)
+    if chunk_type.channels == 1:
+        return sample_timestamps, values.reshape(-1)
+    return sample_timestamps, values.reshape(-1, chunk_type.channels)
+
+
+def iter_sbem_batches(
+    stream: BinaryIO, batch_size: int = 4096, read_size: int = 1 << 20
+) -> Iterator[tuple[SbemChunkType, np.ndarray, np.ndarray]]:
+    """
+    decodes the known streams of an open SBEM file in batches of batch_size
+    chunks and yields (chunk type, sample timestamps, values), so memory use
+    does not depend on the length of the recording
+    """
+    if batch_size < 2:
+        raise Exception("batch size has to be at least 2 to infer the interval")
+
+    pending = {id: [] for id in known_chunk_ids}
+    intervals = {}
+
+    def flush(chunk_type: SbemChunkType):
+        packet_timestamps, values = chunk_type.decoder(pending[chunk_type.id])
+        pending[chunk_type.id] = []
+        # same inference as add_interval_if_known, from the first batch
+        if chunk_type.id not in intervals:
+            estimate = estimate_interval(
+                packet_timestamps, chunk_type.samples_per_packet
+            )
+            if estimate is not None:
+                intervals[chunk_type.id] = estimate
+        interval = intervals.get(chunk_type.id, chunk_type.default_interval)
+        return chunk_type, *expand_samples(
+            chunk_type, packet_timestamps, values, interval
+        )
+
+    for chunk in iter_sbem_chunks(stream, read_size):
+        if chunk.id not in pending:
+            continue
+        pending[chunk.id].append(chunk.content)
+        if len(pending[chunk.id]) == batch_size:
+            yield flush(known_chunk_ids[chunk.id])
 
-    return datachunks
+    for chunk_type in known_chunk_types:
+        if pending[chunk_type.id]:
+            yield flush(chunk_type)
 
 
-def parse_sbem_file(filename: str) -> None:
+def sbem_outputs(filename: str) -> dict[int, tuple[str, str]]:
     if ".bin" != filename[-4:]:
         raise Exception(f'file type has to be ".bin" for {filename}')
 
-    file_contents = read_bin_file(filename)
-
-    if not check_sbem_header(file_contents):
-        raise Exception("file header does not match SBEM0112")
-
-    chunks = parse_sbem(file_contents)
-    # for chunk in filter(lambda sc: sc.id in [ct.id for ct in known_chunk_types], chunks):
-    data_chunks = parse_chunks(chunks)
-    for id in data_chunks:
-        chunks_for_id = data_chunks[id]
-        chunks_for_id = add_interval_if_known(chunks_for_id)
-
-    flat_entries = {id: [] for id in data_chunks}
-    for id in data_chunks:
-        # convert to flat list
-        for chunks in data_chunks[id]:
-            flat_entries[id] += chunks.to_data_entries()
-
-    # import matplotlib.pyplot as plt
-
-    # fig, ax = plt.subplots()
-    # ax.plot([entry.value for entry in flat_entries[104]])
-    # plt.show()
     output_filename_base = f"{filename[:-4]}"
     # 108 or 110 was 104 or 105
-    write_to_csv(
-        f"{output_filename_base}.ecg.csv",
-        flat_entries[ecg_chunk.id],
-        "timestamp, value",
-    )
-
-    write_to_csv(
-        f"{output_filename_base}.imu.csv",
-        flat_entries[imu_chunk.id],
-        "timestamp, value",
+    return {
+        ecg_chunk.id: (f"{output_filename_base}.ecg", "timestamp, value"),
+        imu_chunk.id: (f"{output_filename_base}.imu", imu_chunk.csv_header),
+    }
+
+
+def sbem_output_files(filename: str, export_format: str = "csv") -> list[str]:
+    extension = get_exporter(export_format).extension
+    return [f"{base}.{extension}" for base, _ in sbem_outputs(filename).values()]
+
+
+def iter_indexed_batches(
+    recording: SbemFile, batch_size: int = 4096
+) -> Iterator[tuple[SbemChunkType, np.ndarray, np.ndarray]]:
+    """
+    like iter_sbem_batches, but stream by stream through the chunk index of
+    the recording, so no chunk headers are parsed once the sidecar exists
+    """
+    for chunk_type in known_chunk_types:
+        stream_index = recording.stream_index(chunk_type)
+        interval = stream_index.interval
+        if interval is None:
+            interval = chunk_type.default_interval
+        for start in range(0, len(stream_index.offsets), batch_size):
+            contents = gather_contents(
+                recording.map,
+                stream_index.offsets[start : start + batch_size],
+                chunk_type.packet_size,
+            )
+            yield chunk_type, *expand_samples(
+                chunk_type, *chunk_type.decoder(contents), interval
+            )
+
+
+def _conversion_batches(
+    filename: str, batch_size: int, use_index: bool
+) -> Iterator[tuple[SbemChunkType, np.ndarray, np.ndarray, float]]:
+    # batches together with the converted fraction of the recording
+    if use_index:
+        with SbemFile(filename) as recording:
+            chunks = sum(
+                len(recording.stream_index(chunk_type).offsets)
+                for chunk_type in known_chunk_types
+            )
+            done = 0
+            for chunk_type, timestamps, values in iter_indexed_batches(
+                recording, batch_size
+            ):
+                done += len(timestamps) // chunk_type.samples_per_packet
+                yield chunk_type, timestamps, values, done / chunks
+        return
+
+    with open(filename, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        for chunk_type, timestamps, values in iter_sbem_batches(file, batch_size):
+            yield chunk_type, timestamps, values, file.tell() / size
+
+
+def convert_sbem_file(
+    filename: str,
+    export_format: str = "csv",
+    batch_size: int = 4096,
+    progress: Callable[[float], None] | None = None,
+    gap_markers: bool = False,
+    use_index: bool = False,
+) -> dict[str, int]:
+    """
+    converts one recording and returns the number of samples per output file.
+    A loss report per stream is written to <recording>.loss.json, with
+    gap_markers a row of NaN values is inserted after every gap.
+
+    With use_index the recording is read through the SbemFile index and its
+    sidecar: repeated conversions (e.g. into another format) skip parsing the
+    chunk headers, at the cost of holding the index of the whole recording
+    in memory (about 26 bytes per chunk) instead of one batch
+    """
+    outputs = sbem_outputs(filename)
+    exporter = get_exporter(export_format)
+    reports = {
+        id: LossReport(outputs[id][0].rsplit(".", 1)[1], chunk_type.samples_per_packet)
+        for id, chunk_type in known_chunk_ids.items()
+    }
+
+    with open(filename, "rb") as file:
+        if not check_sbem_header(file.read(len(SBEM_HEADER))):
+            raise Exception("file header does not match SBEM0112")
+
+    writers = {id: exporter.open(*outputs[id]) for id in outputs}
+    try:
+        for chunk_type, timestamps, values, done in _conversion_batches(
+            filename, batch_size, use_index
+        ):
+            report = reports[chunk_type.id]
+            previous = report.last_timestamp
+            report.add(timestamps[:: chunk_type.samples_per_packet])
+            if gap_markers and report.interval is not None:
+                # the last sample of the previous batch
+                if previous is not None:
+                    previous += (chunk_type.samples_per_packet - 1) * report.interval
+                timestamps, values = insert_gap_markers(
+                    timestamps, values, report.interval, previous
+                )
+            elif gap_markers:
+                # the first batch fixes the column types, markers need float
+                values = values.astype(np.float64)
+            writers[chunk_type.id].append(timestamps, values)
+            if progress is not None:
+                progress(done)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    save_loss_reports(f"{filename[:-4]}.loss.json", list(reports.values()))
+    return {writer.filename: writer.samples for writer in writers.values()}
+
+
+def parse_sbem_file(
+    filename: str,
+    export_format: str = "csv",
+    batch_size: int = 4096,
+    progress: Callable[[float], None] | None = None,
+    gap_markers: bool = False,
+    use_index: bool = False,
+) -> list[str]:
+    return list(
+        convert_sbem_file(
+            filename, export_format, batch_size, progress, gap_markers, use_index
+        )
     )
 
 
 if __name__ == "__main__":
+    # python -m src.movesense.sbem_parser <file.bin> [csv|npz|parquet]
+    # for many files see python -m src.movesense.batch_convert
     filename = sys.argv[1]
-    parse_sbem_file(filename)
+    parse_sbem_file(filename, *sys.argv[2:3])
@@ -0,0 +1,440 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+import bleak
+
+from src.bluetooth.attributes import attribute_index
+from src.bluetooth.collector import BluetoothDataCollector
+from src.common.definitions import HR_MEASUREMENT_UUID_128, MovesenseV7, MovesenseV8
+from src.common.file_io import get_timestamp_string
+from src.movesense.client import MovesenseClient, get_movesense_firmware_version
+from src.movesense.config import MovesenseConfigField
+from src.movesense.protocol import (
+    ECG7_PACKET_SIZE,
+    ECG8_PACKET_SIZE,
+    HR_FRAME_SIZE,
+    IMU7_PACKET_SIZE,
+    IMU8_PACKET_SIZE,
+    decode_heart_rate_frames,
+    deserialize_ecg7_packets,
+    deserialize_ecg8_packets,
+    deserialize_imu7_packets,
+    deserialize_imu8_packets,
+    ecg_header_string,
+    heart_rate_frame,
+    hr_header_string,
+    imu_header_string,
+)
+from src.movesense.transfer import RecordingTransfer, TransferResult, transfer_all
+
+
+@dataclass
+class StreamType:
+    char_uuid: str
+    deserializer: Callable
+    packet_size: int
+    header: str
+    packet_transform: Callable | None = None
+    regular: bool = True
+
+
+# the standard heart rate service is the same on both firmware versions
+heart_rate_stream = StreamType(
+    HR_MEASUREMENT_UUID_128,
+    decode_heart_rate_frames,
+    HR_FRAME_SIZE,
+    hr_header_string,
+    packet_transform=heart_rate_frame,
+    regular=False,
+)
+
+stream_types: dict[int, dict[str, StreamType]] = {
+    7: {
+        "ecg": StreamType(
+            MovesenseV7.ECG_VOLTAGE_UUID_128,
+            deserialize_ecg7_packets,
+            ECG7_PACKET_SIZE,
+            ecg_header_string,
+        ),
+        "imu": StreamType(
+            MovesenseV7.IMU_MEAS_UUID_128,
+            deserialize_imu7_packets,
+            IMU7_PACKET_SIZE,
+            imu_header_string,
+        ),
+        "hr": heart_rate_stream,
+    },
+    8: {
+        "ecg": StreamType(
+            MovesenseV8.ECG_VOLTAGE_UUID_128,
+            deserialize_ecg8_packets,
+            ECG8_PACKET_SIZE,
+            ecg_header_string,
+        ),
+        "imu": StreamType(
+            MovesenseV8.IMU_MEAS_UUID_128,
+            deserialize_imu8_packets,
+            IMU8_PACKET_SIZE,
+            imu_header_string,
+        ),
+        "hr": heart_rate_stream,
+    },
+}
+
+
+def device_folder_name(address: str) -> str:
+    return str(address).replace(":", "").replace("-", "")
+
+
+@dataclass
+class SessionDevice:
+    device: bleak.BleakClient
+    folder: str
+    firmware: int | None = None
+    config: MovesenseConfigField | None = None
+    collectors: dict[str, BluetoothDataCollector] = field(default_factory=dict)
+    calls_on_disconnect: list[Callable] = field(default_factory=list)
+    connected: bool = False
+    error: str | None = None
+
+    @property
+    def name(self) -> str:
+        return self.device.name or str(self.device.address)
+
+    def on_disconnect(self, _=None):
+        for f in self.calls_on_disconnect:
+            f()
+
+
+class RecordingSession:
+    """
+    records ECG/IMU from several Movesense devices at once. Every device gets
+    its own folder below one session directory, and v8 devices are synchronized
+    together so that their timestamps share the session time base (ms since
+    the session started)
+    """
+
+    def __init__(
+        self,
+        devices: list[bleak.BleakClient],
+        streams: tuple[str, ...] = ("ecg", "imu"),
+        export_format: str = "csv",
+        subfolder: str = "data",
+        intervals: dict[str, int] | None = None,
+    ):
+        self.directory = os.path.join(subfolder, f"session_{get_timestamp_string()}")
+        self.devices = [
+            SessionDevice(device, self._device_folder(device.address))
+            for device in devices
+        ]
+        self.streams = streams
+        self.export_format = export_format
+        # sample intervals (ms) per stream, set on every device before it starts
+        self.intervals = intervals or {}
+        self.start_time: int | None = None
+        self.sync_spread: int | None = None
+        self.started: float | None = None
+        self.stopped: float | None = None
+
+    def _device_folder(self, address: str) -> str:
+        return os.path.join(self.directory, device_folder_name(address))
+
+    @classmethod
+    def from_addresses(cls, addresses: list[str], **kwargs) -> "RecordingSession":
+        session = cls([], **kwargs)
+        for address in addresses:
+            session_device = SessionDevice(None, session._device_folder(address))
+            session_device.device = bleak.BleakClient(
+                address, disconnected_callback=session_device.on_disconnect
+            )
+            session.devices.append(session_device)
+        return session
+
+    async def connect(self) -> list[SessionDevice]:
+        async def connect_one(session_device: SessionDevice):
+            session_device.connected = await MovesenseClient(
+                session_device.device
+            ).connect()
+            if not session_device.connected:
+                session_device.error = "could not connect"
+
+        await asyncio.gather(*(connect_one(d) for d in self.devices))
+        return self.connected_devices()
+
+    def connected_devices(self) -> list[SessionDevice]:
+        return [d for d in self.devices if d.connected and d.error is None]
+
+    async def _prepare(self, session_device: SessionDevice):
+        try:
+            await self._create_collectors(session_device)
+        except Exception as e:
+            session_device.error = f"error preparing device: {e}"
+
+    async def _create_collectors(self, session_device: SessionDevice):
+        device = session_device.device
+        session_device.firmware = get_movesense_firmware_version(device)
+        if session_device.firmware not in stream_types:
+            session_device.error = f"not a Movesense, fv: {session_device.firmware}"
+            return
+
+        if session_device.firmware == 8:
+            session_device.config = MovesenseConfigField(
+                device, MovesenseV8.CONFIG_UUID_128
+            )
+            await session_device.config.initialize()
+        await self._set_intervals(session_device)
+
+        for stream in self.streams:
+            stream_type = stream_types[session_device.firmware][stream]
+            session_device.collectors[stream] = BluetoothDataCollector(
+                device=device,
+                char_uuid=stream_type.char_uuid,
+                deserializer=stream_type.deserializer,
+                packet_size=stream_type.packet_size,
+                header=stream_type.header,
+                calls_on_disconnect=session_device.calls_on_disconnect,
+                export_format=self.export_format,
+                name=stream,
+                subfolder=session_device.folder,
+                packet_transform=stream_type.packet_transform,
+                regular=stream_type.regular,
+                expected_interval=self._expected_interval(session_device, stream),
+            )
+
+    def _expected_interval(
+        self, session_device: SessionDevice, stream: str
+    ) -> int | None:
+        if stream in self.intervals:
+            return self.intervals[stream]
+        config = session_device.config
+        if config is None:
+            return None
+        return {"ecg": config.ecg_interval, "imu": config.imu_interval}.get(stream)
+
+    async def _set_intervals(self, session_device: SessionDevice):
+        if not self.intervals:
+            return
+        if session_device.config is not None:
+            await session_device.config.update_intervals(
+                ecg_interval=self.intervals.get("ecg"),
+                imu_interval=self.intervals.get("imu"),
+            )
+            return
+        # v7 has one characteristic per interval
+        characteristics = {
+            "ecg": MovesenseV7.ECG_INTERVAL_UUID_128,
+            "imu": MovesenseV7.IMU_INTERVAL_UUID_128,
+        }
+        for stream, interval in self.intervals.items():
+            await session_device.device.write_gatt_char(
+                attribute_index(session_device.device).resolve(characteristics[stream]),
+                interval.to_bytes(2, "little"),
+            )
+
+    def _configured_devices(self) -> list[SessionDevice]:
+        return [d for d in self.connected_devices() if d.config is not None]
+
+    async def _synchronize(self, session_device: SessionDevice, step: Callable):
+        try:
+            await step(session_device.config)
+        except Exception as e:
+            session_device.error = f"error synchronizing device: {e}"
+
+    async def synchronize(self) -> None:
+        # all v8 clocks are set to host time in one round, what is left between
+        # the devices is the spread of the config writes (sync_spread, ms).
+        # A device that fails is left out, the others are still synchronized
+        for step in (
+            lambda config: config.synchronize_now(),
+            lambda config: config.initialize(),
+        ):
+            await asyncio.gather(
+                *(self._synchronize(d, step) for d in self._configured_devices())
+            )
+
+        synced_times = [
+            d.config.synced_time // 1000 for d in self._configured_devices()
+        ]
+        if not synced_times:
+            return
+        self.start_time = min(synced_times)
+        self.sync_spread = max(synced_times) - self.start_time
+
+    async def start(self) -> None:
+        await asyncio.gather(*(self._prepare(d) for d in self.connected_devices()))
+        await self.synchronize()
+
+        for session_device in self.connected_devices():
+            # v7 devices count their own uptime and cannot be aligned
+            if self.start_time is None or session_device.config is None:
+                continue
+            for collector in session_device.collectors.values():
+                collector.timestamp_offset = -self.start_time
+
+        self.started = time.monotonic()
+        await asyncio.gather(*(self._start(d) for d in self.connected_devices()))
+
+    async def _start(self, session_device: SessionDevice):
+        # every collector has started or failed before a failure is handled,
+        # none of them is left subscribed
+        results = await asyncio.gather(
+            *(collector.start() for collector in session_device.collectors.values()),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            session_device.error = f"error starting device: {errors[0]}"
+            await self._stop_collectors(session_device)
+
+    async def transfer(self, report=None) -> list[TransferResult]:
+        """
+        pulls the internal recordings of all connected v8 devices at once,
+        every recording is saved to the folder of its device
+        """
+        await asyncio.gather(
+            *(self._prepare(d) for d in self.connected_devices() if d.firmware is None)
+        )
+        transfers = [
+            RecordingTransfer(d.device, d.config, subfolder=d.folder, name="recording")
+            for d in self.connected_devices()
+            if d.config is not None
+        ]
+        return await transfer_all(transfers, report)
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.stopped or time.monotonic()) - self.started
+
+    def packet_rates(self) -> dict[str, dict[str, float]]:
+        elapsed = self.elapsed()
+        return {
+            d.name: {
+                stream: collector.received / elapsed if elapsed else 0.0
+                for stream, collector in d.collectors.items()
+            }
+            for d in self.devices
+        }
+
+    def progress(self) -> dict:
+        """
+        the status as plain data, e.g. for machine readable progress output
+        """
+        rates = self.packet_rates()
+        return {
+            "elapsed": round(self.elapsed(), 3),
+            "devices": {
+                d.name: {
+                    "error": d.error,
+                    "streams": {
+                        stream: {
+                            "packets": collector.received,
+                            "dropped": collector.dropped,
+                            "samples": collector.stats.samples,
+                            "packets_per_second": round(rates[d.name][stream], 2),
+                        }
+                        for stream, collector in d.collectors.items()
+                    },
+                }
+                for d in self.devices
+            },
+        }
+
+    def status(self) -> str:
+        lines = [f"session {self.directory}, {self.elapsed():.0f} s"]
+        rates = self.packet_rates()
+        for d in self.devices:
+            if d.error is not None:
+                lines.append(f" - {d.name}: {d.error}")
+                continue
+            streams = ", ".join(
+                f"{stream} {rates[d.name][stream]:.1f} packets/s"
+                f" ({collector.dropped} dropped)"
+                for stream, collector in d.collectors.items()
+            )
+            lines.append(f" - {d.name}: {streams}")
+        return "\n".join(lines)
+
+    async def stop(self) -> str:
+        """
+        finishes all collectors, writes session.json and returns its filename
+        """
+        running = [
+            collector
+            for d in self.connected_devices()
+            for collector in d.collectors.values()
+            if collector.is_running
+        ]
+        filenames = await asyncio.gather(*(c.finish() for c in running))
+        self.stopped = time.monotonic()
+        files = dict(zip(map(id, running), filenames))
+
+        rates = self.packet_rates()
+        manifest = {
+            "start_time": self.start_time,
+            "sync_spread": self.sync_spread,
+            "duration": self.elapsed(),
+            "devices": [
+                {
+                    "name": d.name,
+                    "address": str(d.device.address),
+                    "firmware": d.firmware,
+                    "synced_time": d.config.synced_time if d.config else None,
+                    "error": d.error,
+                    "streams": {
+                        stream: {
+                            "file": files.get(id(collector)),
+                            "packets": collector.received,
+                            "dropped": collector.dropped,
+                            "packets_per_second": rates[d.name][stream],
+                            "stats": collector.stats.summary(),
+                        }
+                        for stream, collector in d.collectors.items()
+                    },
+                }
+                for d in self.devices
+            ],
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        filename = os.path.join(self.directory, "session.json")
+        with open(filename, "w") as file:
+            json.dump(manifest, file, indent=2)
+        return filename
+
+    async def abort(self) -> None:
+        """
+        ends a recording that did not stop normally (an error, a cancellation):
+        running collectors are finished where the device still allows it, then
+        everything is disconnected, which closes the remaining files
+        """
+        await asyncio.gather(*(self._stop_collectors(d) for d in self.devices))
+        await self.disconnect()
+
+    async def _stop_collectors(self, session_device: SessionDevice):
+        # finishes what still runs and closes every file, also those of
+        # collectors that failed to start
+        for collector in session_device.collectors.values():
+            if collector.is_running:
+                try:
+                    await collector.finish()
+                except Exception:
+                    # e.g. the device is gone already
+                    pass
+            await asyncio.to_thread(collector.close_sink)
+
+    async def disconnect(self) -> None:
+        async def disconnect_one(session_device: SessionDevice):
+            # collectors that were not stopped keep what they received so far
+            for collector in session_device.collectors.values():
+                await asyncio.to_thread(collector.close_sink)
+            # the following disconnect is not accidental
+            session_device.calls_on_disconnect.clear()
+            await MovesenseClient(session_device.device).disconnect()
+            session_device.connected = False
+
+        await asyncio.gather(*(disconnect_one(d) for d in self.devices if d.connected))
@@ -0,0 +1,197 @@
+import json
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+
+from ..common.exporters import exporters
+
+# a step between packets longer than GAP_FACTOR periods means lost packets,
+# shorter than OVERLAP_FACTOR periods (or backwards) means overlapping data,
+# e.g. after a clock resync
+GAP_FACTOR = 1.5
+OVERLAP_FACTOR = 0.5
+
+
+def estimate_interval(
+    packet_timestamps: np.ndarray, samples_per_packet: int, default: int | None = None
+) -> int | None:
+    """
+    sample interval in ms from the median step between packets, so that single
+    lost packets or a resync do not distort it
+    """
+    steps = np.diff(np.asarray(packet_timestamps, dtype=np.int64))
+    steps = steps[steps > 0]
+    if len(steps) == 0:
+        return default
+    return max(int(round(float(np.median(steps)) / samples_per_packet)), 1)
+
+
+def classify_steps(steps: np.ndarray, period: int) -> tuple[np.ndarray, np.ndarray]:
+    """returns the gap and overlap masks for the steps between packets"""
+    return steps > GAP_FACTOR * period, steps < OVERLAP_FACTOR * period
+
+
+@dataclass
+class LossReport:
+    """
+    loss accounting of one stream, fed with the packet timestamps batch by batch
+    """
+
+    stream: str
+    samples_per_packet: int
+    interval: int | None = None
+    packets: int = 0
+    gaps: int = 0
+    overlaps: int = 0
+    missing_packets: int = 0
+    longest_gap: int = 0
+    first_timestamp: int | None = None
+    last_timestamp: int | None = None
+
+    def add(self, packet_timestamps: np.ndarray) -> None:
+        packet_timestamps = np.asarray(packet_timestamps, dtype=np.int64)
+        if len(packet_timestamps) == 0:
+            return
+        if self.interval is None:
+            self.interval = estimate_interval(
+                packet_timestamps, self.samples_per_packet
+            )
+        if self.first_timestamp is None:
+            self.first_timestamp = int(packet_timestamps[0])
+        self.packets += len(packet_timestamps)
+
+        if self.last_timestamp is not None:
+            packet_timestamps = np.concatenate(
+                ([self.last_timestamp], packet_timestamps)
+            )
+        self.last_timestamp = int(packet_timestamps[-1])
+        if self.interval is None:
+            return
+
+        period = self.interval * self.samples_per_packet
+        steps = np.diff(packet_timestamps)
+        gaps, overlaps = classify_steps(steps, period)
+        self.gaps += int(gaps.sum())
+        self.overlaps += int(overlaps.sum())
+        if gaps.any():
+            self.missing_packets += int(np.round(steps[gaps] / period).sum()) - int(
+                gaps.sum()
+            )
+            self.longest_gap = max(self.longest_gap, int(steps[gaps].max()))
+
+    @property
+    def missing_samples(self) -> int:
+        return self.missing_packets * self.samples_per_packet
+
+    @property
+    def lost_ms(self) -> int:
+        return self.missing_samples * (self.interval or 0)
+
+    @property
+    def loss_ratio(self) -> float:
+        expected = self.packets + self.missing_packets
+        return self.missing_packets / expected if expected else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "stream": self.stream,
+            "interval": self.interval,
+            "packets": self.packets,
+            "gaps": self.gaps,
+            "overlaps": self.overlaps,
+            "missing_packets": self.missing_packets,
+            "missing_samples": self.missing_samples,
+            "lost_ms": self.lost_ms,
+            "longest_gap_ms": self.longest_gap,
+            "loss_ratio": self.loss_ratio,
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.stream}: {self.packets} packets, {self.gaps} gaps, "
+            f"{self.overlaps} overlaps, {self.missing_samples} samples "
+            f"({self.lost_ms} ms, {self.loss_ratio:.2%}) lost"
+        )
+
+
+def save_loss_reports(filename: str, reports: list[LossReport]) -> str:
+    with open(filename, "w") as file:
+        json.dump([report.summary() for report in reports], file, indent=2)
+    return filename
+
+
+def insert_gap_markers(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    interval: int,
+    previous: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    inserts one NaN row after every gap in the sample timestamps, so that
+    plots and analyses do not interpolate over lost data. `previous` is the
+    last sample timestamp of the preceding batch. Values are returned as float
+    """
+    values = values.astype(np.float64)
+    if len(timestamps) == 0:
+        return timestamps, values
+    steps = np.diff(timestamps, prepend=timestamps[0] if previous is None else previous)
+    positions = np.flatnonzero(steps > GAP_FACTOR * interval)
+    if len(positions) == 0:
+        return timestamps, values
+
+    marker_timestamps = timestamps[positions] - steps[positions] + interval
+    return (
+        np.insert(timestamps, positions, marker_timestamps),
+        np.insert(values, positions, np.nan, axis=0),
+    )
+
+
+def export_loss_reports(filenames: list[str]) -> list[LossReport]:
+    """
+    loss reports for exported recordings (csv, npz, parquet). Files with the
+    same columns are treated as consecutive parts of one stream, so the time
+    lost between them (e.g. a reconnect) is counted as a gap as well
+    """
+    parts = {}
+    for filename in filenames:
+        columns = exporters[filename.rsplit(".", 1)[1]].read(filename)
+        timestamps = np.asarray(next(iter(columns.values())), dtype=np.int64)
+        if len(timestamps):
+            parts.setdefault(tuple(columns), []).append((filename, timestamps))
+
+    reports = []
+    for files in parts.values():
+        files.sort(key=lambda part: part[1][0])
+        stem = os.path.basename(files[0][0])
+        report = LossReport(stem.split(".")[0], samples_per_packet=1)
+        # the interval is estimated over all parts, not just the first one
+        report.interval = estimate_interval(
+            np.concatenate([timestamps for _, timestamps in files]), 1
+        )
+        for _, timestamps in files:
+            report.add(timestamps)
+        reports.append(report)
+    return reports
+
+
+def main(filenames: list[str]) -> None:
+    from .sbem_parser import sbem_loss_reports
+
+    recordings = [filename for filename in filenames if filename.endswith(".bin")]
+    exported = [filename for filename in filenames if filename not in recordings]
+    for filename in recordings:
+        print(filename)
+        for report in sbem_loss_reports(filename):
+            print(f"  {report}")
+    if exported:
+        for report in export_loss_reports(exported):
+            print(report)
+
+
+if __name__ == "__main__":
+    # python -m src.movesense.timeline <recording.bin> ... | <exported files> ...
+    main(sys.argv[1:])
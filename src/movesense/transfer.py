@@ -0,0 +1,201 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+import bleak
+
+from src.bluetooth.attributes import attribute_index
+from src.common.definitions import MovesenseV8
+from src.common.file_io import get_timestamp_string, write_to_file_binary
+from src.movesense.config import MovesenseConfigField
+
+
+@dataclass
+class TransferResult:
+    name: str
+    filename: str | None = None
+    bytes: int = 0
+    duration: float = 0.0
+    # time from the last received data to detecting the end of the transfer
+    latency: float = 0.0
+    polls: int = 0
+    error: str | None = None
+
+    def __str__(self) -> str:
+        if self.error is not None:
+            return f"{self.name}: transfer failed, {self.error}"
+        return (
+            f"{self.name}: {self.bytes / 1024:.1f} kB in {self.duration:.1f} s"
+            f" (done after {self.latency * 1000:.0f} ms), saved to {self.filename}"
+        )
+
+
+@dataclass
+class TransferProgress:
+    devices: int
+    bytes: int
+    elapsed: float
+
+    def __str__(self) -> str:
+        return (
+            f"received {self.bytes / 1024:.1f} kB from {self.devices} devices,"
+            f" {self.bytes / 1024 / max(self.elapsed, 1e-9):.1f} kB/s"
+        )
+
+
+@dataclass
+class RecordingTransfer:
+    """
+    pulls the recording stored on one v8 device through its recorded data
+    characteristic into a .bin file.
+
+    The end of the transfer is detected from the data stream: once
+    expected_bytes arrived, or when no data came for idle_timeout seconds.
+    Only then the config is read to confirm, polling with a growing interval
+    (up to max_poll_interval) while the device still reports a transfer
+    """
+
+    device: bleak.BleakClient
+    config_field: MovesenseConfigField
+    subfolder: str = "data"
+    name: str = ""
+    expected_bytes: int | None = None
+    idle_timeout: float = 0.1
+    max_poll_interval: float = 1.0
+    packets: list[bytearray] = field(default_factory=list)
+    received: int = 0
+    polls: int = 0
+
+    def __post_init__(self):
+        self._data_received = asyncio.Event()
+        self.last_data = time.perf_counter()
+
+    def _on_data(self, _, data: bytearray):
+        self.packets.append(data)
+        self.received += len(data)
+        self.last_data = time.perf_counter()
+        self._data_received.set()
+
+    def _has_all_data(self) -> bool:
+        return self.expected_bytes is not None and self.received >= self.expected_bytes
+
+    async def _is_transferring(self) -> bool:
+        self.polls += 1
+        await self.config_field.initialize()
+        return self.config_field.transfer_operation
+
+    async def _wait_until_done(self):
+        timeout = self.idle_timeout
+        while not self._has_all_data():
+            try:
+                await asyncio.wait_for(self._data_received.wait(), timeout)
+                # the stream is flowing, no need to ask the device
+                self._data_received.clear()
+                timeout = self.idle_timeout
+                continue
+            except asyncio.TimeoutError:
+                pass
+            if not await self._is_transferring():
+                return
+            timeout = min(2 * timeout, self.max_poll_interval)
+
+    async def run(self) -> TransferResult:
+        # every failure ends up in the result, other transfers keep running
+        result = TransferResult(self.name or str(self.device.address))
+        start = time.perf_counter()
+        recorded = attribute_index(self.device).resolve(MovesenseV8.RECORDED_UUID_128)
+        subscribed = False
+        try:
+            await self.device.start_notify(recorded, self._on_data)
+            subscribed = True
+            self._data_received.clear()
+            await self.config_field.transfer_data_now()
+            await self._wait_until_done()
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            if subscribed:
+                try:
+                    await self.device.stop_notify(recorded)
+                except Exception as e:
+                    result.error = result.error or str(e)
+        done = time.perf_counter()
+        result.duration = done - start
+        result.latency = done - max(self.last_data, start)
+        result.bytes = self.received
+        result.polls = self.polls
+
+        if result.error is None:
+            name = get_timestamp_string()
+            if self.name:
+                name = f"{self.name}_{name}"
+            try:
+                result.filename = await asyncio.to_thread(
+                    write_to_file_binary, self.packets, "bin", self.subfolder, name
+                )
+            except Exception as e:
+                result.error = str(e)
+        self.packets = []
+        return result
+
+
+async def transfer_all(
+    transfers: list[RecordingTransfer],
+    report: Callable[[TransferProgress], None] | None = None,
+    report_interval: float = 1.0,
+) -> list[TransferResult]:
+    """
+    runs the transfers of several devices at once and reports the combined
+    amount of data and throughput every report_interval seconds
+    """
+    start = time.perf_counter()
+
+    def progress() -> TransferProgress:
+        return TransferProgress(
+            len(transfers),
+            sum(transfer.received for transfer in transfers),
+            time.perf_counter() - start,
+        )
+
+    async def report_loop():
+        while True:
+            await asyncio.sleep(report_interval)
+            report(progress())
+
+    reporter = asyncio.create_task(report_loop()) if report is not None else None
+    try:
+        results = await asyncio.gather(
+            *(transfer.run() for transfer in transfers), return_exceptions=True
+        )
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+    if report is not None:
+        report(progress())
+    return [
+        (
+            TransferResult(
+                transfer.name or str(transfer.device.address),
+                error=str(result) or type(result).__name__,
+            )
+            if isinstance(result, BaseException)
+            else result
+        )
+        for transfer, result in zip(transfers, results)
+    ]
+
+
+def summarize(results: list[TransferResult], duration: float) -> str:
+    total = sum(result.bytes for result in results)
+    lines = [str(result) for result in results]
+    if results:
+        latency = max(result.latency for result in results)
+        lines.append(
+            f"slowest completion detected {latency * 1000:.0f} ms after the data"
+        )
+    lines.append(
+        f"{total / 1024:.1f} kB from {len(results)} devices in {duration:.1f} s,"
+        f" {total / 1024 / max(duration, 1e-9):.1f} kB/s"
+    )
+    return "\n".join(lines)
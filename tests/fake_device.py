@@ -0,0 +1,263 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from src.bluetooth.collector import BluetoothDataCollector
+from src.common.definitions import (
+    ACTIVITY_SVC_UUID_128,
+    HR_MEASUREMENT_UUID_128,
+    HR_SVC_UUID_128,
+    MovesenseV7,
+    MovesenseV8,
+)
+from src.movesense.protocol import (
+    ECG8_PACKET_SIZE,
+    ECG_SAMPLES_PER_PACKET,
+    IMU_SAMPLES_PER_PACKET,
+    deserialize_ecg8_packets,
+    ecg_header_string,
+)
+from tests.synthetic import ecg_packets, imu_packets, sbem_bytes
+
+
+@dataclass
+class FakeCharacteristic:
+    uuid: str
+    properties: list[str] = field(default_factory=lambda: ["read", "notify"])
+
+
+@dataclass
+class FakeService:
+    uuid: str
+    characteristics: list[FakeCharacteristic]
+
+
+def activity_service(version: int) -> FakeService:
+    uuids = {
+        7: [
+            MovesenseV7.ECG_VOLTAGE_UUID_128,
+            MovesenseV7.IMU_MEAS_UUID_128,
+            MovesenseV7.ECG_INTERVAL_UUID_128,
+            MovesenseV7.IMU_INTERVAL_UUID_128,
+        ],
+        8: [
+            MovesenseV8.ECG_VOLTAGE_UUID_128,
+            MovesenseV8.IMU_MEAS_UUID_128,
+            MovesenseV8.CONFIG_UUID_128,
+            MovesenseV8.RECORDED_UUID_128,
+        ],
+    }[version]
+    return FakeService(ACTIVITY_SVC_UUID_128, [FakeCharacteristic(u) for u in uuids])
+
+
+class FakeMovesense:
+    """
+    stands in for a connected bleak.BleakClient, packets are pushed by the test
+    """
+
+    def __init__(
+        self,
+        address: str,
+        version: int = 8,
+        connects: bool = True,
+        recording: bytes = b"",
+    ):
+        self.address = address
+        self.name = f"Movesense {address[-5:]}"
+        self.version = version
+        self.connects = connects
+        self.is_connected = False
+        self.services = [
+            activity_service(version),
+            FakeService(HR_SVC_UUID_128, [FakeCharacteristic(HR_MEASUREMENT_UUID_128)]),
+        ]
+        self.config = bytearray(16)
+        self.config[0:2] = bytes([2, 10])
+        # v7 keeps its intervals in two uint16 characteristics
+        self.intervals = {
+            MovesenseV7.ECG_INTERVAL_UUID_128: 2,
+            MovesenseV7.IMU_INTERVAL_UUID_128: 10,
+        }
+        self.callbacks = {}
+        # sent through the recorded data characteristic on a transfer request
+        self.recording = recording
+        self.transfer_packet_size = 240
+        self.transfer_delay = 0.0
+
+    async def connect(self):
+        if not self.connects:
+            raise Exception(f"device {self.address} not found")
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    async def start_notify(self, char, callback):
+        self.callbacks[getattr(char, "uuid", char)] = callback
+
+    async def stop_notify(self, char):
+        self.callbacks.pop(getattr(char, "uuid", char))
+
+    async def read_gatt_char(self, char) -> bytearray:
+        uuid = getattr(char, "uuid", char)
+        if uuid in self.intervals:
+            return bytearray(self.intervals[uuid].to_bytes(2, "little"))
+        return bytearray(self.config)
+
+    async def write_gatt_char(self, char, data, response=None):
+        uuid = getattr(char, "uuid", char)
+        if uuid in self.intervals:
+            self.intervals[uuid] = int.from_bytes(data, "little")
+            return
+        self._write_config(bytearray(data))
+
+    def _write_config(self, config: bytearray):
+        self.config[:] = config
+        if self.config[5]:
+            asyncio.create_task(self._transfer())
+
+    async def _transfer(self):
+        await asyncio.sleep(self.transfer_delay)
+        for i in range(0, len(self.recording), self.transfer_packet_size):
+            data = self.recording[i : i + self.transfer_packet_size]
+            self.notify(MovesenseV8.RECORDED_UUID_128, data)
+            await asyncio.sleep(0)
+        self.config[5] = 0
+
+    def notify(self, char_uuid: str, packet: bytes):
+        self.callbacks[char_uuid](None, bytearray(packet))
+
+
+class SimulatedMovesense(FakeMovesense):
+    """
+    a FakeMovesense that produces data by itself: subscribing to the ECG or
+    IMU characteristic streams packets at the configured interval, and the v8
+    recording flag records into the storage that a transfer sends back.
+    `speed` runs the device clock faster than real time for benchmarks
+    """
+
+    def __init__(self, address: str, version: int = 8, speed: float = 1.0, **kwargs):
+        super().__init__(address, version, **kwargs)
+        self.speed = speed
+        self.booted = time.perf_counter()
+        self.streams: dict[str, asyncio.Task] = {}
+        self.sent = 0
+        self.recording_started: int | None = None
+        uuids = MovesenseV7 if version == 7 else MovesenseV8
+        self.stream_kinds = {
+            uuids.ECG_VOLTAGE_UUID_128: "ecg",
+            uuids.IMU_MEAS_UUID_128: "imu",
+        }
+
+    def now(self) -> int:
+        # device clock in ms, v8 devices count from the synchronized time
+        elapsed = int((time.perf_counter() - self.booted) * 1000 * self.speed)
+        if self.version == 7:
+            return elapsed
+        return int.from_bytes(self.config[8:], "little") // 1000 + elapsed
+
+    def interval(self, kind: str) -> int:
+        if self.version == 7:
+            return self.intervals[
+                (
+                    MovesenseV7.ECG_INTERVAL_UUID_128
+                    if kind == "ecg"
+                    else MovesenseV7.IMU_INTERVAL_UUID_128
+                )
+            ]
+        return self.config[0] if kind == "ecg" else self.config[1]
+
+    async def start_notify(self, char, callback):
+        await super().start_notify(char, callback)
+        uuid = getattr(char, "uuid", char)
+        if uuid in self.stream_kinds:
+            self.streams[uuid] = asyncio.create_task(self._stream(uuid))
+
+    async def stop_notify(self, char):
+        uuid = getattr(char, "uuid", char)
+        if uuid in self.streams:
+            self.streams.pop(uuid).cancel()
+        await super().stop_notify(char)
+
+    async def disconnect(self):
+        for task in self.streams.values():
+            task.cancel()
+        self.streams.clear()
+        await super().disconnect()
+
+    async def _stream(self, uuid: str):
+        kind = self.stream_kinds[uuid]
+        interval = self.interval(kind)
+        timestamp_size = 4 if self.version == 7 else 8
+        if kind == "ecg":
+            period = ECG_SAMPLES_PER_PACKET * interval
+            templates = ecg_packets(1024, timestamp_size, interval)
+        else:
+            period = IMU_SAMPLES_PER_PACKET * interval
+            templates = imu_packets(256, timestamp_size, interval)
+
+        start = self.now()
+        sent = 0
+        while True:
+            due = (self.now() - start) // period
+            for i in range(sent, due):
+                timestamp = start + i * period
+                if timestamp_size == 8:
+                    timestamp *= 1000
+                template = templates[i % len(templates)]
+                packet = (
+                    timestamp.to_bytes(timestamp_size, "little")
+                    + template[timestamp_size:]
+                )
+                self.notify(uuid, packet)
+            self.sent += due - sent
+            sent = due
+            await asyncio.sleep(min(period / 1000 / self.speed, 0.01))
+
+    def _write_config(self, config: bytearray):
+        was_recording = bool(self.config[4])
+        super()._write_config(config)
+        if self.config[4] and not was_recording:
+            self.recording_started = self.now()
+        elif was_recording and not self.config[4]:
+            seconds = (self.now() - self.recording_started) / 1000
+            self.recording += sbem_bytes(
+                seconds,
+                self.config[0],
+                self.config[1],
+                start=self.recording_started,
+                header=not self.recording,
+            )
+        if self.config[6]:
+            self.recording = b""
+            self.config[6] = 0
+
+
+class NotifyingDevice:
+    # only delivers the notifications a test sends, no services or config
+    def __init__(self):
+        self.callbacks = {}
+        self.services = []
+
+    async def start_notify(self, char_uuid, callback):
+        self.callbacks[char_uuid] = callback
+
+    async def stop_notify(self, char_uuid):
+        self.callbacks.pop(char_uuid)
+
+    def notify(self, char_uuid, packet: bytes):
+        self.callbacks[char_uuid](None, bytearray(packet))
+
+
+def ecg_collector(device, tmp_path, calls_on_disconnect, **kwargs):
+    return BluetoothDataCollector(
+        device=device,
+        char_uuid="ecg",
+        deserializer=deserialize_ecg8_packets,
+        header=ecg_header_string,
+        calls_on_disconnect=calls_on_disconnect,
+        packet_size=ECG8_PACKET_SIZE,
+        name="ecg",
+        subfolder=str(tmp_path),
+        **kwargs,
+    )
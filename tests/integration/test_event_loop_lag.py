@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from src.common import executor
+from src.common.executor import configure_executor, run_in_executor, shutdown_executor
+from src.movesense.sbem_parser import parse_sbem_file
+from tests.synthetic import write_sbem_file
+
+
+async def ticks_during(work, tick: float = 0.005) -> tuple[int, object]:
+    # how often another task got to run while work was awaited
+    ticks = 0
+    done = False
+
+    async def ticker():
+        nonlocal ticks
+        while not done:
+            await asyncio.sleep(tick)
+            ticks += not done
+
+    task = asyncio.create_task(ticker())
+    result = await work()
+    done = True
+    await task
+    return ticks, result
+
+
+@pytest.fixture(params=["thread", "process"])
+def executor_kind(request):
+    configure_executor(request.param)
+    yield request.param
+    shutdown_executor()
+
+
+def test_conversion_in_executor_keeps_loop_responsive(tmp_path, executor_kind):
+    filename = str(tmp_path / "recording.bin")
+    write_sbem_file(filename, 8 << 20)
+    reports = []
+
+    async def in_executor():
+        return await run_in_executor(
+            parse_sbem_file, filename, "npz", progress=reports.append
+        )
+
+    async def inline():
+        return parse_sbem_file(filename, "npz")
+
+    executor_ticks, outputs = asyncio.run(ticks_during(in_executor))
+    inline_ticks, _ = asyncio.run(ticks_during(inline))
+
+    assert len(outputs) == 2
+    assert reports and reports[-1] == pytest.approx(1.0)
+    assert executor_ticks > 0
+    assert inline_ticks == 0
+
+
+def test_shutdown_executor_stops_the_manager():
+    configure_executor("process")
+    executor._progress_queue()
+    manager = executor._manager
+
+    shutdown_executor()
+
+    assert executor._executor is None and executor._manager is None
+    assert not manager._process.is_alive()
@@ -0,0 +1,115 @@
+import asyncio
+
+import numpy as np
+
+from src.bluetooth.collector import BluetoothDataCollector
+from src.common.definitions import MovesenseV7, MovesenseV8
+from src.common.exporters import get_exporter
+from src.movesense.config import MovesenseConfigField
+from src.movesense.protocol import (
+    ECG7_PACKET_SIZE,
+    IMU8_PACKET_SIZE,
+    deserialize_ecg7_packets,
+    deserialize_imu8_packets,
+    ecg_header_string,
+    imu_header_string,
+)
+from src.movesense.sbem_parser import ecg_chunk, index_sbem, parse_sbem_file
+from src.movesense.transfer import RecordingTransfer
+from tests.fake_device import SimulatedMovesense
+
+
+async def wait_for_packets(collector: BluetoothDataCollector, count: int):
+    # the simulated device streams from the event loop, so this waits for
+    # packets instead of a wall clock time
+    async def arrived():
+        while collector.received < count:
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(arrived(), timeout=10)
+
+
+def test_v7_ecg_stream_follows_the_interval_characteristic(tmp_path):
+    device = SimulatedMovesense("00:00:00:00:00:01", version=7, speed=20)
+    collector = BluetoothDataCollector(
+        device=device,
+        char_uuid=MovesenseV7.ECG_VOLTAGE_UUID_128,
+        deserializer=deserialize_ecg7_packets,
+        header=ecg_header_string,
+        calls_on_disconnect=[],
+        packet_size=ECG7_PACKET_SIZE,
+        subfolder=str(tmp_path),
+    )
+
+    async def run():
+        interval = MovesenseV7.ECG_INTERVAL_UUID_128
+        await device.write_gatt_char(interval, (4).to_bytes(2, "little"))
+        assert await device.read_gatt_char(interval) == b"\x04\x00"
+        await collector.start()
+        await wait_for_packets(collector, 40)
+        return await collector.finish()
+
+    timestamps = get_exporter("csv").read(asyncio.run(run()))["timestamp"]
+
+    # everything sent until unsubscribing arrived and was written
+    assert collector.received == device.sent >= 40 and collector.dropped == 0
+    assert len(timestamps) == 16 * collector.received
+    assert np.all(np.diff(timestamps) == 4)
+
+
+def test_v8_imu_stream_is_synchronized(tmp_path):
+    device = SimulatedMovesense("00:00:00:00:00:01", speed=10)
+    config = MovesenseConfigField(device, MovesenseV8.CONFIG_UUID_128)
+    collector = BluetoothDataCollector(
+        device=device,
+        char_uuid=MovesenseV8.IMU_MEAS_UUID_128,
+        deserializer=deserialize_imu8_packets,
+        header=imu_header_string,
+        calls_on_disconnect=[],
+        packet_size=IMU8_PACKET_SIZE,
+        subfolder=str(tmp_path),
+    )
+
+    async def run():
+        await config.initialize()
+        await config.update_intervals(imu_interval=20)
+        await config.synchronize_now()
+        await collector.start()
+        await wait_for_packets(collector, 10)
+        return await collector.finish()
+
+    timestamps = get_exporter("csv").read(asyncio.run(run()))["timestamp"]
+
+    assert collector.received == device.sent >= 10
+    assert len(timestamps) == 8 * collector.received
+    assert abs(timestamps[0] - config.synced_time // 1000) < 1000
+    assert np.all(np.diff(timestamps) == 20)
+
+
+def test_v8_recording_is_transferred_and_parsed(tmp_path):
+    device = SimulatedMovesense("00:00:00:00:00:01", speed=50)
+    config = MovesenseConfigField(device, MovesenseV8.CONFIG_UUID_128)
+
+    async def run():
+        await config.initialize()
+        await config.start_recording()
+        await asyncio.sleep(0.1)
+        await config.stop_recording()
+        result = await RecordingTransfer(
+            device, config, subfolder=str(tmp_path), idle_timeout=0.01
+        ).run()
+        recorded = len(device.recording)
+        await config.delete_data_now()
+        return result, recorded
+
+    result, recorded = asyncio.run(run())
+
+    assert result.bytes == recorded > 0
+    ecg, imu = parse_sbem_file(result.filename)
+    with open(result.filename, "rb") as file:
+        index = index_sbem(file.read())
+    ecg_chunks = np.count_nonzero(index["id"] == ecg_chunk.id)
+    # 0.1 s at 50x are about 5 s of 2 ms ECG
+    assert ecg_chunks > 0
+    assert len(get_exporter("csv").read(ecg)["timestamp"]) == 16 * ecg_chunks
+    assert device.recording == b""
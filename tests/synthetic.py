@@ -0,0 +1,169 @@
+import numpy as np
+
+from src.movesense.protocol import (
+    ECG_SAMPLES_PER_PACKET,
+    IMU_CHANNELS,
+    IMU_SAMPLES_PER_PACKET,
+    ecg_packet_dtype,
+    imu_packet_dtype,
+)
+
+
+def ecg_samples(count: int, interval: int = 2, seed: int = 0) -> np.ndarray:
+    # roughly ECG shaped: 60 bpm spikes on top of baseline wander and noise
+    rng = np.random.default_rng(seed)
+    t = np.arange(count) * interval / 1000
+    signal = 200 * np.sin(2 * np.pi * 0.3 * t) + rng.normal(0, 20, count)
+    signal += 1500 * np.exp(-(((t % 1.0) - 0.5) ** 2) / 0.0002)
+    return signal.astype(np.int16)
+
+
+def ecg_packets(
+    count: int,
+    timestamp_size: int = 8,
+    interval: int = 2,
+    start: int = 0,
+    seed: int = 0,
+) -> list[bytes]:
+    is_microseconds = timestamp_size == 8
+    dtype = ecg_packet_dtype(timestamp_size)
+    records = np.empty(count, dtype=dtype)
+
+    timestamps = start + np.arange(count) * ECG_SAMPLES_PER_PACKET * interval
+    records["timestamp"] = timestamps * 1000 if is_microseconds else timestamps
+    records["values"] = ecg_samples(
+        count * ECG_SAMPLES_PER_PACKET, interval, seed
+    ).reshape(count, ECG_SAMPLES_PER_PACKET)
+
+    buffer = records.tobytes()
+    return [
+        buffer[i : i + dtype.itemsize] for i in range(0, len(buffer), dtype.itemsize)
+    ]
+
+
+def ecg_packets_for_duration(
+    seconds: float, timestamp_size: int = 8, interval: int = 2
+) -> list[bytes]:
+    count = int(seconds * 1000 / interval) // ECG_SAMPLES_PER_PACKET
+    return ecg_packets(count, timestamp_size, interval)
+
+
+def imu_packets(
+    count: int,
+    timestamp_size: int = 8,
+    interval: int = 10,
+    start: int = 0,
+    seed: int = 0,
+) -> list[bytes]:
+    is_microseconds = timestamp_size == 8
+    dtype = imu_packet_dtype(timestamp_size)
+    records = np.zeros(count, dtype=dtype)
+
+    timestamps = start + np.arange(count) * IMU_SAMPLES_PER_PACKET * interval
+    records["timestamp"] = timestamps * 1000 if is_microseconds else timestamps
+    # full int16 range, so that truncation to single bytes would be noticed
+    rng = np.random.default_rng(seed)
+    values = rng.integers(
+        -30000, 30000, (count, IMU_SAMPLES_PER_PACKET, IMU_CHANNELS), dtype=np.int16
+    )
+    records["samples"]["acc"] = values[:, :, 0:3]
+    records["samples"]["gyr"] = values[:, :, 3:6]
+    records["samples"]["mag"] = values[:, :, 6:9]
+
+    buffer = records.tobytes()
+    return [
+        buffer[i : i + dtype.itemsize] for i in range(0, len(buffer), dtype.itemsize)
+    ]
+
+
+def hr_notification(
+    bpm: int, rr: list[int], wide: bool = False, energy: int | None = None
+) -> bytes:
+    # Heart Rate Measurement layout, rr in 1/1024 s
+    flags = (0x01 if wide else 0) | (0x08 if energy is not None else 0)
+    flags |= 0x10 if rr else 0
+    data = bytes([flags]) + bpm.to_bytes(2 if wide else 1, "little")
+    if energy is not None:
+        data += energy.to_bytes(2, "little")
+    return data + b"".join(r.to_bytes(2, "little") for r in rr)
+
+
+def parse_hr_notification(data: bytes) -> tuple[int, list[int]]:
+    # reads one notification byte by byte, the reference for the batch decoder:
+    # BPM and the RR intervals in ms
+    flags = data[0]
+    offset = 3 if flags & 0x01 else 2
+    bpm = int.from_bytes(data[1:offset], "little")
+    if flags & 0x08:
+        offset += 2
+    if not flags & 0x10:
+        return bpm, []
+    return bpm, [
+        int.from_bytes(data[i : i + 2], "little") * 1000 // 1024
+        for i in range(offset, len(data) - 1, 2)
+    ]
+
+
+def hr_notifications(count: int, seed: int = 0) -> list[bytes]:
+    # one notification per second with zero to three beats, all flag variants
+    rng = np.random.default_rng(seed)
+    notifications = []
+    for i in range(count):
+        beats = int(rng.integers(0, 4))
+        rr = rng.integers(600, 1100, beats).tolist()
+        notifications.append(
+            hr_notification(
+                int(rng.integers(50, 180)),
+                rr,
+                wide=i % 2 == 1,
+                energy=i if i % 3 == 0 else None,
+            )
+        )
+    return notifications
+
+
+def sbem_bytes(
+    seconds: float,
+    ecg_interval: int = 2,
+    imu_interval: int = 10,
+    start: int = 0,
+    seed: int = 0,
+    header: bool = True,
+) -> bytes:
+    from src.movesense.sbem_parser import SBEM_HEADER
+
+    ecg_period = ECG_SAMPLES_PER_PACKET * ecg_interval
+    imu_period = IMU_SAMPLES_PER_PACKET * imu_interval
+    ecg = ecg_packets(
+        int(seconds * 1000) // ecg_period, interval=ecg_interval, start=start, seed=seed
+    )
+    imu = imu_packets(
+        int(seconds * 1000) // imu_period, interval=imu_interval, start=start, seed=seed
+    )
+    # interleave both streams by time like the sensor does, plus some chunks of
+    # an unknown type that the parser has to skip
+    tagged = [(i * ecg_period, 104, packet) for i, packet in enumerate(ecg)]
+    tagged += [(i * imu_period, 105, packet) for i, packet in enumerate(imu)]
+    tagged += [(i * 1000, 2, bytes(6)) for i in range(int(seconds))]
+    tagged.sort(key=lambda entry: entry[0])
+
+    body = b"".join(
+        bytes([chunk_id, len(content)]) + content for _, chunk_id, content in tagged
+    )
+    return SBEM_HEADER + body if header else body
+
+
+def write_sbem_file(path, size: int, seed: int = 0) -> int:
+    from src.movesense.sbem_parser import SBEM_HEADER
+
+    # appends one minute blocks with continuous timestamps until `size` is reached
+    written = len(SBEM_HEADER)
+    minute = 0
+    with open(path, "wb") as file:
+        file.write(SBEM_HEADER)
+        while written < size:
+            block = sbem_bytes(60, start=minute * 60_000, seed=seed, header=False)
+            file.write(block)
+            written += len(block)
+            minute += 1
+    return written
@@ -0,0 +1,74 @@
+import asyncio
+
+import bleak
+
+from src.bluetooth.attributes import attribute_index
+from src.common.definitions import (
+    ACTIVITY_SVC_UUID_128,
+    HR_MEASUREMENT_UUID_128,
+    HR_SVC_UUID_128,
+    MovesenseV7,
+    MovesenseV8,
+)
+from src.movesense.client import MovesenseClient, get_movesense_firmware_version
+from tests.fake_device import FakeMovesense, activity_service
+
+
+def test_index_is_built_once_per_connection():
+    device = FakeMovesense("00:00:00:00:00:01")
+    index = attribute_index(device)
+
+    for _ in range(100):
+        assert index.characteristic(MovesenseV8.CONFIG_UUID_128).uuid == (
+            MovesenseV8.CONFIG_UUID_128
+        )
+        assert get_movesense_firmware_version(device) == 8
+    assert attribute_index(device) is index
+    assert index.builds == 1
+
+
+def test_index_normalizes_uuids():
+    index = attribute_index(FakeMovesense("00:00:00:00:00:01"))
+
+    assert index.service("180D") is index.service(HR_SVC_UUID_128)
+    assert index.characteristic("2A37", "180d").uuid == HR_MEASUREMENT_UUID_128
+    assert index.characteristic(MovesenseV8.CONFIG_UUID_128.upper()) is not None
+    # a characteristic is only found in the service it belongs to
+    assert index.characteristic(HR_MEASUREMENT_UUID_128, ACTIVITY_SVC_UUID_128) is None
+
+
+def test_index_follows_changed_services():
+    device = FakeMovesense("00:00:00:00:00:01")
+    index = attribute_index(device)
+    assert get_movesense_firmware_version(device) == 8
+
+    # what bleak does on a reconnect
+    device.services = [activity_service(7)]
+    assert get_movesense_firmware_version(device) == 7
+    assert index.characteristic(HR_MEASUREMENT_UUID_128) is None
+    assert index.builds == 2
+
+    index.invalidate()
+    index.characteristic(MovesenseV7.ECG_VOLTAGE_UUID_128)
+    assert index.builds == 3
+
+
+def test_connecting_rebuilds_the_index():
+    device = FakeMovesense("00:00:00:00:00:01")
+    index = attribute_index(device)
+    assert get_movesense_firmware_version(device) == 8
+
+    # the same collection object, changed in place while disconnected
+    device.services[:] = [activity_service(7)]
+    assert asyncio.run(MovesenseClient(device).connect())
+    assert get_movesense_firmware_version(device) == 7
+    assert index.builds == 2
+
+
+def test_index_of_unconnected_client_is_empty():
+    device = bleak.BleakClient("00:00:00:00:00:01")
+    index = attribute_index(device)
+
+    assert index.all_services() == []
+    assert index.resolve(MovesenseV8.CONFIG_UUID_128) == MovesenseV8.CONFIG_UUID_128
+    assert get_movesense_firmware_version(device) is None
@@ -0,0 +1,67 @@
+import os
+
+from src.common.exporters import get_exporter
+from src.movesense.batch_convert import (
+    convert_all,
+    find_sbem_files,
+    is_up_to_date,
+    main,
+    summarize,
+)
+from src.movesense.sbem_parser import sbem_output_files
+from tests.synthetic import sbem_bytes
+
+
+def make_recordings(directory, count: int = 3) -> list[str]:
+    (directory / "nested").mkdir()
+    filenames = []
+    for i in range(count):
+        filename = directory / ("nested" if i == 0 else ".") / f"rec{i}.bin"
+        filename.write_bytes(sbem_bytes(2 + i))
+        filenames.append(os.path.normpath(str(filename)))
+    (directory / "notes.txt").write_text("not a recording")
+    return sorted(filenames)
+
+
+def test_find_sbem_files_accepts_directories_and_globs(tmp_path):
+    filenames = make_recordings(tmp_path)
+
+    assert find_sbem_files([str(tmp_path)]) == filenames
+    assert find_sbem_files([str(tmp_path / "rec*.bin")]) == filenames[1:]
+
+
+def test_convert_all_collects_errors_and_skips_converted(tmp_path):
+    filenames = make_recordings(tmp_path)
+    broken = tmp_path / "broken.bin"
+    broken.write_bytes(b"garbage")
+    reports = []
+
+    results = convert_all(
+        filenames + [str(broken)], "npz", workers=2, report=reports.append
+    )
+
+    assert len(reports) == 4
+    failed = [r for r in results if r.error is not None]
+    assert [r.filename for r in failed] == [str(broken)]
+    assert all(is_up_to_date(f, "npz") for f in filenames)
+    for result in results:
+        if result.error is None:
+            outputs = [
+                get_exporter("npz").read(filename)
+                for filename in sbem_output_files(result.filename, "npz")
+            ]
+            assert result.samples == sum(len(o["timestamp"]) for o in outputs) > 0
+
+    rerun = convert_all(filenames, "npz", workers=2, report=reports.append)
+    assert all(result.skipped for result in rerun)
+    assert "0 converted, 3 skipped, 0 failed" in summarize(rerun, 1.0)
+
+
+def test_main_returns_error_code_on_failures(tmp_path, capsys):
+    make_recordings(tmp_path)
+    (tmp_path / "broken.bin").write_bytes(b"garbage")
+
+    assert main([str(tmp_path), "--format", "npz", "--workers", "2"]) == 1
+    output = capsys.readouterr().out
+    assert "3 converted, 0 skipped, 1 failed" in output
+    assert "MB/s" in output and "samples/s" in output
@@ -0,0 +1,148 @@
+import asyncio
+
+import numpy as np
+
+from src.bluetooth.collector import BluetoothDataCollector
+from src.common.exporters import get_exporter
+from src.movesense.protocol import (
+    HR_FRAME_SIZE,
+    decode_heart_rate_frames,
+    heart_rate_frame,
+    hr_header_string,
+)
+from tests.fake_device import NotifyingDevice, ecg_collector
+from tests.synthetic import ecg_packets, hr_notification, hr_notifications
+
+
+def read_csv(filename):
+    return get_exporter("csv").read(filename)
+
+
+def test_collector_appends_to_file_while_running(tmp_path):
+    device = NotifyingDevice()
+    collector = ecg_collector(device, tmp_path, [], flush_packets=10)
+    packets = ecg_packets(25)
+
+    async def run():
+        await collector.start()
+        for packet in packets[:20]:
+            device.notify("ecg", packet)
+        await asyncio.sleep(0.01)
+        written = read_csv(collector.sink.filename)["timestamp"]
+
+        for packet in packets[20:]:
+            device.notify("ecg", packet)
+        return written, await collector.finish()
+
+    written, filename = asyncio.run(run())
+
+    assert len(written) == 20 * 16
+    timestamps = read_csv(filename)["timestamp"]
+    assert timestamps.tolist() == list(range(0, 25 * 32, 2))
+    assert collector.received == 25 and collector.dropped == 0
+
+
+def test_collector_allocates_buffer_on_start(tmp_path):
+    device = NotifyingDevice()
+    collector = ecg_collector(device, tmp_path, [], capacity=64)
+    assert collector.packets is None
+    assert collector.received == 0 and collector.dropped == 0
+
+    async def run():
+        await collector.start()
+        capacity = collector.packets.capacity
+        await collector.finish()
+        return capacity
+
+    assert asyncio.run(run()) == 64
+
+
+def test_collector_flushes_on_interval(tmp_path):
+    device = NotifyingDevice()
+    collector = ecg_collector(device, tmp_path, [], flush_interval=10)
+
+    async def run():
+        await collector.start()
+        for packet in ecg_packets(3):
+            device.notify("ecg", packet)
+        await asyncio.sleep(0.05)
+        written = read_csv(collector.sink.filename)["timestamp"]
+        await collector.finish()
+        return written
+
+    assert len(asyncio.run(run())) == 3 * 16
+
+
+def test_finish_writes_a_single_packet(tmp_path):
+    device = NotifyingDevice()
+    collector = ecg_collector(device, tmp_path, [], expected_interval=4)
+
+    async def run():
+        await collector.start()
+        device.notify("ecg", ecg_packets(1, interval=4)[0])
+        return await collector.finish()
+
+    timestamps = read_csv(asyncio.run(run()))["timestamp"]
+
+    assert timestamps.tolist() == list(range(0, 16 * 4, 4))
+    assert collector.interval == 4
+
+
+def test_sudden_disconnect_closes_sink(tmp_path):
+    device = NotifyingDevice()
+    calls_on_disconnect = []
+    collector = ecg_collector(device, tmp_path, calls_on_disconnect)
+
+    async def run():
+        await collector.start()
+        for packet in ecg_packets(5):
+            device.notify("ecg", packet)
+        # what main_async does on a disconnect
+        for f in calls_on_disconnect:
+            f()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    files = list(tmp_path.glob("ecg_*.csv"))
+    assert len(files) == 1
+    assert len(read_csv(str(files[0]))["timestamp"]) == 5 * 16
+    assert collector.sink is None
+
+
+def test_heart_rate_collector_writes_rr_intervals(tmp_path):
+    device = NotifyingDevice()
+    collector = BluetoothDataCollector(
+        device=device,
+        char_uuid="hr",
+        deserializer=decode_heart_rate_frames,
+        header=hr_header_string,
+        calls_on_disconnect=[],
+        packet_size=HR_FRAME_SIZE,
+        name="hr",
+        subfolder=str(tmp_path),
+        packet_transform=heart_rate_frame,
+        regular=False,
+    )
+
+    async def run():
+        await collector.start()
+        # a single notification is written, no interval has to be inferred
+        device.notify("hr", hr_notification(60, [1024]))
+        await collector.flush()
+        written = len(read_csv(collector.sink.filename)["rr"])
+        for notification in hr_notifications(9):
+            device.notify("hr", notification)
+        device.notify("hr", bytes(30))
+        return written, await collector.finish()
+
+    written, filename = asyncio.run(run())
+
+    columns = read_csv(filename)
+    assert written == 1
+    assert columns["rr"][0] == 1000
+    assert np.all(columns["bpm"] > 0)
+    assert collector.received == 11
+    assert collector.dropped == 1
+    # only the decoded notifications count as arrivals
+    assert collector.stats.packets == 10
@@ -0,0 +1,30 @@
+from src.movesense.data_chunk import DataChunk, add_interval_if_known, chunks_to_arrays
+
+
+def test_chunks_to_arrays_matches_data_entries():
+    chunks = [
+        DataChunk(timestamp=100, values=[1, 2, 3], interval=2),
+        DataChunk(timestamp=106, values=[4, 5], interval=2),
+    ]
+    timestamps, values = chunks_to_arrays(chunks)
+
+    entries = [entry for chunk in chunks for entry in chunk.to_data_entries()]
+    assert timestamps.tolist() == [entry.timestamp for entry in entries]
+    assert values.tolist() == [entry.value for entry in entries]
+
+
+def test_data_chunk_is_array_backed_without_instance_dict():
+    chunk = DataChunk(timestamp=10, values=[1, 2, 3])
+
+    assert not hasattr(chunk, "__dict__")
+    assert chunk.values.tolist() == [1, 2, 3]
+    chunk.set_interval(4)
+    assert chunk.timestamps().tolist() == [10, 14, 18]
+    assert chunk.to_csv_chunk() == "\n10, 1\n14, 2\n18, 3"
+
+
+def test_add_interval_if_known_sets_interval_of_all_chunks():
+    chunks = add_interval_if_known(
+        [DataChunk(0, [1, 2]), DataChunk(8, [3, 4]), DataChunk(16, [5, 6])]
+    )
+    assert [c.interval for c in chunks] == [4, 4, 4]
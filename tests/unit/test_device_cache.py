@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from src.bluetooth import device_cache
+from src.bluetooth.device_cache import DeviceCache, resolve_addresses
+from src.common.definitions import ACTIVITY_SVC_UUID_128, MovesenseV8
+from src.movesense.client import get_movesense_firmware_version
+from tests.fake_device import FakeMovesense
+
+
+class FakeScanner:
+    # advertises the given devices as soon as the scan starts
+    devices = []
+    started = 0
+
+    def __init__(self, detection_callback):
+        self.callback = detection_callback
+        self.discovered_devices_and_advertisement_data = {}
+
+    async def start(self):
+        FakeScanner.started += 1
+        for device in self.devices:
+            advertisement = SimpleNamespace(rssi=-60)
+            self.discovered_devices_and_advertisement_data[device.address] = (
+                device,
+                advertisement,
+            )
+            self.callback(device, advertisement)
+
+    async def stop(self):
+        pass
+
+
+def advertised(*names):
+    return [
+        SimpleNamespace(address=f"00:00:00:00:00:0{i}", name=name)
+        for i, name in enumerate(names)
+    ]
+
+
+def test_cache_persists_devices_with_their_services(tmp_path):
+    filename = str(tmp_path / "devices.json")
+    cache = DeviceCache(filename)
+    for address in ["00:00:00:00:00:01", "AA:00:00:00:00:02"]:
+        device = FakeMovesense(address)
+        cache.remember(device, get_movesense_firmware_version(device))
+    cache.save()
+
+    loaded = DeviceCache.load(filename)
+    assert [d.address for d in loaded.known()] == [
+        "AA:00:00:00:00:02",
+        "00:00:00:00:00:01",
+    ]
+    cached = loaded.find("aa:00:00:00:00:02")
+    assert cached is loaded.find("Movesense 00:02")
+    assert cached.firmware == 8
+    assert MovesenseV8.CONFIG_UUID_128 in cached.services[ACTIVITY_SVC_UUID_128]
+
+
+def test_broken_cache_is_ignored(tmp_path):
+    filename = tmp_path / "devices.json"
+    filename.write_text("{not json")
+    assert DeviceCache.load(str(filename)).known() == []
+    filename.write_text(json.dumps({"devices": [{"unknown": 1}]}))
+    assert DeviceCache.load(str(filename)).known() == []
+
+
+def test_scan_stops_once_all_targets_were_seen(monkeypatch):
+    monkeypatch.setattr(device_cache.bleak, "BleakScanner", FakeScanner)
+    monkeypatch.setattr(FakeScanner, "devices", advertised("Movesense 1", "Other"))
+
+    start = time.perf_counter()
+    discovered = asyncio.run(device_cache.scan(5, ["movesense 1", "00:00:00:00:00:01"]))
+
+    assert time.perf_counter() - start < 1
+    assert len(discovered) == 2
+
+
+def test_known_devices_are_resolved_without_scanning(tmp_path, monkeypatch):
+    monkeypatch.setattr(device_cache.bleak, "BleakScanner", FakeScanner)
+    monkeypatch.setattr(
+        FakeScanner, "devices", advertised("Movesense 1", "Movesense 2")
+    )
+    monkeypatch.setattr(FakeScanner, "started", 0)
+    cache = DeviceCache(str(tmp_path / "devices.json"))
+    cache.remember(FakeMovesense("AA:BB:CC:DD:EE:FF"))
+
+    addresses, missing = asyncio.run(
+        resolve_addresses(["Movesense EE:FF", "11:22:33:44:55:66"], cache)
+    )
+    assert addresses == ["AA:BB:CC:DD:EE:FF", "11:22:33:44:55:66"]
+    assert missing == [] and FakeScanner.started == 0
+
+    # unknown names are scanned for
+    addresses, missing = asyncio.run(
+        resolve_addresses(["Movesense 2", "Movesense 3"], cache, scan_duration=0.1)
+    )
+    assert addresses == ["00:00:00:00:00:01"]
+    assert missing == ["Movesense 3"] and FakeScanner.started == 1
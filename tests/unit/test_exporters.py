@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.common.exporters import exporters, get_exporter, to_columns
+
+imu_header = "timestamp, acc_x, acc_y, acc_z, gyr_x, gyr_y, gyr_z, mag_x, mag_y, mag_z"
+
+
+def test_to_columns_splits_multi_channel_values():
+    timestamps = np.array([0, 10])
+    values = np.arange(18, dtype=np.int16).reshape(2, 9)
+    columns = to_columns(imu_header, timestamps, values)
+
+    assert list(columns) == imu_header.split(", ")
+    assert columns["gyr_x"].tolist() == [3, 12]
+
+
+def test_to_columns_rejects_mismatching_header():
+    with pytest.raises(Exception):
+        to_columns("timestamp, value", np.array([0, 1]), np.zeros((2, 9)))
+
+
+@pytest.mark.parametrize("export_format", ["csv", "npz", "parquet"])
+def test_exporters_round_trip(tmp_path, export_format):
+    if export_format == "parquet":
+        pytest.importorskip("pyarrow")
+    exporter = get_exporter(export_format)
+    timestamps = np.arange(0, 100, 2, dtype=np.int64)
+    values = np.arange(-25, 25, dtype=np.int16)
+
+    filename = exporter.write(
+        str(tmp_path / "out" / "ecg"), "timestamp, value", timestamps, values
+    )
+    columns = exporter.read(filename)
+
+    assert filename.endswith(f"ecg.{export_format}")
+    assert columns["timestamp"].tolist() == timestamps.tolist()
+    assert columns["value"].tolist() == values.tolist()
+
+
+@pytest.mark.parametrize("export_format", ["csv", "npz"])
+def test_exporters_read_files_without_data(tmp_path, export_format):
+    exporter = get_exporter(export_format)
+    writer = exporter.open(str(tmp_path / "imu"), imu_header)
+    writer.close()
+
+    columns = exporter.read(writer.filename)
+
+    assert list(columns) == imu_header.split(", ")
+    assert all(column.dtype == np.int64 for column in columns.values())
+    assert all(len(column) == 0 for column in columns.values())
+
+
+def test_npz_keeps_column_types(tmp_path):
+    columns = exporters["npz"].read(
+        exporters["npz"].write(
+            str(tmp_path / "ecg"),
+            "timestamp, value",
+            np.array([0, 2], dtype=np.int64),
+            np.array([1, 2], dtype=np.int16),
+        )
+    )
+    assert columns["timestamp"].dtype == np.int64
+    assert columns["value"].dtype == np.int16
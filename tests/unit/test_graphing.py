@@ -0,0 +1,83 @@
+import asyncio
+
+import numpy as np
+
+from src.common.definitions import MovesenseV8
+from src.graphing import CircularBuffer, LiveViewer, decimate
+from src.movesense.protocol import ecg_header_string
+from tests.fake_device import SimulatedMovesense, ecg_collector
+
+
+def test_circular_buffer_keeps_the_latest_samples_in_order():
+    buffer = CircularBuffer(10, channels=2)
+    for start in range(0, 25, 5):
+        timestamps = np.arange(start, start + 5)
+        buffer.extend(timestamps, np.stack([timestamps, -timestamps], axis=1))
+
+    positions = buffer.positions()
+    assert buffer.timestamps[positions].tolist() == list(range(15, 25))
+    assert buffer.values[positions, 1].tolist() == list(range(-15, -25, -1))
+    assert len(buffer.positions(4)) == 4
+
+    buffer.extend(np.arange(100, 130), np.zeros(30))
+    assert buffer.timestamps[buffer.positions()].tolist() == list(range(120, 130))
+
+
+def test_decimation_keeps_peaks():
+    timestamps = np.arange(10000)
+    values = np.zeros(10000)
+    values[5003] = 1500
+
+    decimated_timestamps, decimated = decimate(timestamps, values, 100)
+
+    assert len(decimated) == len(decimated_timestamps) == 200
+    assert decimated.max() == 1500
+
+
+def test_decimation_keeps_the_newest_samples():
+    # not a multiple of the width, with the peak in the last few samples
+    timestamps = np.arange(10050)
+    values = np.zeros(10050)
+    values[-3] = -900
+
+    decimated_timestamps, decimated = decimate(timestamps, values, 100)
+
+    assert len(decimated) == len(decimated_timestamps) == 200
+    assert decimated.min() == -900
+    assert decimated_timestamps[0] == 0 and decimated_timestamps[-1] > 9900
+
+
+def test_viewer_sizes_the_window_from_the_first_batch():
+    viewer = LiveViewer(window_seconds=2, headless=True)
+    listener = viewer.add_stream("imu", "timestamp, x, y", interval=None)
+    assert "imu" not in viewer.buffers
+
+    listener(np.arange(0, 80, 10), np.zeros((8, 2)))
+
+    assert viewer.buffers["imu"].capacity == 200
+
+
+def test_headless_viewer_draws_collector_batches(tmp_path):
+    device = SimulatedMovesense("00:00:00:00:00:01", speed=10)
+    collector = ecg_collector(device, tmp_path, [], flush_interval=20)
+    collector.char_uuid = MovesenseV8.ECG_VOLTAGE_UUID_128
+    viewer = LiveViewer(window_seconds=2, fps=50, width=100, headless=True)
+    collector.listeners.append(viewer.add_stream("ecg", ecg_header_string, 2))
+
+    async def run():
+        viewer.start()
+        await collector.start()
+        # more than the 2 s window, 32 ms per packet
+        while collector.received < 70:
+            await asyncio.sleep(0.005)
+        await collector.finish()
+        await viewer.stop()
+        viewer.render()
+
+    asyncio.run(run())
+
+    timestamps, values = viewer.renderer.traces["ecg/ecg_voltage"]
+    # 2 s of 2 ms ECG in the window, drawn as min and max of 100 columns
+    assert viewer.buffers["ecg"].count == 1000
+    assert len(values) == 200 and np.all(np.diff(timestamps) >= 0)
+    assert viewer.renderer.frames > 1
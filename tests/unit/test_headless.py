@@ -0,0 +1,158 @@
+import asyncio
+import json
+
+import bleak
+import pytest
+
+from src.bluetooth.device_cache import DeviceCache
+from src.cli import headless
+from src.cli.headless import main, parse_args, run_recording
+from src.common.definitions import MovesenseV7
+from src.movesense.session import RecordingSession
+from tests.fake_device import SimulatedMovesense
+from tests.synthetic import sbem_bytes
+
+
+def events(capsys) -> list[dict]:
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_record_reports_progress_as_json_lines(tmp_path, capsys):
+    devices = [
+        SimulatedMovesense("00:00:00:00:00:01", speed=10),
+        SimulatedMovesense("00:00:00:00:00:02", version=7, speed=10),
+    ]
+    session = RecordingSession(
+        devices,
+        streams=("ecg", "imu"),
+        subfolder=str(tmp_path),
+        intervals={"ecg": 4, "imu": 20},
+    )
+
+    code = asyncio.run(run_recording(session, duration=0.3, status_interval=0.1))
+
+    output = events(capsys)
+    assert code == 0
+    assert [e["event"] for e in output][0] == "started"
+    assert output[-1]["event"] == "stopped"
+    assert sum(e["event"] == "progress" for e in output) >= 2
+    # both firmware versions got the requested intervals
+    assert devices[0].config[0] == 4 and devices[0].config[1] == 20
+    assert devices[1].intervals[MovesenseV7.ECG_INTERVAL_UUID_128] == 4
+    for device in output[-1]["devices"].values():
+        assert device["error"] is None
+        assert device["streams"]["ecg"]["samples"] > 0
+    with open(output[-1]["manifest"]) as file:
+        assert len(json.load(file)["devices"]) == 2
+
+
+def test_record_stops_early_on_request(tmp_path, capsys):
+    session = RecordingSession(
+        [SimulatedMovesense("00:00:00:00:00:01", speed=10)],
+        streams=("ecg",),
+        subfolder=str(tmp_path),
+    )
+
+    cache = DeviceCache(str(tmp_path / "devices.json"))
+
+    async def run():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.1, stop.set)
+        return await run_recording(
+            session, None, status_interval=10, stop=stop, cache=cache
+        )
+
+    assert asyncio.run(run()) == 0
+    assert session.elapsed() < 5
+    output = events(capsys)
+    assert output[0]["setup_seconds"] >= 0
+    assert output[-1]["event"] == "stopped"
+    # the next run connects to the device directly
+    assert DeviceCache.load(cache.filename).find("00:00:00:00:00:01").firmware == 8
+
+
+def test_record_keeps_recording_when_one_device_fails_to_start(tmp_path, capsys):
+    devices = [SimulatedMovesense(f"00:00:00:00:00:0{i}", speed=10) for i in (1, 2)]
+    session = RecordingSession(
+        devices, streams=("ecg", "imu"), export_format="npz", subfolder=str(tmp_path)
+    )
+
+    async def unavailable(*_):
+        raise Exception("notifications not available")
+
+    devices[1].start_notify = unavailable
+
+    assert asyncio.run(run_recording(session, duration=0.3)) == 1
+
+    output = events(capsys)
+    errors = [e for e in output if e["event"] == "error"]
+    assert [e["device"] for e in errors] == [session.devices[1].name]
+    assert "notifications not available" in errors[0]["error"]
+    assert output[-1]["event"] == "stopped"
+    streams = output[-1]["devices"][session.devices[0].name]["streams"]
+    assert all(stream["packets"] > 0 for stream in streams.values())
+    # the failed device's files are closed as well
+    assert len(list(tmp_path.glob("session_*/*/*.npz"))) == 4
+    assert not any(device.is_connected for device in devices)
+
+
+def test_record_closes_all_files_when_starting_fails(tmp_path, capsys):
+    devices = [SimulatedMovesense(f"00:00:00:00:00:0{i}", speed=10) for i in (1, 2)]
+    session = RecordingSession(
+        devices, streams=("ecg", "imu"), export_format="npz", subfolder=str(tmp_path)
+    )
+    start = session.start
+
+    async def interrupted_start():
+        await start()
+        raise Exception("interrupted")
+
+    session.start = interrupted_start
+
+    with pytest.raises(Exception, match="interrupted"):
+        asyncio.run(run_recording(session, duration=10))
+
+    # npz files are only written when they are closed
+    assert len(list(tmp_path.glob("session_*/*/*.npz"))) == 4
+    assert all(
+        collector.sink is None
+        for d in session.devices
+        for collector in d.collectors.values()
+    )
+    assert not any(device.is_connected for device in devices)
+
+
+def test_convert_reports_every_file(tmp_path, capsys):
+    for i in range(2):
+        (tmp_path / f"recording{i}.bin").write_bytes(sbem_bytes(1))
+
+    code = main(["convert", str(tmp_path), "--format", "npz", "--workers", "1"])
+
+    output = events(capsys)
+    assert code == 0
+    assert [e["event"] for e in output] == ["converted", "converted", "done"]
+    assert output[-1]["converted"] == 2
+    assert all(e["samples"] > 0 for e in output[:2])
+
+
+@pytest.mark.parametrize(
+    "error", [bleak.exc.BleakError("adapter off"), FileNotFoundError("no adapter")]
+)
+def test_bluetooth_errors_are_reported_as_events(monkeypatch, capsys, error):
+    async def unavailable(*_):
+        raise error
+
+    monkeypatch.setattr(headless.device_cache, "scan", unavailable)
+
+    code = main(["scan", "--timeout", "0.1"])
+
+    output = events(capsys)
+    assert code == 1
+    assert [(e["event"], e["error"]) for e in output] == [("error", str(error))]
+
+
+def test_record_needs_a_stream():
+    with pytest.raises(SystemExit):
+        parse_args(["record", "--device", "00:00:00:00:00:01"])
+    args = parse_args(["record", "--device", "A", "--device", "B", "--ecg", "2"])
+    assert args.device == ["A", "B"] and args.imu is None and args.duration is None
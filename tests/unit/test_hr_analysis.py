@@ -0,0 +1,79 @@
+import numpy as np
+
+from src.hr_analysis import (
+    HrvAnalyzer,
+    analyze_sbem,
+    analyze_sbem_parallel,
+    main,
+    rows_to_table,
+)
+from tests.synthetic import write_sbem_file
+
+
+def ecg_with_beats(beats_ms: np.ndarray, length_ms: int, interval: int = 2, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(0, length_ms, interval)
+    values = 150 * np.sin(2 * np.pi * 0.2 * timestamps / 1000)
+    values += rng.normal(0, 20, len(timestamps))
+    for beat in beats_ms:
+        values += 1500 * np.exp(-(((timestamps - beat) / 10.0) ** 2))
+    return timestamps, values.astype(np.int16)
+
+
+def feed(analyzer: HrvAnalyzer, timestamps, values, batch: int):
+    for i in range(0, len(timestamps), batch):
+        analyzer.add(timestamps[i : i + batch], values[i : i + batch])
+    analyzer.finish()
+    return analyzer.rows
+
+
+def test_alternating_rr_intervals():
+    # 800 and 1000 ms alternating: 66.7 bpm, RMSSD 200 ms, SDNN 100 ms
+    beats = np.cumsum(np.tile([800, 1000], 50))
+    timestamps, values = ecg_with_beats(beats, int(beats[-1]) + 500)
+
+    rows = feed(HrvAnalyzer(30, 10), timestamps, values, 256)
+
+    _, table = rows_to_table(rows)
+    # 90 s of data, windows end every 10 s from 30 s on
+    assert len(rows) == 7
+    assert np.allclose(table[:, 1], 60000 / 900, atol=1)
+    assert np.allclose(table[:, 2], 200, atol=10)
+    assert np.allclose(table[:, 3], 100, atol=10)
+
+
+def test_results_do_not_depend_on_batch_size():
+    beats = np.cumsum(np.random.default_rng(1).integers(700, 1100, 150))
+    timestamps, values = ecg_with_beats(beats, int(beats[-1]))
+
+    small = HrvAnalyzer(20, 5)
+    rows = feed(small, timestamps, values, 50)
+
+    assert rows == feed(HrvAnalyzer(20, 5), timestamps, values, 10000)
+    # only the beats of the current window are kept
+    assert len(small.peaks) <= 20 * 1000 / 700 + 1
+
+
+def test_parallel_analysis_matches_single_pass(tmp_path):
+    filename = str(tmp_path / "recording.bin")
+    write_sbem_file(filename, 1 << 20)
+
+    rows = analyze_sbem(filename)
+    parallel = analyze_sbem_parallel(filename, workers=2, segment_seconds=60)
+
+    assert len(rows) > 10
+    assert [row[0] for row in parallel] == [row[0] for row in rows]
+    assert np.allclose(
+        rows_to_table(parallel)[1], rows_to_table(rows)[1], equal_nan=True
+    )
+    assert np.allclose(rows_to_table(rows)[1][:, 1], 60, atol=1)
+
+
+def test_main_writes_window_table(tmp_path, capsys):
+    filename = tmp_path / "recording.bin"
+    write_sbem_file(str(filename), 1 << 19)
+
+    main([str(filename), "--format", "npz", "--window", "20"])
+
+    assert "windows, median 60 bpm" in capsys.readouterr().out
+    assert (tmp_path / "recording.hrv.npz").exists()
@@ -0,0 +1,160 @@
+import numpy as np
+import pytest
+
+from src.movesense.protocol import (
+    HR_FRAME_SIZE,
+    HR_MAX_PAYLOAD,
+    decode_ecg7_packets,
+    decode_ecg8_packets,
+    decode_heart_rate_frames,
+    decode_imu7_packets,
+    decode_imu8_packets,
+    deserialize_ecg7_packet,
+    deserialize_ecg8_packet,
+    deserialize_ecg8_packets,
+    deserialize_imu7_packet,
+    deserialize_imu8_packets,
+    heart_rate_frame,
+)
+from tests.synthetic import (
+    ecg_packets,
+    hr_notification,
+    imu_packets,
+    parse_hr_notification,
+)
+
+
+def test_decode_ecg8_packets_matches_per_packet_decoder():
+    packets = ecg_packets(50, timestamp_size=8)
+    timestamps, values = decode_ecg8_packets(packets)
+
+    assert timestamps.dtype == np.int64
+    assert values.dtype == np.int16
+    assert values.shape == (50, 16)
+    for i, packet in enumerate(packets):
+        chunk = deserialize_ecg8_packet(packet)
+        assert timestamps[i] == chunk.timestamp
+        assert values[i].tolist() == chunk.values.tolist()
+
+
+def test_decode_ecg7_packets_from_contiguous_buffer():
+    packets = ecg_packets(10, timestamp_size=4, start=1234)
+    timestamps, values = decode_ecg7_packets(b"".join(packets))
+
+    assert timestamps.tolist() == [
+        deserialize_ecg7_packet(p).timestamp for p in packets
+    ]
+    assert values[3].tolist() == deserialize_ecg7_packet(packets[3]).values.tolist()
+
+
+def test_decode_ecg_packets_skips_truncated_packets():
+    packets = ecg_packets(3)
+    timestamps, _ = decode_ecg8_packets(packets + [packets[0][:10]])
+    assert len(timestamps) == 3
+
+
+def test_decode_ecg_packets_rejects_misaligned_buffer():
+    with pytest.raises(Exception):
+        decode_ecg8_packets(b"".join(ecg_packets(2)) + b"\x00")
+
+
+def test_deserialize_ecg8_packets_returns_data_chunks():
+    packets = ecg_packets(4)
+    chunks = deserialize_ecg8_packets(packets)
+    assert [c.values.tolist() for c in chunks] == [
+        deserialize_ecg8_packet(p).values.tolist() for p in packets
+    ]
+
+
+def test_decode_imu8_packets_decodes_full_int16_fields():
+    packet = bytearray(8 + 8 * 18)
+    packet[:8] = (5_000_000).to_bytes(8, "little")
+    for channel in range(9):
+        value = -1000 * (channel + 1)
+        offset = 8 + 2 * channel
+        packet[offset : offset + 2] = value.to_bytes(2, "little", signed=True)
+
+    timestamps, values = decode_imu8_packets([bytes(packet)])
+
+    assert timestamps.tolist() == [5000]
+    assert values.shape == (8, 9)
+    assert values[0].tolist() == [-1000 * (c + 1) for c in range(9)]
+    assert values[1:].tolist() == [[0] * 9] * 7
+
+
+def test_decode_imu7_packets_matches_per_packet_decoder():
+    packets = imu_packets(20, timestamp_size=4)
+    timestamps, values = decode_imu7_packets(packets)
+
+    assert values.shape == (20 * 8, 9)
+    for i, packet in enumerate(packets):
+        chunk = deserialize_imu7_packet(packet)
+        assert timestamps[i] == chunk.timestamp
+        assert values[8 * i : 8 * i + 8].tolist() == chunk.values.tolist()
+
+
+def test_imu_chunks_are_formatted_only_on_export():
+    chunks = deserialize_imu8_packets(imu_packets(2))
+    chunks[0].set_interval(10)
+
+    row = chunks[0].values[0].tolist()
+    assert chunks[0].values.shape == (8, 9)
+    first_line = chunks[0].to_csv_chunk().splitlines()[1]
+    assert first_line == "0, " + ", ".join(str(v) for v in row)
+
+
+def decode_notifications(notifications: list[bytes]) -> list[list[int]]:
+    frames = [heart_rate_frame(notification) for notification in notifications]
+    return decode_heart_rate_frames(b"".join(frames))[1].tolist()
+
+
+def test_decode_heart_rate_frames_reads_all_flag_variants():
+    assert decode_notifications([hr_notification(72, [])]) == [[72, 0]]
+    assert decode_notifications([hr_notification(300, [1024], wide=True)]) == [
+        [300, 1000]
+    ]
+    # energy expended sits between BPM and the RR intervals
+    assert decode_notifications(
+        [hr_notification(60, [1024, 768], wide=True, energy=500)]
+    ) == [[60, 1000], [60, 750]]
+
+
+def test_heart_rate_frame_rejects_oversized_notifications():
+    assert len(heart_rate_frame(hr_notification(60, [1024]))) == HR_FRAME_SIZE
+    assert heart_rate_frame(bytes(HR_MAX_PAYLOAD + 1)) == b""
+
+
+def random_hr_notification(rng: np.random.Generator) -> bytes:
+    wide, energy = bool(rng.integers(2)), bool(rng.integers(2))
+    # as many RR intervals as still fit into the payload
+    room = (HR_MAX_PAYLOAD - 2 - wide - 2 * energy) // 2
+    return hr_notification(
+        int(rng.integers(1 << (16 if wide else 8))),
+        rng.integers(1 << 16, size=int(rng.integers(room + 1))).tolist(),
+        wide=wide,
+        energy=int(rng.integers(1 << 16)) if energy else None,
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_decode_heart_rate_frames_matches_reference_parser(seed):
+    rng = np.random.default_rng(seed)
+    notifications = [random_hr_notification(rng) for _ in range(200)]
+    frames = [heart_rate_frame(notification) for notification in notifications]
+    timestamps, values = decode_heart_rate_frames(b"".join(frames))
+
+    expected = []
+    for notification in notifications:
+        bpm, rr = parse_hr_notification(notification)
+        expected += [[bpm, r] for r in rr] or [[bpm, 0]]
+    assert values.tolist() == expected
+    assert len(timestamps) == len(expected)
+
+
+def test_decode_heart_rate_frames_times_beats_back_from_arrival():
+    frame = heart_rate_frame(hr_notification(60, [1024, 512]))
+    arrival = int.from_bytes(frame[:8], "little")
+    timestamps, values = decode_heart_rate_frames([frame])
+    # the last beat arrives with the notification, the one before 500 ms earlier
+    assert timestamps.tolist() == [arrival - 500, arrival]
+    assert values.tolist() == [[60, 1000], [60, 500]]
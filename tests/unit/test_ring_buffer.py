@@ -0,0 +1,52 @@
+import pytest
+
+from src.bluetooth.ring_buffer import DROP_OLDEST, SPILL, PacketRingBuffer
+
+
+def packet(i: int) -> bytes:
+    return bytes([i] * 4)
+
+
+def test_ring_buffer_keeps_packets_in_order():
+    buffer = PacketRingBuffer(packet_size=4, capacity=8)
+    for i in range(5):
+        buffer.append(packet(i))
+
+    assert len(buffer) == 5
+    assert buffer.read_all() == b"".join(packet(i) for i in range(5))
+
+
+def test_ring_buffer_drop_oldest_overwrites_and_counts():
+    buffer = PacketRingBuffer(packet_size=4, capacity=3, overflow=DROP_OLDEST)
+    for i in range(7):
+        buffer.append(packet(i))
+
+    assert buffer.received == 7
+    assert buffer.dropped == 4
+    assert buffer.read_all() == packet(4) + packet(5) + packet(6)
+
+
+def test_ring_buffer_spills_to_disk_without_loss():
+    buffer = PacketRingBuffer(packet_size=4, capacity=3, overflow=SPILL)
+    for i in range(10):
+        buffer.append(packet(i))
+
+    assert buffer.dropped == 0
+    assert buffer.spilled == 9
+    assert len(buffer) == 10
+    assert buffer.read_all() == b"".join(packet(i) for i in range(10))
+    buffer.close()
+
+
+def test_ring_buffer_rejects_packets_of_other_size():
+    buffer = PacketRingBuffer(packet_size=4, capacity=3)
+    buffer.append(b"\x00" * 5)
+
+    assert buffer.received == 1
+    assert buffer.malformed == 1
+    assert len(buffer) == 0
+
+
+def test_ring_buffer_rejects_unknown_policy():
+    with pytest.raises(Exception):
+        PacketRingBuffer(packet_size=4, capacity=3, overflow="ignore")
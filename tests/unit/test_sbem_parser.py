@@ -0,0 +1,218 @@
+import io
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from src.common.exporters import NpzExporter, get_exporter
+from src.movesense import sbem_parser
+from src.movesense.sbem_parser import (
+    SBEM_HEADER,
+    SbemFile,
+    ecg_chunk,
+    imu_chunk,
+    index_sbem,
+    iter_sbem_batches,
+    iter_sbem_chunks,
+    parse_chunks,
+    parse_sbem,
+    parse_sbem_file,
+)
+from tests.synthetic import sbem_bytes
+
+
+def test_index_sbem_lists_every_chunk():
+    file = SBEM_HEADER + bytes([104, 3, 1, 2, 3, 7, 0, 105, 1, 9])
+    index = index_sbem(file)
+
+    assert index.tolist() == [(104, 10, 3), (7, 15, 0), (105, 17, 1)]
+
+
+def test_parse_sbem_keeps_truncated_last_chunk():
+    file = SBEM_HEADER + bytes([104, 2, 1, 2, 105, 5, 9])
+    chunks = parse_sbem(file)
+
+    assert [(c.id, c.len, bytes(c.content)) for c in chunks] == [
+        (104, 2, b"\x01\x02"),
+        (105, 5, b"\x09"),
+    ]
+
+
+def test_iter_sbem_chunks_matches_parse_sbem_across_block_borders():
+    file = sbem_bytes(5)
+    expected = [(c.id, c.len, bytes(c.content)) for c in parse_sbem(file)]
+
+    for read_size in [1, 7, 100, 1 << 20]:
+        streamed = iter_sbem_chunks(io.BytesIO(file), read_size=read_size)
+        assert [(c.id, c.len, c.content) for c in streamed] == expected
+
+
+def test_parse_sbem_file_writes_csv_files(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(sbem_bytes(1))
+
+    parse_sbem_file(str(filename))
+
+    ecg_lines = (tmp_path / "recording.ecg.csv").read_text().splitlines()
+    imu_lines = (tmp_path / "recording.imu.csv").read_text().splitlines()
+    assert ecg_lines[0] == "timestamp, value"
+    assert len(ecg_lines) == 1 + 496
+    assert ecg_lines[2].startswith("2, ")
+    assert len(imu_lines) == 1 + 96
+    assert len(imu_lines[1].split(", ")) == 10
+
+
+def test_sbem_file_reads_time_range(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(sbem_bytes(10, start=5000))
+
+    with SbemFile(str(filename)) as recording:
+        assert recording.start_time == 5000
+        assert recording.stream_index(ecg_chunk).interval == 2
+
+        timestamps, values = recording.read(ecg_chunk, 2000, 3000)
+        all_timestamps, all_values = recording.read(ecg_chunk)
+
+    assert timestamps.tolist() == list(range(7000, 8000, 2))
+    first = all_timestamps.tolist().index(7000)
+    assert values.tolist() == all_values[first : first + 500].tolist()
+
+
+def test_sbem_file_reads_imu_rows(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(sbem_bytes(2))
+
+    with SbemFile(str(filename)) as recording:
+        timestamps, values = recording.read(imu_chunk, 100, 200)
+
+    assert timestamps.tolist() == list(range(100, 200, 10))
+    assert values.shape == (10, 9)
+
+
+def test_sbem_file_reads_cut_off_recording(tmp_path):
+    file = sbem_bytes(2)
+    last = index_sbem(file)[index_sbem(file)["id"] == ecg_chunk.id][-1]
+    filename = tmp_path / "recording.bin"
+    # the length byte of the last ECG chunk is intact, its content is not
+    filename.write_bytes(file[: int(last["offset"]) + 10])
+
+    with SbemFile(str(filename)) as recording:
+        timestamps, values = recording.read(ecg_chunk, 0)
+        # views of the mapping that are still alive do not break closing
+        view = np.frombuffer(recording.map, dtype=np.uint8)
+
+    ecg_chunks = parse_chunks(parse_sbem(file))[ecg_chunk.id]
+    assert len(view) == len(filename.read_bytes())
+    assert len(timestamps) == len(values) == 16 * (len(ecg_chunks) - 1)
+
+
+def test_sbem_file_reads_empty_recording(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(SBEM_HEADER)
+
+    with SbemFile(str(filename)) as recording:
+        assert recording.start_time is None
+        timestamps, values = recording.read(imu_chunk, 100, 200)
+
+    assert len(timestamps) == 0
+    assert values.shape == (0, 9)
+
+
+def test_sbem_file_rejects_other_files(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(b"not an sbem file")
+
+    with pytest.raises(Exception):
+        SbemFile(str(filename))
+
+
+def test_sbem_file_reuses_sidecar_index(tmp_path, monkeypatch):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(sbem_bytes(3))
+    with SbemFile(str(filename)) as recording:
+        expected = recording.read(ecg_chunk)
+    assert (tmp_path / "recording.bin.idx.npz").exists()
+
+    def fail(_):
+        raise AssertionError("index was rebuilt")
+
+    monkeypatch.setattr(sbem_parser, "index_sbem", fail)
+    with SbemFile(str(filename)) as recording:
+        assert recording.time_range(ecg_chunk) == (0, 93 * 32)
+        timestamps, values = recording.read(ecg_chunk)
+
+    assert timestamps.tolist() == expected[0].tolist()
+    assert values.tolist() == expected[1].tolist()
+
+
+def test_sbem_file_rebuilds_stale_sidecar_index(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(sbem_bytes(3))
+    with SbemFile(str(filename)) as recording:
+        chunks = len(recording.index)
+
+    filename.write_bytes(sbem_bytes(4))
+    with SbemFile(str(filename)) as recording:
+        assert len(recording.index) > chunks
+        assert recording.time_range(ecg_chunk)[1] == 4000
+
+
+def peak_conversion_memory(tmp_path, seconds: int, export_format: str) -> int:
+    file = io.BytesIO(sbem_bytes(seconds))
+    exporter = get_exporter(export_format)
+
+    tracemalloc.start()
+    try:
+        with exporter.open(str(tmp_path / "ecg"), "timestamp, value") as writer:
+            for chunk_type, timestamps, values in iter_sbem_batches(
+                file, batch_size=256, read_size=1 << 14
+            ):
+                if chunk_type == ecg_chunk:
+                    writer.append(timestamps, values)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+@pytest.mark.parametrize("export_format", ["csv", "npz"])
+def test_conversion_memory_does_not_grow_with_length(tmp_path, export_format):
+    short = peak_conversion_memory(tmp_path, 60, export_format)
+    long = peak_conversion_memory(tmp_path, 300, export_format)
+
+    assert long < 1.2 * short
+
+
+def test_parse_sbem_file_batches_match_single_pass(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(sbem_bytes(20, start=1000))
+
+    parse_sbem_file(str(filename), "npz", batch_size=7)
+    batched = NpzExporter().read(str(tmp_path / "recording.ecg.npz"))
+    with SbemFile(str(filename)) as recording:
+        timestamps, values = recording.read(ecg_chunk)
+
+    assert batched["timestamp"].tolist() == timestamps.tolist()
+    assert batched["value"].tolist() == values.tolist()
+
+
+def test_indexed_conversion_matches_streaming_and_reuses_sidecar(tmp_path, monkeypatch):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(sbem_bytes(5, start=1000))
+    npz = NpzExporter()
+
+    parse_sbem_file(str(filename), "npz", batch_size=7)
+    streamed = [npz.read(str(tmp_path / f"recording.{s}.npz")) for s in ("ecg", "imu")]
+
+    progress = []
+    parse_sbem_file(str(filename), "npz", batch_size=7, use_index=True)
+    monkeypatch.setattr(sbem_parser, "index_sbem", None)
+    parse_sbem_file(
+        str(filename), "npz", batch_size=7, progress=progress.append, use_index=True
+    )
+    indexed = [npz.read(str(tmp_path / f"recording.{s}.npz")) for s in ("ecg", "imu")]
+
+    for expected, actual in zip(streamed, indexed):
+        for column in expected:
+            assert actual[column].tolist() == expected[column].tolist()
+    assert progress[-1] == 1.0
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+from src.common.definitions import MovesenseV7, MovesenseV8
+from src.common.exporters import get_exporter
+from src.movesense.session import RecordingSession
+from tests.fake_device import FakeMovesense
+from tests.synthetic import ecg_packets, imu_packets
+
+
+def test_session_records_all_devices_on_one_time_base(tmp_path):
+    devices = [FakeMovesense(f"00:00:00:00:00:0{i}") for i in range(3)]
+    session = RecordingSession(devices, subfolder=str(tmp_path))
+
+    async def run():
+        await session.connect()
+        await session.start()
+        for device in devices:
+            # v8 devices stamp their packets with the synchronized clock
+            synced = int.from_bytes(device.config[8:], "little") // 1000
+            for packet in ecg_packets(10, start=synced):
+                device.notify(MovesenseV8.ECG_VOLTAGE_UUID_128, packet)
+            for packet in imu_packets(4, start=synced):
+                device.notify(MovesenseV8.IMU_MEAS_UUID_128, packet)
+        await asyncio.sleep(0.01)
+        filename = await session.stop()
+        await session.disconnect()
+        return filename
+
+    with open(asyncio.run(run())) as file:
+        manifest = json.load(file)
+
+    assert manifest["sync_spread"] >= 0
+    assert len(manifest["devices"]) == 3
+    for device in manifest["devices"]:
+        assert device["firmware"] == 8
+        ecg = device["streams"]["ecg"]
+        assert ecg["packets"] == 10 and ecg["packets_per_second"] > 0
+        assert device["address"].replace(":", "") in ecg["file"]
+        timestamps = get_exporter("csv").read(ecg["file"])["timestamp"]
+        assert 0 <= timestamps[0] <= manifest["sync_spread"]
+        assert len(timestamps) == 10 * 16
+    assert not any(device.is_connected for device in devices)
+
+
+def test_disconnect_closes_running_collectors(tmp_path):
+    device = FakeMovesense("00:00:00:00:00:01")
+    session = RecordingSession([device], streams=("ecg",), subfolder=str(tmp_path))
+
+    async def run():
+        await session.connect()
+        await session.start()
+        synced = int.from_bytes(device.config[8:], "little") // 1000
+        for packet in ecg_packets(3, start=synced):
+            device.notify(MovesenseV8.ECG_VOLTAGE_UUID_128, packet)
+        # without stop(), e.g. after an error
+        await session.disconnect()
+
+    asyncio.run(run())
+
+    (filename,) = tmp_path.glob("session_*/000000000001/ecg_*.csv")
+    assert len(get_exporter("csv").read(str(filename))["timestamp"]) == 3 * 16
+    assert list(tmp_path.glob("session_*/000000000001/ecg_*.stats.json"))
+
+
+def test_session_reports_failing_devices(tmp_path):
+    devices = [
+        FakeMovesense("00:00:00:00:00:01", version=7),
+        FakeMovesense("00:00:00:00:00:02", connects=False),
+    ]
+    session = RecordingSession(devices, streams=("ecg",), subfolder=str(tmp_path))
+
+    async def run():
+        connected = await session.connect()
+        await session.start()
+        for packet in ecg_packets(5, timestamp_size=4, start=1000):
+            devices[0].notify(MovesenseV7.ECG_VOLTAGE_UUID_128, packet)
+        await asyncio.sleep(0.01)
+        status = session.status()
+        await session.stop()
+        return connected, status
+
+    connected, status = asyncio.run(run())
+
+    assert [d.device for d in connected] == devices[:1]
+    assert "could not connect" in status and "ecg" in status
+    # v7 devices keep their own timestamps
+    (filename,) = tmp_path.glob("session_*/000000000001/ecg_*.csv")
+    assert get_exporter("csv").read(str(filename))["timestamp"][0] == 1000
+
+
+def test_session_leaves_out_devices_that_fail_to_synchronize(tmp_path):
+    devices = [FakeMovesense(f"00:00:00:00:00:0{i}") for i in (1, 2)]
+    session = RecordingSession(devices, streams=("ecg",), subfolder=str(tmp_path))
+
+    async def write_failed(*_, **__):
+        raise Exception("write failed")
+
+    # the config is still read, setting the clock fails
+    devices[1].write_gatt_char = write_failed
+
+    async def run():
+        await session.connect()
+        await session.start()
+        synced = int.from_bytes(devices[0].config[8:], "little") // 1000
+        for packet in ecg_packets(4, start=synced):
+            devices[0].notify(MovesenseV8.ECG_VOLTAGE_UUID_128, packet)
+        await asyncio.sleep(0.01)
+        status = session.status()
+        await session.stop()
+        await session.disconnect()
+        return status
+
+    status = asyncio.run(run())
+
+    assert "error synchronizing device: write failed" in status
+    assert session.start_time is not None and session.sync_spread == 0
+    (filename,) = tmp_path.glob("session_*/000000000001/ecg_*.csv")
+    assert len(get_exporter("csv").read(str(filename))["timestamp"]) == 4 * 16
+    assert not list(tmp_path.glob("session_*/000000000002/ecg_*.csv"))
+    assert not any(device.is_connected for device in devices)
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import numpy as np
+
+from src.bluetooth.stream_stats import StreamStats
+from tests.fake_device import NotifyingDevice, ecg_collector
+from tests.synthetic import ecg_packets
+
+
+def test_gaps_are_found_across_batches():
+    stats = StreamStats("ecg")
+    timestamps = np.arange(0, 16 * 16 * 4, 4)
+    # one lost packet (16 samples) inside the first batch, one at the border
+    first, second = np.delete(timestamps[:128], range(32, 48)), timestamps[144:]
+
+    stats.add_batch(np.arange(7) / 10, first, 4)
+    stats.add_batch(np.arange(7, 14) / 10, second, 4)
+
+    assert stats.gaps == 2 and stats.missing_samples == 32
+    assert stats.longest_gap == 17 * 4
+    assert stats.samples_per_packet == 16
+
+
+def test_arrival_histogram_and_jitter():
+    stats = StreamStats()
+    # notifications every 10 ms, with one 100 ms stall
+    arrivals = np.cumsum([0.01] * 10 + [0.1] + [0.01] * 9)
+
+    stats.add_batch(arrivals[:10], np.arange(10 * 16) * 2, 2)
+    stats.add_batch(arrivals[10:], np.arange(10 * 16, 20 * 16) * 2, 2)
+
+    histogram = stats.summary()["arrival_histogram_ms"]
+    assert histogram["5-10"] + histogram["10-20"] == 18
+    assert histogram["100-200"] + histogram["50-100"] == 1
+    assert stats.jitter() > 10
+    assert stats.expected_packet_rate() == 1000 / 32
+
+
+def test_printing_does_not_reset_the_rates():
+    stats = StreamStats("ecg")
+    stats.add_batch(np.arange(10) / 100, np.arange(10 * 16) * 2, 2)
+
+    str(stats)
+    str(stats)
+    # the window still holds the batch
+    assert stats.rates(reset=False)[0] > 0
+    assert stats.report().startswith("ecg: ")
+    assert stats.rates(reset=False) == (0.0, 0.0) and stats.packets == 10
+
+
+def test_collector_saves_stats_on_stop(tmp_path):
+    device = NotifyingDevice()
+    collector = ecg_collector(device, tmp_path, [], flush_packets=8)
+    packets = ecg_packets(30)
+    del packets[10:12]
+
+    async def run():
+        await collector.start()
+        for packet in packets:
+            device.notify("ecg", packet)
+            await asyncio.sleep(0)
+        return await collector.finish()
+
+    asyncio.run(run())
+
+    with open(collector.stats_filename) as file:
+        summary = json.load(file)
+    assert summary["packets"] == 28 and summary["samples"] == 28 * 16
+    assert summary["gaps"] == 1 and summary["missing_samples"] == 32
+    assert summary["interval"] == 2
@@ -0,0 +1,127 @@
+import json
+
+import numpy as np
+
+from src.common.exporters import get_exporter
+from src.movesense.data_chunk import DataChunk, add_interval_if_known
+from src.movesense.sbem_parser import (
+    SBEM_HEADER,
+    index_sbem,
+    parse_sbem,
+    parse_sbem_file,
+    sbem_loss_reports,
+)
+from src.movesense.timeline import (
+    LossReport,
+    estimate_interval,
+    export_loss_reports,
+    insert_gap_markers,
+)
+from tests.synthetic import sbem_bytes
+
+
+def without_ecg_chunks(data: bytes, dropped: set[int]) -> bytes:
+    chunks = parse_sbem(data)
+    ecg = [i for i, chunk in enumerate(chunks) if chunk.id == 104]
+    removed = {ecg[i] for i in dropped}
+    rewritten = SBEM_HEADER + b"".join(
+        bytes([chunk.id, chunk.len]) + bytes(chunk.content)
+        for i, chunk in enumerate(chunks)
+        if i not in removed
+    )
+
+    ids = [chunk.id for chunk in parse_sbem(rewritten)]
+    assert ids.count(104) == len(ecg) - len(dropped)
+    assert set(ids) == {2, 104, 105}
+    return rewritten
+
+
+def test_interval_survives_a_lost_second_packet():
+    timestamps = np.delete(np.arange(20) * 32, 1)
+    assert estimate_interval(timestamps, 16) == 2
+
+    chunks = [DataChunk(int(t), np.zeros(16)) for t in timestamps]
+    assert add_interval_if_known(chunks)[0].interval == 2
+
+
+def test_loss_report_counts_gaps_and_overlaps_across_batches():
+    report = LossReport("ecg", samples_per_packet=16)
+    timestamps = np.arange(100) * 32
+    timestamps = np.delete(timestamps, [10, 11, 50])
+    # a resync moves the clock back by three packets
+    timestamps[80:] -= 96
+
+    report.add(timestamps[:50])
+    report.add(timestamps[50:])
+
+    assert report.interval == 2
+    assert report.gaps == 2 and report.missing_packets == 3
+    assert report.overlaps == 1
+    assert report.longest_gap == 3 * 32
+    assert report.lost_ms == 3 * 32
+
+
+def test_gap_markers_are_inserted_after_gaps():
+    timestamps = np.array([0, 2, 4, 10, 12, 20])
+    values = np.arange(6)
+
+    marked_timestamps, marked = insert_gap_markers(timestamps, values, 2, previous=-6)
+
+    assert marked_timestamps.tolist() == [-4, 0, 2, 4, 6, 10, 12, 14, 20]
+    assert np.isnan(marked[[0, 4, 7]]).all()
+    assert marked[~np.isnan(marked)].tolist() == values.tolist()
+
+
+def test_conversion_writes_loss_report_and_markers(tmp_path):
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(without_ecg_chunks(sbem_bytes(10), {1, 2, 100}))
+
+    ecg, _ = parse_sbem_file(str(filename), "npz", batch_size=64, gap_markers=True)
+
+    with open(tmp_path / "recording.loss.json") as file:
+        ecg_report, imu_report = json.load(file)
+    assert ecg_report["interval"] == 2
+    assert ecg_report["gaps"] == 2 and ecg_report["missing_samples"] == 3 * 16
+    assert imu_report["gaps"] == 0
+    values = get_exporter("npz").read(ecg)["value"]
+    assert np.isnan(values).sum() == 2
+
+    # the same report from the index, without decoding the recording
+    indexed, _ = sbem_loss_reports(str(filename))
+    assert indexed.summary() == ecg_report
+
+
+def test_markers_are_kept_when_the_first_batch_has_no_interval(tmp_path):
+    data = without_ecg_chunks(sbem_bytes(2), {10})
+    offset, length = next(
+        (offset, length)
+        for id, offset, length in index_sbem(data).tolist()
+        if id == 104
+    )
+    # the first ECG chunk twice, so the first batch of two shows no interval
+    first = data[offset - 2 : offset + length]
+    filename = tmp_path / "recording.bin"
+    filename.write_bytes(data[: offset - 2] + first + data[offset - 2 :])
+
+    ecg, _ = parse_sbem_file(str(filename), "npz", batch_size=2, gap_markers=True)
+
+    values = get_exporter("npz").read(ecg)["value"]
+    assert values.dtype == np.float64
+    assert np.isnan(values).sum() == 1
+
+
+def test_exported_parts_are_checked_as_one_stream(tmp_path):
+    csv = get_exporter("csv")
+    before = csv.write(
+        str(tmp_path / "ecg_1"), "timestamp, value", np.arange(0, 200, 2), np.zeros(100)
+    )
+    after = csv.write(
+        str(tmp_path / "ecg_2"),
+        "timestamp, value",
+        np.arange(300, 500, 2),
+        np.zeros(100),
+    )
+
+    (report,) = export_loss_reports([after, before])
+
+    assert report.gaps == 1 and report.lost_ms == 300 - 198 - 2
@@ -0,0 +1,119 @@
+import asyncio
+
+from src.common.definitions import MovesenseV8
+from src.movesense.config import MovesenseConfigField
+from src.movesense.session import RecordingSession
+from src.movesense.transfer import RecordingTransfer, transfer_all
+from tests.fake_device import FakeMovesense
+from tests.synthetic import sbem_bytes
+
+
+def test_transfer_all_collects_every_device(tmp_path):
+    devices = [
+        FakeMovesense(f"00:00:00:00:00:0{i}", recording=sbem_bytes(2 + i, seed=i))
+        for i in range(3)
+    ]
+    transfers = [
+        RecordingTransfer(
+            device,
+            MovesenseConfigField(device, MovesenseV8.CONFIG_UUID_128),
+            subfolder=str(tmp_path),
+            name=f"device{i}",
+            idle_timeout=0.01,
+        )
+        for i, device in enumerate(devices)
+    ]
+    reports = []
+
+    results = asyncio.run(transfer_all(transfers, reports.append, 0.01))
+
+    for device, result in zip(devices, results):
+        assert result.error is None
+        with open(result.filename, "rb") as file:
+            assert file.read() == device.recording
+        assert result.bytes == len(device.recording)
+        # the end is found from the idle stream and confirmed by a single read
+        assert result.polls == 1 and result.latency < 0.5
+    total = sum(len(device.recording) for device in devices)
+    assert reports[-1].bytes == total
+    assert f"received {total / 1024:.1f} kB from 3 devices" in str(reports[-1])
+
+
+def test_failing_transfer_does_not_stop_the_others(tmp_path):
+    devices = [
+        FakeMovesense(f"00:00:00:00:00:0{i}", recording=sbem_bytes(1)) for i in range(2)
+    ]
+
+    async def unavailable(*_):
+        raise Exception("notifications not available")
+
+    devices[0].start_notify = unavailable
+    transfers = [
+        RecordingTransfer(
+            device,
+            MovesenseConfigField(device, MovesenseV8.CONFIG_UUID_128),
+            subfolder=str(tmp_path),
+            idle_timeout=0.01,
+        )
+        for device in devices
+    ]
+
+    failed, done = asyncio.run(transfer_all(transfers))
+
+    assert failed.error == "notifications not available" and failed.filename is None
+    assert done.error is None and done.bytes == len(devices[1].recording)
+
+
+def test_session_transfers_into_device_folders(tmp_path):
+    devices = [
+        FakeMovesense("00:00:00:00:00:01", recording=sbem_bytes(1)),
+        FakeMovesense("00:00:00:00:00:02", version=7),
+    ]
+    session = RecordingSession(devices, subfolder=str(tmp_path))
+
+    async def run():
+        await session.connect()
+        return await session.transfer()
+
+    (result,) = asyncio.run(run())
+
+    assert "000000000001" in result.filename
+    assert result.filename.endswith(".bin")
+
+
+def test_transfer_ends_with_expected_bytes_without_polling(tmp_path):
+    device = FakeMovesense("00:00:00:00:00:01", recording=sbem_bytes(3))
+    transfer = RecordingTransfer(
+        device,
+        MovesenseConfigField(device, MovesenseV8.CONFIG_UUID_128),
+        subfolder=str(tmp_path),
+        expected_bytes=len(device.recording),
+        idle_timeout=10,
+    )
+
+    result = asyncio.run(transfer.run())
+
+    assert result.polls == 0 and result.bytes == len(device.recording)
+    assert result.latency < 1
+
+
+def test_transfer_backs_off_while_device_is_busy(tmp_path):
+    device = FakeMovesense("00:00:00:00:00:01", recording=sbem_bytes(1))
+    transfer = RecordingTransfer(
+        device,
+        MovesenseConfigField(device, MovesenseV8.CONFIG_UUID_128),
+        subfolder=str(tmp_path),
+        idle_timeout=0.01,
+        max_poll_interval=0.04,
+    )
+
+    async def run():
+        # the device needs a while before it starts sending
+        device.transfer_delay = 0.2
+        return await transfer.run()
+
+    result = asyncio.run(run())
+
+    assert result.bytes == len(device.recording)
+    # 10, 20, 40, 40, 40 ... ms instead of a read every 10 ms
+    assert 2 <= result.polls <= 8